@@ -43,13 +43,1182 @@ __version__ = "0.3.1"
 __copyright__ = "OpenSource"
 __license__ = "GPLv2"
 
-__all__ = ["RTObject"]
+__all__ = ["RTObject", "ConnectionPool", "Instrumentation", "LogBuffer", "LookupCache", "DictionaryIndex", "AttributeRegistry", "TagIndex", "Network", "IPv4NetworkIndex", "IPv6NetworkIndex", "Snapshot", "Mirror", "Object", "Port", "AttributeValue", "IPAllocation", "Change", "ChangeCursor", "ChangePoller",
+           "ipv4_encode", "ipv4_decode", "ipv6_encode", "ipv6_decode", "ipv4_encode_many", "ipv4_decode_many", "ipv6_encode_many", "ipv6_decode_many"]
 
 
 import re
+import abc
+import time
+import heapq
+import atexit
+import weakref
+import socket
+import struct
+import bisect
+import inspect
+import logging
+import functools
+import threading
 import ipaddress
+from array import array
+from collections import OrderedDict, namedtuple, deque
+from contextlib import contextmanager
 from datetime import datetime
 from datetime import timedelta
+from .snapshot import Snapshot, SnapshotWriter
+from .mirror import Mirror
+from .records import Object, Port, AttributeValue, IPAllocation
+
+
+class LookupCache:
+    """
+    Bounded LRU cache with time to live used by RTObject
+    for read-through lookups. Keeps hit/miss counters.
+    """
+
+    def __init__(self, size=1024, ttl=300):
+        """Initialize cache. ttl in seconds, None means entries never expire"""
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return tuple (found, value)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expire = entry
+                if expire is None or expire > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """Store value in cache, drop least recently used entries over size"""
+        with self._lock:
+            expire = time.time() + self.ttl if self.ttl is not None else None
+            self._data[key] = (value, expire)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def discard_if(self, predicate):
+        """Remove all entries for which predicate(key, value) is true"""
+        with self._lock:
+            for key in [k for k, entry in self._data.items() if predicate(k, entry[0])]:
+                del self._data[key]
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return dictionary with cache statistics"""
+        return {'size': len(self._data), 'max_size': self.size, 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+
+class DictionaryIndex:
+    """
+    In-memory copy of racktables Dictionary and Chapter tables.
+    Values are compared case-insensitive like in MySQL.
+    Substring search (GetDictionaryId semantics) uses trigram index.
+    """
+
+    def __init__(self, dictionary_rows, chapter_rows):
+        """Build index from (dict_key, chapter_id, dict_value) and (id, name) rows"""
+        self.values = {}
+        self.by_value = {}
+        self.chapters = {}
+        self.chapter_ids = {}
+        self.trigrams = {}
+        self.stale = False
+        for chapter_id, name in chapter_rows:
+            self.add_chapter(chapter_id, name)
+        for dict_key, chapter_id, value in dictionary_rows:
+            self.add_value(dict_key, chapter_id, value)
+
+    @staticmethod
+    def normalize(value):
+        """Normalize value for comparison (MySQL ci collation ignores case and trailing spaces)"""
+        return (value or "").rstrip(" ").lower()
+
+    @staticmethod
+    def split_trigrams(value):
+        """Return set of all three character substrings of value"""
+        return set(value[i:i + 3] for i in range(len(value) - 2))
+
+    def add_chapter(self, chapter_id, name):
+        """Add chapter to index"""
+        self.chapter_ids[self.normalize(name)] = chapter_id
+        self.chapters.setdefault(chapter_id, {})
+
+    def remove_chapter(self, name):
+        """Remove chapter and its values from index"""
+        chapter_id = self.chapter_ids.pop(self.normalize(name), None)
+        for dict_key in list(self.chapters.pop(chapter_id, {}).values()):
+            self.remove_key(dict_key)
+
+    def add_value(self, dict_key, chapter_id, value):
+        """Add dictionary value to index"""
+        value = value or ""
+        norm = self.normalize(value)
+        self.values[dict_key] = (chapter_id, value)
+        self.by_value.setdefault(norm, set()).add(dict_key)
+        chapter = self.chapters.setdefault(chapter_id, {})
+        # Duplicate values resolve to lowest key like the SQL lookup
+        if chapter.get(norm) is None or dict_key < chapter[norm]:
+            chapter[norm] = dict_key
+        for trigram in self.split_trigrams(value.lower()):
+            self.trigrams.setdefault(trigram, set()).add(dict_key)
+
+    def remove_key(self, dict_key):
+        """Remove dictionary value identified by dict_key from index"""
+        if dict_key not in self.values:
+            return
+        chapter_id, value = self.values.pop(dict_key)
+        norm = self.normalize(value)
+        self.by_value[norm].discard(dict_key)
+        remaining = self.by_value[norm]
+        if not remaining:
+            del self.by_value[norm]
+        chapter = self.chapters.get(chapter_id, {})
+        if chapter.get(norm) == dict_key:
+            del chapter[norm]
+            others = [key for key in remaining if self.values[key][0] == chapter_id]
+            if others:
+                chapter[norm] = min(others)
+        for trigram in self.split_trigrams(value.lower()):
+            self.trigrams[trigram].discard(dict_key)
+
+    def remove_value(self, value):
+        """Remove all dictionary entries with value"""
+        for dict_key in list(self.by_value.get(self.normalize(value), ())):
+            self.remove_key(dict_key)
+
+    def key_by_value(self, value, chapter_id=None):
+        """Get dict_key by exact value, optionally only from chapter_id"""
+        norm = self.normalize(value)
+        if chapter_id:
+            return self.chapters.get(int(chapter_id), {}).get(norm)
+        keys = self.by_value.get(norm)
+        return min(keys) if keys else None
+
+    def value_by_key(self, dict_key):
+        """Get dict_value by dict_key"""
+        entry = self.values.get(int(dict_key)) if dict_key is not None else None
+        return entry[1] if entry is not None else None
+
+    def chapter_id(self, name):
+        """Get chapter id by exact name"""
+        return self.chapter_ids.get(self.normalize(name))
+
+    def search(self, searchstring, chapter_id=None):
+        """
+        Get lowest dict_key whose value contains searchstring (LIKE '%searchstring%'),
+        optionally only from chapter_id
+        """
+        needle = searchstring.lower()
+        if chapter_id:
+            chapter_id = int(chapter_id)
+
+        if "%" in needle or "_" in needle:
+            # searchstring contains LIKE wildcards, fall back to full scan
+            pattern = re.compile(".*".join(".".join(re.escape(part) for part in chunk.split("_")) for chunk in needle.split("%")), re.DOTALL)
+            candidates = [k for k, (chap, value) in self.values.items() if pattern.search(value.lower())]
+        elif len(needle) >= 3:
+            postings = sorted((self.trigrams.get(t, set()) for t in self.split_trigrams(needle)), key=len)
+            candidates = set.intersection(*postings)
+            candidates = [k for k in candidates if needle in self.values[k][1].lower()]
+        else:
+            candidates = [k for k, (chap, value) in self.values.items() if needle in value.lower()]
+
+        if chapter_id:
+            candidates = [k for k in candidates if self.values[k][0] == chapter_id]
+        return min(candidates) if candidates else None
+
+
+class AttributeRegistry:
+    """
+    In-memory copy of racktables Attribute and AttributeMap tables.
+    Attribute names are compared case-insensitive like in MySQL.
+    """
+
+    # AttributeValue column used by each attribute type
+    value_columns = {
+        'string': 'string_value',
+        'uint': 'uint_value',
+        'dict': 'uint_value',
+        'date': 'uint_value',
+        'float': 'float_value',
+    }
+
+    def __init__(self, attribute_rows, map_rows):
+        """Build registry from (id, type, name) and (objtype_id, attr_id, chapter_id, sticky) rows"""
+        self.attributes = {}
+        self.by_name = {}
+        self.maps = {}
+        self.stale = False
+        for attr_id, attr_type, name in attribute_rows:
+            self.add_attribute(attr_id, attr_type, name)
+        for objtype_id, attr_id, chapter_id, sticky in map_rows:
+            self.add_map(objtype_id, attr_id, chapter_id, sticky)
+
+    def add_attribute(self, attr_id, attr_type, name):
+        """Add attribute definition"""
+        self.attributes[attr_id] = (attr_type, name)
+        self.by_name.setdefault(name.lower(), attr_id)
+
+    def add_map(self, objtype_id, attr_id, chapter_id=None, sticky='no'):
+        """Add attribute to object type mapping"""
+        self.maps.setdefault(attr_id, {})[objtype_id] = (chapter_id, sticky)
+
+    def attr_type(self, attr_id):
+        """Get attribute type (string, uint, dict, float, date) or None"""
+        entry = self.attributes.get(int(attr_id))
+        return entry[0] if entry is not None else None
+
+    def id_by_name(self, name):
+        """Get attribute id by exact name"""
+        return self.by_name.get(name.lower())
+
+    def search(self, searchstring):
+        """Get lowest attribute id whose name contains searchstring"""
+        needle = searchstring.lower()
+        found = [attr_id for attr_id, (attr_type, name) in self.attributes.items() if needle in name.lower()]
+        return min(found) if found else None
+
+    @staticmethod
+    def convert_value(attr_type, value):
+        """Convert value into form stored in AttributeValue column for attr_type"""
+        if attr_type == 'date':
+            if isinstance(value, (int, float)):
+                return int(value)
+            return int((datetime.strptime(value, "%Y-%m-%d") - datetime(1970, 1, 1)) / timedelta(seconds=1))
+        if attr_type in ('uint', 'dict'):
+            return int(value)
+        if attr_type == 'float':
+            return float(value)
+        return value
+
+    def is_mapped(self, attr_id, objtype_id):
+        """Check if attribute is allowed for object type"""
+        return int(objtype_id) in self.maps.get(int(attr_id), {})
+
+    def resolve(self, attr):
+        """Translate attribute id or name to attribute id, None if unknown"""
+        if isinstance(attr, int):
+            return attr if attr in self.attributes else None
+        return self.id_by_name(attr)
+
+
+class TagIndex:
+    """
+    In-memory copy of racktables TagTree and object tags from TagStorage.
+    Tags form parent/child tree, tag assignments are kept as inverted
+    index tag -> object ids and object -> tag ids. Tag names are compared
+    case-insensitive like in MySQL.
+
+    Tag expressions combine tags with and, or, not and parentheses,
+    tags are written in braces like in racktables ({web} and not {old})
+    or as single words. Tag matches objects with the tag or any of its
+    descendants.
+    """
+
+    TOKEN = re.compile(r"\s*(?:(\()|(\))|\{([^}]*)\}|([^\s(){}]+))")
+
+    def __init__(self, tag_rows, storage_rows=()):
+        """Build index from TagTree (id, parent_id, tag) and TagStorage (entity_id, tag_id) rows"""
+        self.tags = {}
+        self.by_name = {}
+        self.children = {}
+        self.objects = {}
+        self.object_tags = {}
+        for tag_id, parent_id, tag in tag_rows:
+            self.tags[tag_id] = (parent_id, tag)
+            self.by_name[self.normalize(tag)] = tag_id
+            self.children.setdefault(parent_id, set()).add(tag_id)
+        for object_id, tag_id in storage_rows:
+            self.add(object_id, tag_id)
+
+    @staticmethod
+    def normalize(tag):
+        """Normalize tag name for comparison"""
+        return (tag or "").rstrip(" ").lower()
+
+    def add(self, object_id, tag_id):
+        """Add tag assignment"""
+        self.objects.setdefault(tag_id, set()).add(object_id)
+        self.object_tags.setdefault(object_id, set()).add(tag_id)
+
+    def remove(self, object_id, tag_id):
+        """Remove tag assignment"""
+        self.objects.get(tag_id, set()).discard(object_id)
+        self.object_tags.get(object_id, set()).discard(tag_id)
+
+    def tag_id(self, tag):
+        """Return id of tag (name or id), raise ValueError for unknown tag"""
+        tag_id = tag if tag in self.tags else self.by_name.get(self.normalize(tag) if isinstance(tag, str) else None)
+        if tag_id is None:
+            raise ValueError("Unknown tag %r" % (tag,))
+        return tag_id
+
+    def name(self, tag_id):
+        """Return name of tag id"""
+        return self.tags[tag_id][1]
+
+    def descendants(self, tag, include_self=True):
+        """Return set of ids of tag and all tags under it"""
+        root = self.tag_id(tag)
+        result = set([root]) if include_self else set()
+        stack = [root]
+        while stack:
+            for child in self.children.get(stack.pop(), ()):
+                if child not in result:
+                    result.add(child)
+                    stack.append(child)
+        return result
+
+    def ancestors(self, tag):
+        """Return list of ids of parent tags, nearest first"""
+        result = []
+        parent_id = self.tags[self.tag_id(tag)][0]
+        while parent_id is not None and parent_id in self.tags and parent_id not in result:
+            result.append(parent_id)
+            parent_id = self.tags[parent_id][0]
+        return result
+
+    def objects_with(self, tag, descendants=True):
+        """Return set of object ids tagged with tag (or with any tag under it)"""
+        tag_ids = self.descendants(tag) if descendants else [self.tag_id(tag)]
+        result = set()
+        for tag_id in tag_ids:
+            result.update(self.objects.get(tag_id, ()))
+        return result
+
+    def tags_of(self, object_ids):
+        """Batch lookup, return dictionary object_id: sorted list of tag names"""
+        return dict((object_id, sorted(self.name(tag_id) for tag_id in self.object_tags.get(object_id, ()))) for object_id in object_ids)
+
+    def object_tag_rows(self, object_id):
+        """Return (parent_tag, tag) rows of object, same as GetObjectTags"""
+        rows = []
+        for tag_id in sorted(self.object_tags.get(object_id, ())):
+            parent_id, tag = self.tags[tag_id]
+            rows.append((self.tags[parent_id][1] if parent_id in self.tags else None, tag))
+        return tuple(rows)
+
+    def select(self, expression, universe=None):
+        """
+        Return set of object ids matching tag expression.
+        universe (set or callable returning it) is set of all object ids used by not,
+        by default all tagged objects.
+        """
+        tokens = []
+        for match in self.TOKEN.finditer(expression):
+            opening, closing, braced, word = match.groups()
+            if opening or closing:
+                tokens.append(opening or closing)
+            elif braced is not None:
+                tokens.append(('tag', braced))
+            elif word.lower() in ('and', 'or', 'not'):
+                tokens.append(word.lower())
+            else:
+                tokens.append(('tag', word))
+        if "".join(match.group(0) for match in self.TOKEN.finditer(expression)).strip() != expression.strip():
+            raise ValueError("Invalid tag expression %r" % expression)
+        cache = {}
+
+        def everything():
+            if 'universe' not in cache:
+                if universe is None:
+                    cache['universe'] = set(self.object_tags)
+                else:
+                    cache['universe'] = set(universe() if callable(universe) else universe)
+            return cache['universe']
+
+        def parse_or(pos):
+            result, pos = parse_and(pos)
+            while pos < len(tokens) and tokens[pos] == 'or':
+                right, pos = parse_and(pos + 1)
+                result = result | right
+            return result, pos
+
+        def parse_and(pos):
+            result, pos = parse_not(pos)
+            while pos < len(tokens) and tokens[pos] == 'and':
+                right, pos = parse_not(pos + 1)
+                result = result & right
+            return result, pos
+
+        def parse_not(pos):
+            if pos >= len(tokens):
+                raise ValueError("Unexpected end of tag expression %r" % expression)
+            token = tokens[pos]
+            if token == 'not':
+                result, pos = parse_not(pos + 1)
+                return everything() - result, pos
+            if token == '(':
+                result, pos = parse_or(pos + 1)
+                if pos >= len(tokens) or tokens[pos] != ')':
+                    raise ValueError("Missing ) in tag expression %r" % expression)
+                return result, pos + 1
+            if isinstance(token, tuple):
+                return self.objects_with(token[1]), pos + 1
+            raise ValueError("Unexpected %r in tag expression %r" % (token, expression))
+
+        result, pos = parse_or(0)
+        if pos != len(tokens):
+            raise ValueError("Unexpected %r in tag expression %r" % (tokens[pos], expression))
+        return result
+
+
+# IP address codec.
+# Racktables stores IPv4 addresses as unsigned int and IPv6 addresses
+# as BINARY(16). Queries compare raw ip column with values encoded here,
+# so indexes on ip are used and no function is evaluated per row.
+def ipv4_encode(address):
+    """Convert IPv4 address (dotted text, int or 4 bytes) into int stored in ip columns"""
+    if isinstance(address, int):
+        if 0 <= address <= 0xFFFFFFFF:
+            return address
+    elif isinstance(address, (bytes, bytearray)):
+        if len(address) == 4:
+            return struct.unpack("!L", address)[0]
+    elif isinstance(address, ipaddress.IPv4Address):
+        return int(address)
+    else:
+        try:
+            return struct.unpack("!L", socket.inet_aton(address))[0]
+        except (OSError, TypeError):
+            pass
+    raise ValueError("Invalid IPv4 address %r" % (address,))
+
+
+def ipv4_decode(value):
+    """Convert int (or 4 bytes) from ip column into dotted text"""
+    if isinstance(value, int):
+        value = struct.pack("!L", value)
+    return socket.inet_ntoa(value)
+
+
+def ipv6_encode(address):
+    """Convert IPv6 address (colon text, HEX() text, int or 16 bytes) into 16 bytes stored in ip columns"""
+    if isinstance(address, (bytes, bytearray)):
+        if len(address) != 16:
+            raise ValueError("Invalid IPv6 address %r" % (address,))
+        return bytes(address)
+    if isinstance(address, str) and len(address) == 32 and ":" not in address:
+        return bytes.fromhex(address)
+    return ipaddress.IPv6Address(address).packed
+
+
+def ipv6_decode(value, exploded=False):
+    """
+    Convert 16 bytes (or int, HEX() text) from ip column into compressed colon text,
+    with exploded=True into full lower case form (2001:0db8:0000:...)
+    """
+    value = ipv6_encode(value)
+    if exploded:
+        digits = value.hex()
+        return ":".join(digits[i:i + 4] for i in range(0, 32, 4))
+    return ipaddress.IPv6Address(value).compressed
+
+
+def ipv4_column(raw):
+    """SQL expression selecting IPv4 ip column, as text unless raw"""
+    return "ip" if raw else "INET_NTOA(ip)"
+
+
+def ipv6_column(raw):
+    """SQL expression selecting IPv6 ip column, as HEX() text unless raw"""
+    return "ip" if raw else "HEX(ip)"
+
+
+def ipv4_encode_many(addresses):
+    """Encode list of IPv4 addresses, see ipv4_encode"""
+    return [ipv4_encode(address) for address in addresses]
+
+
+def ipv4_decode_many(values):
+    """Decode list of ints from ip column into dotted text"""
+    values = list(values)
+    packed = struct.pack("!%dL" % len(values), *values)
+    return [socket.inet_ntoa(packed[i:i + 4]) for i in range(0, len(packed), 4)]
+
+
+def ipv6_encode_many(addresses):
+    """Encode list of IPv6 addresses, see ipv6_encode"""
+    return [ipv6_encode(address) for address in addresses]
+
+
+def ipv6_decode_many(values, exploded=False):
+    """Decode list of values from ip column, see ipv6_decode"""
+    return [ipv6_decode(value, exploded) for value in values]
+
+
+def encode_valid(encode, addresses):
+    """Encode addresses with ipv4_encode or ipv6_encode, invalid addresses are logged and skipped"""
+    result = []
+    for address in addresses:
+        try:
+            result.append(encode(address))
+        except ValueError:
+            logging.getLogger("rtapi_bk").warning("Ignoring invalid IP address %r", address)
+    return result
+
+
+Network = namedtuple("Network", ["id", "ip", "mask", "name", "first", "last", "parent"])
+
+
+class NetworkIndex(abc.ABC):
+    """
+    Sorted interval index of IP networks.
+    Nested networks are flattened into disjoint segments, each pointing
+    to the most specific network, so containment and longest prefix match
+    are answered with one bisect.
+    """
+
+    bits = None
+    typecode = None
+
+    def __init__(self, rows):
+        """
+        Build index from (id, ip, mask, name) rows.
+        Optional fifth column is last address of network, otherwise it's computed from mask.
+        """
+        networks = []
+        for row in rows:
+            net_id, ip, mask, name = row[:4]
+            first = self.parse(ip)
+            if len(row) > 4 and row[4] is not None:
+                last = self.parse(row[4])
+            else:
+                last = first + (1 << (self.bits - int(mask))) - 1
+            networks.append((first, -last, net_id, self.format(first), int(mask), name))
+        networks.sort()
+
+        self.networks = []
+        self.by_id = {}
+        starts = []
+        owners = []
+
+        def emit(start, owner):
+            if starts and starts[-1] == start:
+                owners[-1] = owner
+            elif start < (1 << self.bits):
+                starts.append(start)
+                owners.append(owner)
+
+        stack = []
+        for first, last, net_id, ip, mask, name in networks:
+            last = -last
+            while stack and self.networks[stack[-1]].last < first:
+                closed = self.networks[stack.pop()]
+                emit(closed.last + 1, stack[-1] if stack else -1)
+            parent = self.networks[stack[-1]].id if stack else None
+            self.networks.append(Network(net_id, ip, mask, name, first, last, parent))
+            self.by_id[net_id] = self.networks[-1]
+            emit(first, len(self.networks) - 1)
+            stack.append(len(self.networks) - 1)
+        while stack:
+            closed = self.networks[stack.pop()]
+            emit(closed.last + 1, stack[-1] if stack else -1)
+
+        self.starts = self.new_array(starts)
+        self.owners = array('l', owners)
+        self.addresses = self.new_array([])
+
+    def new_array(self, values):
+        """Create sorted integer array for addresses"""
+        if self.typecode is None:
+            return list(values)
+        return array(self.typecode, values)
+
+    @abc.abstractmethod
+    def parse(self, address):
+        """Convert address (text or int) into int"""
+
+    @staticmethod
+    @abc.abstractmethod
+    def format(value):
+        """Convert int into address text"""
+
+    def lookup(self, address):
+        """Longest prefix match. Return most specific Network containing address or None"""
+        pos = bisect.bisect_right(self.starts, self.parse(address)) - 1
+        if pos < 0 or self.owners[pos] < 0:
+            return None
+        return self.networks[self.owners[pos]]
+
+    def containing(self, address):
+        """Return list of all networks containing address, most specific first"""
+        result = []
+        network = self.lookup(address)
+        while network is not None:
+            result.append(network)
+            network = self.by_id[network.parent] if network.parent is not None else None
+        return result
+
+    def lookup_many(self, addresses):
+        """
+        Longest prefix match for many addresses at once.
+        Return list of Network or None in order of addresses
+        """
+        values = [self.parse(address) for address in addresses]
+        result = [None] * len(values)
+        pos = -1
+        count = len(self.starts)
+        for i in sorted(range(len(values)), key=values.__getitem__):
+            while pos + 1 < count and self.starts[pos + 1] <= values[i]:
+                pos += 1
+            if pos >= 0 and self.owners[pos] >= 0:
+                result[i] = self.networks[self.owners[pos]]
+        return result
+
+    def add_addresses(self, addresses):
+        """Add addresses (text or int) used by addresses_in()"""
+        merged = list(self.addresses)
+        merged.extend(self.parse(address) for address in addresses)
+        merged.sort()
+        self.addresses = self.new_array(merged)
+
+    def addresses_in(self, network):
+        """Return sorted list of added addresses (as int) inside network"""
+        if not isinstance(network, Network):
+            network = self.by_id[network]
+        start = bisect.bisect_left(self.addresses, network.first)
+        end = bisect.bisect_right(self.addresses, network.last)
+        return list(self.addresses[start:end])
+
+
+class IPv4NetworkIndex(NetworkIndex):
+    """Network index of IPv4Network table"""
+
+    bits = 32
+    typecode = 'L'
+
+    def parse(self, address):
+        """Convert dotted address, 4 bytes or int into int"""
+        return ipv4_encode(address)
+
+    @staticmethod
+    def format(value):
+        """Convert int into dotted address"""
+        return ipv4_decode(value)
+
+
+class IPv6NetworkIndex(NetworkIndex):
+    """
+    Network index of IPv6Network table.
+    Addresses are kept as 128-bit python integers.
+    """
+
+    bits = 128
+    typecode = None
+
+    def parse(self, address):
+        """Convert address (int, 16 bytes, HEX() string or colon text) into int"""
+        if isinstance(address, int):
+            return address
+        return int.from_bytes(ipv6_encode(address), "big")
+
+    @staticmethod
+    def format(value):
+        """Convert int into compressed colon address"""
+        return ipaddress.IPv6Address(value).compressed
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections created by factory
+    (callable without arguments returning DB-API connection).
+    Keeps at least min_size and at most max_size connections, closes
+    connections idle longer than idle_timeout seconds and checks
+    health of connections idle longer than check_after seconds.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, idle_timeout=300, check_after=30, timeout=None):
+        """Initialize pool and open min_size connections"""
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.timeout = timeout
+        self.size = 0
+        self.idle = []
+        self.closed = False
+        self.cond = threading.Condition()
+        for i in range(min_size):
+            self.idle.append((self.factory(), time.time()))
+            self.size += 1
+
+    def is_healthy(self, connection):
+        """Check if connection is still usable"""
+        try:
+            if hasattr(connection, "ping"):
+                connection.ping()
+            else:
+                cursor = connection.cursor()
+                cursor.execute("SELECT 1", None)
+                cursor.fetchall()
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def close_connection(self, connection):
+        """Close connection ignoring errors"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Check out connection, wait if all max_size connections are used"""
+        deadline = time.time() + self.timeout if self.timeout is not None else None
+        while True:
+            with self.cond:
+                if self.closed:
+                    raise RuntimeError("Connection pool is closed")
+                self.expire_idle()
+                if self.idle:
+                    connection, last_used = self.idle.pop()
+                elif self.size < self.max_size:
+                    connection, last_used = None, None
+                    self.size += 1
+                else:
+                    remaining = deadline - time.time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise RuntimeError("Timeout waiting for database connection from pool")
+                    self.cond.wait(remaining)
+                    continue
+
+            if connection is None:
+                try:
+                    return self.factory()
+                except Exception:
+                    with self.cond:
+                        self.size -= 1
+                        self.cond.notify()
+                    raise
+            if time.time() - last_used < self.check_after or self.is_healthy(connection):
+                return connection
+            # Broken connection, replace it with new one
+            self.close_connection(connection)
+            with self.cond:
+                self.size -= 1
+
+    def release(self, connection, broken=False):
+        """Return connection to pool. Broken connections and connections released after close() are closed"""
+        with self.cond:
+            broken = broken or self.closed
+        if broken:
+            self.close_connection(connection)
+        with self.cond:
+            if broken:
+                self.size -= 1
+            else:
+                self.idle.append((connection, time.time()))
+            self.cond.notify()
+
+    def expire_idle(self):
+        """Close connections idle longer than idle_timeout above min_size, call with lock held"""
+        if self.idle_timeout is None:
+            return
+        now = time.time()
+        while self.size > self.min_size and self.idle and now - self.idle[0][1] > self.idle_timeout:
+            connection, last_used = self.idle.pop(0)
+            self.close_connection(connection)
+            self.size -= 1
+
+    def close(self):
+        """
+        Close all idle connections, connections checked out by other threads
+        are closed when they are released. Pool can't be used after close()
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+            while self.idle:
+                connection, last_used = self.idle.pop()
+                self.close_connection(connection)
+                self.size -= 1
+
+
+class Instrumentation:
+    """
+    Collects statistics about SQL statements issued by RTObject.
+    Every public RTObject method call is a span aggregating number of
+    statements, rows and wall time (including nested method calls).
+    Statements slower than slow_threshold seconds are logged.
+    Custom hooks can be added to before_hooks (called with sql, params)
+    and after_hooks (called with sql, params, rowcount, elapsed, error).
+    """
+
+    def __init__(self, slow_threshold=1.0, slow_log_size=100):
+        """Initialize instrumentation"""
+        self.slow_threshold = slow_threshold
+        self.before_hooks = []
+        self.after_hooks = []
+        self.logger = logging.getLogger("rtapi_bk")
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.slow_log = deque(maxlen=slow_log_size)
+        self.reset()
+
+    def reset(self):
+        """Clear collected statistics"""
+        with self.lock:
+            self.statements = 0
+            self.rows = 0
+            self.errors = 0
+            self.statement_time = 0.0
+            self.slow_statements = 0
+            self.methods = {}
+            self.slow_log.clear()
+
+    def before_statement(self, sql, params):
+        """Called before every statement"""
+        for hook in self.before_hooks:
+            hook(sql, params)
+
+    def after_statement(self, sql, params, rowcount, elapsed, error=None):
+        """Called after every statement"""
+        rowcount = max(rowcount or 0, 0)
+        for span in getattr(self.local, 'spans', ()):
+            span['statements'] += 1
+            span['rows'] += rowcount
+        with self.lock:
+            self.statements += 1
+            self.rows += rowcount
+            self.statement_time += elapsed
+            if error is not None:
+                self.errors += 1
+            if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+                self.slow_statements += 1
+                self.slow_log.append((sql, params, elapsed))
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            self.logger.warning("Slow statement (%.3fs): %s %r", elapsed, " ".join(sql.split()), params)
+        for hook in self.after_hooks:
+            hook(sql, params, rowcount, elapsed, error)
+
+    def thread_spans(self):
+        """Stack of spans open in current thread"""
+        spans = getattr(self.local, 'spans', None)
+        if spans is None:
+            spans = self.local.spans = []
+        return spans
+
+    def enter(self):
+        """Start measuring statements of current thread into new span, return it"""
+        span = {'statements': 0, 'rows': 0, 'time': 0.0, 'start': time.time()}
+        self.thread_spans().append(span)
+        return span
+
+    def leave(self, span):
+        """Stop measuring into span (must be innermost span of current thread)"""
+        span['time'] += time.time() - span['start']
+        self.local.spans.pop()
+
+    def record(self, name, span):
+        """Add measured span as one call of method name"""
+        with self.lock:
+            stats = self.methods.setdefault(name, {'calls': 0, 'statements': 0, 'rows': 0, 'time': 0.0, 'max_time': 0.0})
+            stats['calls'] += 1
+            stats['statements'] += span['statements']
+            stats['rows'] += span['rows']
+            stats['time'] += span['time']
+            stats['max_time'] = max(stats['max_time'], span['time'])
+
+    @contextmanager
+    def span(self, name):
+        """Measure one method call"""
+        span = self.enter()
+        try:
+            yield span
+        finally:
+            self.leave(span)
+            self.record(name, span)
+
+    def measure_iterator(self, name, iterator, span):
+        """
+        Yield items of iterator returned by method name, continue measuring into span
+        while items are produced (not while caller processes them), record call when
+        iteration ends or generator is closed
+        """
+        try:
+            while True:
+                span['start'] = time.time()
+                self.thread_spans().append(span)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.leave(span)
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            self.record(name, span)
+
+    def snapshot(self):
+        """Return dictionary with copy of collected statistics"""
+        with self.lock:
+            return {
+                'statements': self.statements,
+                'rows': self.rows,
+                'errors': self.errors,
+                'statement_time': self.statement_time,
+                'slow_statements': self.slow_statements,
+                'slow_log': list(self.slow_log),
+                'methods': dict((name, dict(stats)) for name, stats in self.methods.items()),
+            }
+
+    def prometheus(self, prefix="rtapi"):
+        """Return statistics in Prometheus text exposition format"""
+        stats = self.snapshot()
+        lines = []
+
+        def metric(name, help_text, values):
+            lines.append("# HELP %s_%s %s" % (prefix, name, help_text))
+            lines.append("# TYPE %s_%s counter" % (prefix, name))
+            for labels, value in values:
+                lines.append("%s_%s%s %s" % (prefix, name, labels, repr(value)))
+
+        metric("statements_total", "SQL statements executed.", [("", stats['statements'])])
+        metric("statement_rows_total", "Rows returned or affected by SQL statements.", [("", stats['rows'])])
+        metric("statement_errors_total", "SQL statements which raised error.", [("", stats['errors'])])
+        metric("statement_seconds_total", "Time spent executing SQL statements.", [("", stats['statement_time'])])
+        metric("slow_statements_total", "SQL statements slower than threshold.", [("", stats['slow_statements'])])
+
+        methods = sorted(stats['methods'].items())
+        for name, key, help_text in (("method_calls_total", 'calls', "Method calls."),
+                                     ("method_statements_total", 'statements', "SQL statements issued by method."),
+                                     ("method_rows_total", 'rows', "Rows returned or affected by method statements."),
+                                     ("method_seconds_total", 'time', "Wall time spent in method.")):
+            metric(name, help_text, [('{method="%s"}' % method, method_stats[key]) for method, method_stats in methods])
+        return "\n".join(lines) + "\n"
+
+
+class LogBuffer:
+    """
+    Write-behind buffer of ObjectLog and IPv4Log rows.
+    Rows keep time of the call and are written by RTObject in multi-row
+    inserts when max_rows rows of unit of work are waiting, when the oldest
+    of them is older than max_age seconds (checked only when new row is
+    added, there is no timer), at commit and
+    at close() or interpreter exit. Rows are tagged with unit of work
+    (transaction) they belong to, so rollback can discard them.
+    """
+
+    def __init__(self, max_rows=500, max_age=5.0):
+        """Initialize empty buffer"""
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.rows = []
+        self.lock = threading.Lock()
+
+    def add(self, table, tag, row):
+        """Add row (table is ObjectLog or IPv4Log)"""
+        with self.lock:
+            self.rows.append((table, tag, time.time(), row))
+
+    def due(self, tag):
+        """Check if rows of unit of work tag should be flushed, rows of other units don't count"""
+        with self.lock:
+            times = [entry[2] for entry in self.rows if entry[1] is tag]
+        if not times:
+            return False
+        if self.max_rows is not None and len(times) >= self.max_rows:
+            return True
+        return self.max_age is not None and time.time() - times[0] >= self.max_age
+
+    def take(self, tag):
+        """Remove and return entries of unit of work tag"""
+        with self.lock:
+            taken = [entry for entry in self.rows if entry[1] is tag]
+            self.rows = [entry for entry in self.rows if entry[1] is not tag]
+        return taken
+
+    def restore(self, entries):
+        """Put entries returned by take() back, e.g. when writing them failed"""
+        with self.lock:
+            self.rows[:0] = entries
+
+    @staticmethod
+    def by_table(entries):
+        """Return rows of entries grouped by table"""
+        result = {}
+        for table, tag, added, row in entries:
+            result.setdefault(table, []).append(row)
+        return result
+
+    def discard(self, tag):
+        """Drop rows of unit of work tag"""
+        self.take(tag)
+
+    def pending(self):
+        """Number of buffered rows"""
+        return len(self.rows)
+
+
+def flush_logs_at_exit(reference):
+    """Flush log buffer of RTObject at interpreter exit"""
+    rtobject = reference()
+    if rtobject is not None and rtobject.log_buffer is not None:
+        try:
+            rtobject.FlushLogs(None)
+        except Exception:
+            logging.getLogger("rtapi_bk").exception("Failed to flush buffered logs at exit")
+
+
+# Change event read from ObjectLog (object_id set) or IPv4Log (ip set),
+# cursor is position right after the change for resuming ChangesSince
+Change = namedtuple("Change", ["kind", "table", "log_id", "object_id", "ip", "date", "user", "message", "cursor"])
+
+# Change kinds recognized in ObjectLog messages written by RTObject, first match wins
+CHANGE_KINDS = [
+    ('link', re.compile(r"connection|Disconnected|port links")),
+    ('ip', re.compile(r"\bIP|\bips\b")),
+    ('port', re.compile(r"interface")),
+    ('virtual', re.compile(r"virtual")),
+    ('chassis', re.compile(r"Blade Chassis|Linked with server|Unlinked server")),
+]
+
+
+def change_kind(message):
+    """Return kind of ObjectLog message (link, ip, port, virtual, chassis or object)"""
+    for kind, pattern in CHANGE_KINDS:
+        if pattern.search(message or ""):
+            return kind
+    return 'object'
+
+
+class ChangeCursor(namedtuple("ChangeCursor", ["object_log_id", "ipv4_log_id"])):
+    """
+    Position in change feed, last seen ObjectLog and IPv4Log ids.
+    str(cursor) returns text accepted by ChangeCursor.parse() and ChangesSince.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return "%d:%d" % self
+
+    @classmethod
+    def parse(cls, text):
+        """Create cursor from text returned by str(cursor)"""
+        try:
+            object_log_id, ipv4_log_id = text.split(":")
+            return cls(int(object_log_id), int(ipv4_log_id))
+        except ValueError:
+            raise ValueError("Invalid change cursor %r" % text)
+
+
+class ChangePoller:
+    """
+    Follow change feed of RTObject and invalidate registered caches.
+    Every poll() reads changes since previous poll, calls callbacks
+    registered for their kind and drops object cache entries of changed
+    objects. Poller starts at current end of feed unless cursor is given.
+
+    Log ids are allocated at insert but become visible at commit, so a log
+    written in long transaction can appear below ids already processed.
+    Every poll therefore re-reads last lookback ids of both logs and skips
+    changes it has already processed. Logs committed more than lookback ids
+    late, or before the first poll below starting cursor, are missed.
+    """
+
+    def __init__(self, rtobject, cursor=None, lookback=1000):
+        """Initialize poller"""
+        self.rtobject = rtobject
+        self.cursor = cursor if cursor is not None else rtobject.GetChangeCursor()
+        self.lookback = lookback
+        self.callbacks = []
+        # (table, log id) of changes processed within lookback window, None before first poll
+        self.seen = None
+
+    def register(self, callback, kinds=None):
+        """Call callback(change) for changes of kinds (list of kinds, None for all)"""
+        self.callbacks.append((callback, set(kinds) if kinds is not None else None))
+
+    def register_cache(self, cache, kinds=None):
+        """Clear cache (object with clear() method, e.g. LookupCache) on changes of kinds"""
+        self.register(lambda change: cache.clear(), kinds)
+
+    def poll(self):
+        """Process new changes, return number of changes"""
+        priming = self.seen is None
+        if priming:
+            self.seen = set()
+        start = ChangeCursor(max(self.cursor.object_log_id - self.lookback, 0), max(self.cursor.ipv4_log_id - self.lookback, 0))
+        position = list(self.cursor)
+        count = 0
+        for change in self.rtobject.ChangesSince(start):
+            key = (change.table, change.log_id)
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            table = 0 if change.table == 'ObjectLog' else 1
+            if priming and change.log_id <= self.cursor[table]:
+                # Processed before this poller started
+                continue
+            if change.object_id is not None:
+                self.rtobject.InvalidateObjectCache(change.object_id)
+            for callback, kinds in self.callbacks:
+                if kinds is None or change.kind in kinds:
+                    callback(change)
+            position[table] = max(position[table], change.log_id)
+            count += 1
+        self.cursor = ChangeCursor(*position)
+        # Forget changes which fell out of lookback window
+        self.seen = set(key for key in self.seen
+                        if key[1] > self.cursor[0 if key[0] == 'ObjectLog' else 1] - self.lookback)
+        return count
+
+    def run(self, interval=5.0, stop=None):
+        """Poll every interval seconds until stop (threading.Event) is set"""
+        stop = stop or threading.Event()
+        while True:
+            self.poll()
+            if stop.wait(interval):
+                break
+
+
+def instrumented(func):
+    """
+    Decorator measuring RTObject method calls when instrumentation is enabled.
+    Methods returning generator are measured until iteration ends.
+    Only inventory API methods are decorated, feature switches and
+    bookkeeping helpers (caches, indexes, log buffer) are not measured.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return func(self, *args, **kwargs)
+        span = instrumentation.enter()
+        try:
+            result = func(self, *args, **kwargs)
+        except BaseException:
+            instrumentation.leave(span)
+            instrumentation.record(func.__name__, span)
+            raise
+        instrumentation.leave(span)
+        if inspect.isgenerator(result):
+            return instrumentation.measure_iterator(func.__name__, result, span)
+        instrumentation.record(func.__name__, span)
+        return result
+    return wrapper
 
 
 class RTObject:
@@ -60,41 +1229,323 @@ class RTObject:
 
     This Class needs only one parameter and it's
     database object.
+
+    By default every write is committed immediately. With
+    autocommit=False nothing is committed until db_commit() is
+    called or a transaction() block exits.
+
+    Instead of database object it's possible to pass ConnectionPool
+    as pool parameter. Every call then checks out its own connection
+    (transaction() holds one for the whole block), so one RTObject
+    can be shared by many threads.
     """
 
     # Init method
-    def __init__(self, dbobject):
+    def __init__(self, dbobject=None, autocommit=True, pool=None):
         """Initialize Object"""
         # Open configuration file
-        self.db = dbobject
-        self.dbresult = self.db.cursor()
+        self.pool = pool
+        self.local = threading.local()
+        self.dbobject = dbobject
+        self.dbcursor = dbobject.cursor() if dbobject is not None else None
+        self.autocommit = autocommit
+        self.in_chunk_size = 1000
+        self.iter_chunk_size = 1000
+        self.object_cache = None
+        self.dictionary_index = None
+        self.attribute_registry = None
+        self.tag_index = None
+        self.instrumentation = None
+        self.log_buffer = None
+
+    @property
+    def db(self):
+        """Database connection (in pool mode connection held by current thread or None)"""
+        if self.pool is None:
+            return self.dbobject
+        return getattr(self.local, 'db', None)
+
+    @property
+    def dbresult(self):
+        """Database cursor (in pool mode cursor held by current thread or None)"""
+        if self.pool is None:
+            return self.dbcursor
+        return getattr(self.local, 'dbresult', None)
+
+    @property
+    def tx_depth(self):
+        """Transaction nesting level of current thread"""
+        return getattr(self.local, 'tx_depth', 0)
+
+    @tx_depth.setter
+    def tx_depth(self, value):
+        self.local.tx_depth = value
 
     # DATABASE methods
+    @contextmanager
+    def db_connection(self, hold=False):
+        """
+        Context manager yielding (connection, cursor) for next statement.
+        In pool mode connection is checked out for the statement only,
+        unless current thread already holds one or hold is True.
+        """
+        if self.pool is None or self.db is not None:
+            yield self.db, self.dbresult
+            return
+        if hold:
+            self.db_hold()
+            yield self.db, self.dbresult
+            return
+
+        connection = self.pool.acquire()
+        try:
+            cursor = connection.cursor()
+            yield connection, cursor
+            cursor.close()
+        except Exception:
+            self.pool.release(connection, broken=not self.db_reset(connection))
+            raise
+        # End read snapshot of connection (autocommit is off), so next
+        # statement on it sees rows committed by other connections
+        self.pool.release(connection, broken=not self.db_reset(connection))
+
+    def db_hold(self):
+        """In pool mode check out connection and keep it for current thread until commit or rollback"""
+        if self.pool is not None and self.db is None:
+            connection = self.pool.acquire()
+            self.local.db = connection
+            self.local.dbresult = connection.cursor()
+
+    def db_unhold(self, broken=False):
+        """In pool mode return connection held by current thread back to pool"""
+        if self.pool is not None and self.db is not None:
+            connection = self.local.db
+            self.local.db = None
+            self.local.dbresult = None
+            self.pool.release(connection, broken)
+
+    def db_reset(self, connection):
+        """Rollback connection after error, return False if connection is broken"""
+        try:
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def db_execute(self, cursor, sql, params, many=False):
+        """Execute statement on cursor, all statements go through this method"""
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            if many:
+                cursor.executemany(sql, params)
+            else:
+                cursor.execute(sql, params)
+            return
+
+        instrumentation.before_statement(sql, params)
+        start = time.time()
+        error = None
+        try:
+            if many:
+                cursor.executemany(sql, params)
+            else:
+                cursor.execute(sql, params)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            instrumentation.after_statement(sql, params, getattr(cursor, 'rowcount', 0), time.time() - start, error)
+
     def db_query_one(self, sql, params):
         """
         SQL query function, return one row.
         Require sql query as parameter
         """
-        self.dbresult.execute(sql, params)
-        return self.dbresult.fetchone()
+        with self.db_connection() as (db, cursor):
+            self.db_execute(cursor, sql, params)
+            return cursor.fetchone()
 
     def db_query_all(self, sql, params):
         """
         SQL query function, return all rows.
         Require sql query as parameter
         """
-        self.dbresult.execute(sql, params)
-        return self.dbresult.fetchall()
+        with self.db_connection() as (db, cursor):
+            self.db_execute(cursor, sql, params)
+            return cursor.fetchall()
 
     def db_insert(self, sql, params):
         """SQL insert/update function. Require sql query as parameter"""
-        self.dbresult.execute(sql, params)
-        self.db.commit()
+        commit = self.autocommit and self.tx_depth == 0
+        with self.db_connection(hold=not commit) as (db, cursor):
+            self.db_execute(cursor, sql, params)
+            self.local.lastrowid = cursor.lastrowid
+            if commit:
+                db.commit()
+
+    def db_insert_many(self, sql, params_list):
+        """
+        SQL insert/update function for many rows at once.
+        Require sql query and list of params as parameters
+        """
+        commit = self.autocommit and self.tx_depth == 0
+        with self.db_connection(hold=not commit) as (db, cursor):
+            self.db_execute(cursor, sql, params_list, many=True)
+            self.local.lastrowid = cursor.lastrowid
+            if commit:
+                db.commit()
+
+    def db_in_chunks(self, sql, values, params, placeholder):
+        """Yield (sql, params) for every chunk of values, see db_query_all_in"""
+        values = list(values)
+        repeat = sql.count("{in}")
+        for start in range(0, len(values), self.in_chunk_size):
+            chunk = tuple(values[start:start + self.in_chunk_size])
+            chunk_sql = sql.format(**{'in': ", ".join([placeholder] * len(chunk))})
+            yield chunk_sql, tuple(params) + chunk * repeat
+
+    def db_query_all_in(self, sql, values, params=(), placeholder="%s"):
+        """
+        SQL query function for long IN lists, return all rows.
+        The sql query must contain {in} placeholder which is replaced
+        by list of values (every occurrence gets the same list).
+        Values are sent in chunks of in_chunk_size.
+        """
+        result = []
+        for chunk_sql, chunk_params in self.db_in_chunks(sql, values, params, placeholder):
+            result.extend(self.db_query_all(chunk_sql, chunk_params))
+        return result
+
+    def db_insert_in(self, sql, values, params=(), placeholder="%s"):
+        """
+        SQL update/delete function for long IN lists.
+        Same {in} placeholder rules as db_query_all_in.
+        """
+        for chunk_sql, chunk_params in self.db_in_chunks(sql, values, params, placeholder):
+            self.db_insert(chunk_sql, chunk_params)
+
+    def db_iter(self, first_sql, next_sql, params, keyfunc, chunk_size=None):
+        """
+        SQL query generator, yield rows page by page.
+        first_sql returns first page, next_sql returns rows after key
+        of last row returned by keyfunc(row). Both queries must end
+        with ORDER BY key LIMIT %s. Every generator uses its own cursor
+        (in pool mode its own connection) and holds at most one page,
+        so other queries can be run while iterating.
+        """
+        chunk_size = chunk_size or self.iter_chunk_size
+        connection = None
+        if self.db is not None:
+            cursor = self.db.cursor()
+        else:
+            connection = self.pool.acquire()
+            cursor = connection.cursor()
+        try:
+            sql = first_sql
+            page_params = tuple(params)
+            while True:
+                self.db_execute(cursor, sql, page_params + (chunk_size,))
+                rows = cursor.fetchall()
+                for row in rows:
+                    yield row
+                if len(rows) < chunk_size:
+                    break
+                sql = next_sql
+                page_params = tuple(params) + tuple(keyfunc(rows[-1]))
+        finally:
+            cursor.close()
+            if connection is not None:
+                self.pool.release(connection, broken=not self.db_reset(connection))
+
+    def db_commit(self):
+        """Commit all pending changes"""
+        if self.log_buffer is not None:
+            # Write buffered logs of this unit of work inside it
+            self.tx_depth += 1
+            try:
+                self.FlushLogs()
+            finally:
+                self.tx_depth -= 1
+            self.local.log_tag = None
+        if self.db is not None:
+            self.db.commit()
+            self.db_unhold()
+
+    def db_rollback(self):
+        """Discard all pending changes"""
+        if self.log_buffer is not None:
+            self.log_buffer.discard(getattr(self.local, 'log_tag', None))
+            self.local.log_tag = None
+        if self.db is not None:
+            try:
+                self.db.rollback()
+            except Exception:
+                self.db_unhold(broken=True)
+                raise
+            self.db_unhold()
+        if self.object_cache is not None:
+            self.object_cache.clear()
+        if self.dictionary_index is not None:
+            self.dictionary_index.stale = True
+        if self.attribute_registry is not None:
+            self.attribute_registry.stale = True
+
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work context manager. Writes inside the block are
+        committed once when the outermost block exits, or rolled back
+        when it raises. Blocks can be nested.
+        """
+        if self.tx_depth == 0:
+            self.db_hold()
+        self.tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.tx_depth -= 1
+            if self.tx_depth == 0:
+                self.db_rollback()
+            raise
+        self.tx_depth -= 1
+        if self.tx_depth == 0:
+            try:
+                self.db_commit()
+            except BaseException:
+                self.db_rollback()
+                raise
+
+    @contextmanager
+    def write_batch(self):
+        """
+        Group writes of one method into single commit. Unlike transaction()
+        it never commits when RTObject was created with autocommit=False.
+        """
+        if self.autocommit:
+            with self.transaction():
+                yield self
+        else:
+            yield self
 
     def db_fetch_lastid(self):
         """SQL function which return ID of last inserted row."""
-        return self.dbresult.lastrowid
+        if self.pool is None:
+            return self.dbresult.lastrowid
+        return getattr(self.local, 'lastrowid', None)
 
+    def close(self):
+        """
+        Write buffered logs and close connection pool.
+        Connection passed as dbobject stays open
+        """
+        if self.log_buffer is not None:
+            self.FlushLogs(None)
+        if self.pool is not None:
+            if self.db is not None:
+                self.db_unhold(broken=not self.db_reset(self.db))
+            self.pool.close()
+
+    @instrumented
     def ListObjects(self, data='sum'):
         """
         List all objects from database
@@ -108,14 +1559,366 @@ class RTObject:
             sql = """SELECT count(name) FROM Object"""
             return "Found " + str(self.db_query_one(sql, None)[0]) + " objects in database"
 
+    @instrumented
     def ListObjectsByType(self, object_tid):
         """
         Get list of objects based on object type ID
         """
-        sql = """"SELECT id,name,asset_no,label,comment,has_problems from Object WHERE objtype_id = %s"""
+        sql = """SELECT id,name,asset_no,label,comment,has_problems from Object WHERE objtype_id = %s"""
         return self.db_query_all(sql, (object_tid,))
 
+    @instrumented
+    def IterObjects(self, chunk_size=None):
+        """
+        Iterate over all objects in database without loading them all into memory
+        Yield tuples id,name,asset_no,objtype_id
+        """
+        first_sql = """SELECT id,name,asset_no,objtype_id FROM Object ORDER BY id LIMIT %s"""
+        next_sql = """SELECT id,name,asset_no,objtype_id FROM Object WHERE id > %s ORDER BY id LIMIT %s"""
+        return self.db_iter(first_sql, next_sql, (), lambda row: (row[0],), chunk_size)
+
+    @instrumented
+    def IterObjectsByType(self, object_tid, chunk_size=None):
+        """
+        Iterate over objects of object type ID without loading them all into memory
+        Yield tuples id,name,asset_no,label,comment,has_problems
+        """
+        first_sql = """SELECT id,name,asset_no,label,comment,has_problems FROM Object WHERE objtype_id = %s ORDER BY id LIMIT %s"""
+        next_sql = """SELECT id,name,asset_no,label,comment,has_problems FROM Object WHERE objtype_id = %s AND id > %s ORDER BY id LIMIT %s"""
+        return self.db_iter(first_sql, next_sql, (object_tid,), lambda row: (row[0],), chunk_size)
+
+    # Snapshot tables: (table, key columns, [(column, kind), ...])
+    snapshot_tables = [
+        ("Object", ("id",), [("id", "int"), ("name", "str"), ("label", "str"), ("objtype_id", "int"),
+                             ("asset_no", "str"), ("has_problems", "str"), ("comment", "str")]),
+        ("AttributeValue", ("object_id", "attr_id"), [("object_id", "int"), ("object_tid", "int"), ("attr_id", "int"),
+                                                      ("string_value", "str"), ("uint_value", "int"), ("float_value", "float")]),
+        ("Port", ("id",), [("id", "int"), ("object_id", "int"), ("name", "str"), ("iif_id", "int"), ("type", "int"),
+                           ("l2address", "str"), ("reservation_comment", "str"), ("label", "str")]),
+        ("IPv4Allocation", ("object_id", "ip"), [("object_id", "int"), ("ip", "ip"), ("name", "str"), ("type", "str")]),
+        ("Link", ("porta",), [("porta", "int"), ("portb", "int"), ("cable", "int")]),
+    ]
+
+    def db_iter_table(self, table, key, columns, chunk_size=None):
+        """
+        Iterate over whole table ordered by key (one or two columns of primary key)
+        Yield tuples of columns
+        """
+        select = "SELECT %s FROM %s" % (", ".join(columns), table)
+        order = " ORDER BY %s LIMIT %%s" % ", ".join(key)
+        positions = [columns.index(column) for column in key]
+        if len(key) == 1:
+            where = " WHERE %s > %%s" % key[0]
+            keyfunc = lambda row: (row[positions[0]],)
+        else:
+            where = " WHERE %s > %%s OR (%s = %%s AND %s > %%s)" % (key[0], key[0], key[1])
+            keyfunc = lambda row: (row[positions[0]], row[positions[0]], row[positions[1]])
+        return self.db_iter(select + order, select + where + order, (), keyfunc, chunk_size)
+
+    @instrumented
+    def ExportSnapshot(self, path, tables=None, chunk_size=None):
+        """
+        Stream inventory tables (Object, AttributeValue, Port, IPv4Allocation, Link)
+        into compact columnar snapshot file, tables limits export to given table names.
+        Open snapshot with rtapi_bk.Snapshot(path).
+        Return dictionary table name: number of rows
+        """
+        writer = SnapshotWriter(path)
+        counts = OrderedDict()
+        try:
+            for table, key, columns in self.snapshot_tables:
+                if tables is not None and table not in tables:
+                    continue
+                names = [column for column, kind in columns]
+                counts[table] = writer.add_table(table, columns, self.db_iter_table(table, key, names, chunk_size))
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        return counts
+
+    # Instrumentation methods
+    def EnableInstrumentation(self, slow_threshold=1.0, instrumentation=None):
+        """
+        Start collecting statement and method statistics.
+        Return Instrumentation object with snapshot() and prometheus() methods.
+        """
+        self.instrumentation = instrumentation or Instrumentation(slow_threshold)
+        return self.instrumentation
+
+    def DisableInstrumentation(self):
+        """Stop collecting statistics"""
+        self.instrumentation = None
+
+    # Object cache methods
+    def EnableObjectCache(self, size=1024, ttl=300):
+        """
+        Serve object name/id/asset lookups from bounded LRU cache.
+        Entries expire after ttl seconds. Return cache object with hit/miss counters.
+        """
+        self.object_cache = LookupCache(size, ttl)
+        return self.object_cache
+
+    def DisableObjectCache(self):
+        """Stop using object lookup cache"""
+        self.object_cache = None
+
+    def CachedObjectLookup(self, column, value):
+        """
+        Get (id, name) of object by column (id, name or asset_no) through object cache.
+        Return None if object doesn't exist
+        """
+        key = (column, value)
+        found, row = self.object_cache.get(key)
+        if found:
+            return row
+
+        sql = """SELECT id, name FROM Object WHERE %s = %%s""" % column
+        row = self.db_query_one(sql, (value,))
+        if row is not None:
+            row = (row[0], row[1])
+            self.object_cache.put(('id', row[0]), row)
+            self.object_cache.put(('name', row[1]), row)
+        self.object_cache.put(key, row)
+        return row
+
+    def InvalidateObjectCache(self, object_id=None):
+        """
+        Drop cached negative lookups and all entries of object_id.
+        Called automatically by methods changing objects.
+        """
+        if self.object_cache is not None:
+            self.object_cache.discard_if(lambda key, row: row is None or row[0] == object_id)
+
+    @instrumented
+    def ResolveObjectIds(self, names):
+        """
+        Translate many object names to ids in chunked IN queries.
+        Return dictionary name: id, names not found in database are missing
+        """
+        return self.ResolveObjects('name', names)
+
+    @instrumented
+    def ResolveObjectNames(self, object_ids):
+        """
+        Translate many object ids to names in chunked IN queries.
+        Return dictionary id: name, ids not found in database are missing
+        """
+        return self.ResolveObjects('id', object_ids)
+
+    def ResolveObjects(self, column, values):
+        """
+        Translate many values of column (name or id) into other column
+        using object cache when enabled. Return dictionary value: result
+        """
+        result = {}
+        requested = {}
+        for value in values:
+            if value is None:
+                continue
+            if self.object_cache is not None:
+                found, row = self.object_cache.get((column, value))
+                if found:
+                    if row is not None:
+                        result[value] = row[1] if column == 'id' else row[0]
+                    continue
+            # MySQL compares names case-insensitive, answer in every requested form
+            forms = requested.setdefault(value.lower() if column == 'name' else int(value), [])
+            if value not in forms:
+                forms.append(value)
+
+        if requested:
+            sql = """SELECT id, name FROM Object WHERE %s IN ({in})""" % column
+            for object_id, name in self.db_query_all_in(sql, [forms[0] for forms in requested.values()]):
+                forms = requested.pop(name.lower() if column == 'name' else object_id, [name if column == 'name' else object_id])
+                for value in forms:
+                    result[value] = object_id if column == 'name' else name
+                if self.object_cache is not None:
+                    self.object_cache.put(('id', object_id), (object_id, name))
+                    self.object_cache.put(('name', name), (object_id, name))
+                    for value in forms:
+                        self.object_cache.put((column, value), (object_id, name))
+            if self.object_cache is not None:
+                for forms in requested.values():
+                    for value in forms:
+                        self.object_cache.put((column, value), None)
+
+        return result
+
+    # Object graph loading, relation name: loader method
+    # Loader takes list of object ids and returns dictionary object_id: list of rows
+    object_relations = OrderedDict([
+        ("attributes", "GetObjectsAttributes"),
+        ("ports", "GetObjectsPorts"),
+        ("links", "GetObjectsLinks"),
+        ("ipv4", "GetObjectsIpv4IPs"),
+        ("ipv6", "GetObjectsIpv6IPs"),
+        ("tags", "GetObjectsTags"),
+        ("parents", "GetObjectsParents"),
+        ("children", "GetObjectsChildren"),
+    ])
+
+    @instrumented
+    def LoadObjects(self, object_ids, include=()):
+        """
+        Load objects with requested relations (see object_relations) in one
+        query per relation, independent of number of objects.
+        Return OrderedDict object_id: dictionary with columns of Object
+        (id, name, label, objtype_id, asset_no, has_problems, comment) and
+        one list per included relation, ids not found in database are missing
+        """
+        include = list(include)
+        for relation in include:
+            if relation not in self.object_relations:
+                raise ValueError("Unknown relation %s" % relation)
+        objects = OrderedDict()
+        for row in self.db_object_rows(object_ids):
+            objects[row[0]] = dict(zip(Object.fields, row))
+
+        for relation in include:
+            loaded = getattr(self, self.object_relations[relation])(list(objects))
+            for object_id, record in objects.items():
+                record[relation] = loaded.get(object_id, [])
+        return objects
+
+    def db_object_rows(self, object_ids):
+        """
+        Get rows id, name, label, objtype_id, asset_no, has_problems, comment
+        of objects in order of object_ids, ids not found in database are skipped
+        """
+        object_ids = list(OrderedDict.fromkeys(int(object_id) for object_id in object_ids))
+        sql = """SELECT id, name, label, objtype_id, asset_no, has_problems, comment FROM Object WHERE id IN ({in})"""
+        rows = dict((row[0], row) for row in self.db_query_all_in(sql, object_ids))
+        return [rows[object_id] for object_id in object_ids if object_id in rows]
+
+    @instrumented
+    def LoadObjectRecords(self, object_ids, include=()):
+        """
+        Load objects as rtapi_bk.records.Object records in order of object_ids.
+        Relations in include are loaded immediately, others on first access,
+        always for all returned records at once.
+        """
+        for relation in include:
+            if relation not in self.object_relations:
+                raise ValueError("Unknown relation %s" % relation)
+        records = Object.from_rows(self.db_object_rows(object_ids), self)
+        if records:
+            for relation in include:
+                getattr(records[0], relation)
+        return records
+
+    @instrumented
+    def IterObjectRecords(self, chunk_size=None):
+        """
+        Iterate over all objects as rtapi_bk.records.Object records.
+        Records of every chunk form one group, so lazy relations are
+        loaded one query per relation and chunk.
+        """
+        chunk_size = chunk_size or self.iter_chunk_size
+        columns = ("id", "name", "asset_no", "objtype_id")
+        chunk = []
+        for row in self.IterObjects(chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                for record in Object.from_rows(chunk, self, columns):
+                    yield record
+                chunk = []
+        for record in Object.from_rows(chunk, self, columns):
+            yield record
+
+    def db_group_rows(self, sql, object_ids):
+        """
+        Run {in} query whose first column is object id for all object_ids.
+        Return dictionary object_id: list of rows without first column
+        """
+        object_ids = [int(object_id) for object_id in object_ids]
+        result = dict((object_id, []) for object_id in object_ids)
+        if object_ids:
+            for row in self.db_query_all_in(sql, object_ids):
+                result[row[0]].append(row[1:])
+        return result
+
+    @instrumented
+    def GetObjectsAttributes(self, object_ids):
+        """
+        Get attributes of many objects at once.
+        Return dictionary object_id: list of (attr_id, attr_name, attr_type,
+        string_value, uint_value, float_value, dict_value) ordered by name
+        """
+        sql = """SELECT av.object_id, av.attr_id, a.name, a.type, av.string_value, av.uint_value, av.float_value, d.dict_value
+                 FROM AttributeValue AS av
+                 JOIN Attribute AS a ON (av.attr_id=a.id)
+                 LEFT JOIN Dictionary AS d ON (a.type = 'dict' AND d.dict_key=av.uint_value)
+                 WHERE av.object_id IN ({in}) ORDER BY a.name"""
+        return self.db_group_rows(sql, object_ids)
+
+    @instrumented
+    def GetObjectsPorts(self, object_ids):
+        """
+        Get ports of many objects at once.
+        Return dictionary object_id: list of (id, name, type, l2address, label)
+        """
+        sql = """SELECT object_id, id, name, type, l2address, label FROM Port WHERE object_id IN ({in}) ORDER BY name"""
+        return self.db_group_rows(sql, object_ids)
+
+    @instrumented
+    def GetObjectsLinks(self, object_ids):
+        """
+        Get links of ports of many objects at once.
+        Return dictionary object_id: list of (port_id, port_name,
+        remote_port_id, remote_port_name, remote_object_id, remote_object_name)
+        """
+        sql = """SELECT p.object_id, p.id, p.name, rp.id, rp.name, ro.id, ro.name
+                 FROM Port AS p JOIN Link AS l ON l.porta = p.id
+                 JOIN Port AS rp ON rp.id = l.portb JOIN Object AS ro ON ro.id = rp.object_id
+                 WHERE p.object_id IN ({in})
+                 UNION ALL
+                 SELECT p.object_id, p.id, p.name, rp.id, rp.name, ro.id, ro.name
+                 FROM Port AS p JOIN Link AS l ON l.portb = p.id
+                 JOIN Port AS rp ON rp.id = l.porta JOIN Object AS ro ON ro.id = rp.object_id
+                 WHERE p.object_id IN ({in})"""
+        return self.db_group_rows(sql, object_ids)
+
+    @instrumented
+    def GetObjectsIpv4IPs(self, object_ids, raw=False):
+        """
+        Get IPv4 allocations of many objects at once.
+        Return dictionary object_id: list of (ip, name, type), raw=True returns ints stored in database
+        """
+        sql = """SELECT object_id, %s AS ip, name, type FROM IPv4Allocation WHERE object_id IN ({in})""" % ipv4_column(raw)
+        return self.db_group_rows(sql, object_ids)
+
+    @instrumented
+    def GetObjectsIpv6IPs(self, object_ids, raw=False):
+        """
+        Get IPv6 allocations of many objects at once.
+        Return dictionary object_id: list of (ip, name, type), raw=True returns 16 bytes stored in database
+        """
+        sql = """SELECT object_id, %s AS ip, name, type FROM IPv6Allocation WHERE object_id IN ({in})""" % ipv6_column(raw)
+        return self.db_group_rows(sql, object_ids)
+
+    @instrumented
+    def GetObjectsParents(self, object_ids):
+        """
+        Get parent objects (EntityLink) of many objects at once.
+        Return dictionary object_id: list of (parent_id, parent_name)
+        """
+        sql = """SELECT el.child_entity_id, o.id, o.name FROM EntityLink AS el JOIN Object AS o ON o.id = el.parent_entity_id
+                 WHERE el.child_entity_type = 'object' AND el.parent_entity_type = 'object' AND el.child_entity_id IN ({in})"""
+        return self.db_group_rows(sql, object_ids)
+
+    @instrumented
+    def GetObjectsChildren(self, object_ids):
+        """
+        Get child objects (EntityLink) of many objects at once.
+        Return dictionary object_id: list of (child_id, child_name)
+        """
+        sql = """SELECT el.parent_entity_id, o.id, o.name FROM EntityLink AS el JOIN Object AS o ON o.id = el.child_entity_id
+                 WHERE el.parent_entity_type = 'object' AND el.child_entity_type = 'object' AND el.parent_entity_id IN ({in})"""
+        return self.db_group_rows(sql, object_ids)
+
     # Object methotds
+    @instrumented
     def ObjectExistST(self, service_tag):
         """Check if object exist in database based on asset_no"""
         sql = """SELECT name FROM Object WHERE asset_no = %s"""
@@ -124,14 +1927,19 @@ class RTObject:
         else:
             return True
 
+    @instrumented
     def ObjectExistName(self, name):
         """Check if object exist in database based on name"""
+        if self.object_cache is not None:
+            return self.CachedObjectLookup('name', name) is not None
+
         sql = """select id from Object where name = %s"""
         if self.db_query_one(sql, (name,)) is None:
             return False
         else:
             return True
 
+    @instrumented
     def ObjectExistSTName(self, name, asset_no):
         """Check if object exist in database based on name"""
         sql = """SELECT id FROM Object WHERE name = %s AND asset_no = %s"""
@@ -140,39 +1948,97 @@ class RTObject:
         else:
             return True
 
+    @instrumented
     def AddObject(self, name, server_type_id, asset_no, label):
         """Add new object to racktables"""
         sql = """INSERT INTO Object (name, objtype_id, asset_no, label) VALUES (%s, %s, %s, %s)"""
         # params = (name.encode('utf-8'), server_type_id, asset_no.encode('utf-8'), label.encode('utf-8'))
         params = (name, server_type_id, asset_no, label)
         self.db_insert(sql, params)
+        self.InvalidateObjectCache()
         return self.db_fetch_lastid()
 
+    @instrumented
+    def AddObjects(self, records):
+        """
+        Add many new objects to racktables at once.
+        records is iterable of (name, objtype_id, asset_no, label).
+        Objects whose name or asset_no already exists in database
+        (or earlier in records) are skipped.
+        Return dictionary name: id of added objects
+        """
+        records = list(records)
+        names = set(rec[0] for rec in records)
+        assets = set(rec[2] for rec in records if rec[2] is not None)
+
+        # Find collisions in one query, MySQL compares names case-insensitive
+        sql = """SELECT name, asset_no FROM Object WHERE name IN ({in}) OR asset_no IN ({in})"""
+        used_names = set()
+        used_assets = set()
+        for name, asset_no in self.db_query_all_in(sql, names | assets):
+            used_names.add(name.lower())
+            if asset_no is not None:
+                used_assets.add(asset_no.lower())
+
+        params_list = []
+        for name, objtype_id, asset_no, label in records:
+            if name.lower() in used_names or (asset_no is not None and asset_no.lower() in used_assets):
+                continue
+            used_names.add(name.lower())
+            if asset_no is not None:
+                used_assets.add(asset_no.lower())
+            params_list.append((name, objtype_id, asset_no, label))
+
+        if not params_list:
+            return {}
+
+        sql = """INSERT INTO Object (name, objtype_id, asset_no, label) VALUES (%s, %s, %s, %s)"""
+        with self.write_batch():
+            for start in range(0, len(params_list), self.in_chunk_size):
+                self.db_insert_many(sql, params_list[start:start + self.in_chunk_size])
+        self.InvalidateObjectCache()
+
+        # Answer in requested form of names
+        requested = dict((params[0].lower(), params[0]) for params in params_list)
+        sql = """SELECT name, id FROM Object WHERE name IN ({in})"""
+        return dict((requested.get(name.lower(), name), object_id) for name, object_id in self.db_query_all_in(sql, requested.values()))
+
+    @instrumented
     def DeleteObject(self, objid):
         """Add new object to racktables"""
         sql = """DELETE FROM Object WHERE id = %s"""
         self.db_insert(sql, (objid,))
+        self.InvalidateObjectCache(int(objid))
 
+    @instrumented
     def UpdateObjectLabel(self, object_id, label):
         """Update label on object"""
         sql = """UPDATE Object SET label = %s where id = %s"""
         params = (label, object_id)
         self.db_insert(sql, params)
 
+    @instrumented
     def UpdateObjectComment(self, object_id, comment):
         """Update comment on object"""
         sql = """UPDATE Object SET comment = %s where id = %s"""
         params = (comment, object_id)
         self.db_insert(sql, params)
 
+    @instrumented
     def UpdateObjectName(self, object_id, name):
         """Update name on object"""
         sql = """UPDATE Object SET name = %s where id = %s"""
         params = (name, object_id)
         self.db_insert(sql, params)
+        self.InvalidateObjectCache(int(object_id))
 
+    @instrumented
     def GetObjectName(self, object_id):
         """Translate Object ID to Object Name"""
+        if self.object_cache is not None:
+            row = self.CachedObjectLookup('id', object_id)
+            return row[1] if row is not None else None
+
         # Get interface id
         sql = """SELECT name FROM Object WHERE id = %s"""
         result = self.db_query_one(sql, (object_id,))
@@ -183,8 +2049,13 @@ class RTObject:
 
         return object_name
 
+    @instrumented
     def GetObjectNameByAsset(self, service_tag):
         """Translate Object AssetTag to Object Name"""
+        if self.object_cache is not None:
+            row = self.CachedObjectLookup('asset_no', service_tag)
+            return row[1] if row is not None else None
+
         # Get interface id
         sql = """SELECT name FROM Object WHERE asset_no = %s"""
         result = self.db_query_one(sql, (service_tag,))
@@ -195,8 +2066,12 @@ class RTObject:
 
         return object_name
 
+    @instrumented
     def GetObjectIdByAsset(self, service_tag):
         """Get Object ID by Asset Tag"""
+        if self.object_cache is not None:
+            row = self.CachedObjectLookup('asset_no', service_tag)
+            return row[0] if row is not None else None
 
         sql = """SELECT id FROM Object WHERE asset_no = %s"""
         result = self.db_query_one(sql, (service_tag,))
@@ -207,6 +2082,7 @@ class RTObject:
 
         return object_id
 
+    @instrumented
     def GetObjectLabel(self, object_id):
         """Get object label"""
         # Get interface id
@@ -219,6 +2095,7 @@ class RTObject:
 
         return object_label
 
+    @instrumented
     def GetObjectComment(self, object_id):
         """Get object comment"""
         # Get interface id
@@ -231,15 +2108,39 @@ class RTObject:
 
         return object_comment
 
+    @instrumented
     def GetObjectTags(self, object_id):
         """Get object tags"""
+        if self.tag_index is not None:
+            return self.tag_index.object_tag_rows(int(object_id))
+
         sql = """SELECT t1.tag as parent_tag, t2.tag as tag FROM TagTree as t1 RIGHT JOIN TagTree as t2 ON t1.id = t2.parent_id WHERE t2.id IN (SELECT tag_id FROM TagStorage JOIN Object ON TagStorage.entity_id = Object.id WHERE TagStorage.entity_realm='object' and Object.id = %s)"""
         result = self.db_query_all(sql, (object_id,))
 
         return result
 
-    def GetObjectsByTag(self, tag_name):
-        """Get Array of objects from Racktables database by Tag name"""
+    @instrumented
+    def GetObjectsByTag(self, tag_name, descendants=False):
+        """
+        Get Array of objects from Racktables database by Tag name
+        With descendants=True objects tagged with any tag under tag_name are included
+        """
+        if self.tag_index is not None:
+            try:
+                object_ids = self.tag_index.objects_with(tag_name, descendants)
+            except ValueError:
+                return ()
+            names = self.ResolveObjectNames(object_ids)
+            return tuple((names[object_id], object_id) for object_id in sorted(names))
+
+        if descendants:
+            try:
+                tag_ids = self.LoadTagIndex(with_objects=False).descendants(tag_name)
+            except ValueError:
+                return ()
+            sql = """SELECT DISTINCT t1.name, t1.id FROM Object AS t1 JOIN TagStorage AS t2 ON t1.id = t2.entity_id
+                     WHERE t2.entity_realm = 'object' AND t2.tag_id IN ({in})"""
+            return self.db_query_all_in(sql, tag_ids)
 
         sql = """SELECT t1.name, \
                t1.id \
@@ -254,8 +2155,70 @@ class RTObject:
 
         return self.db_query_all(sql, (tag_name,))
 
+    @instrumented
+    def GetObjectsTags(self, object_ids):
+        """
+        Get tags of many objects at once.
+        Return dictionary object_id: sorted list of tag names
+        """
+        object_ids = [int(object_id) for object_id in object_ids]
+        if self.tag_index is not None:
+            return self.tag_index.tags_of(object_ids)
+
+        result = dict((object_id, []) for object_id in object_ids)
+        sql = """SELECT ts.entity_id, tt.tag FROM TagStorage AS ts JOIN TagTree AS tt ON ts.tag_id = tt.id
+                 WHERE ts.entity_realm = 'object' AND ts.entity_id IN ({in})"""
+        for object_id, tag in self.db_query_all_in(sql, object_ids):
+            result[object_id].append(tag)
+        for tags in result.values():
+            tags.sort()
+        return result
+
+    @instrumented
+    def SelectObjectsByTags(self, expression):
+        """
+        Get ids of objects matching tag expression, e.g. "{web} and ({prod} or {stage}) and not {old}".
+        Tags include their descendants. Uses enabled tag index, otherwise loads one for this call.
+        Return set of object ids
+        """
+        index = self.tag_index if self.tag_index is not None else self.LoadTagIndex()
+
+        def all_objects():
+            return [row[0] for row in self.db_query_all("""SELECT id FROM Object""", None)]
+        return index.select(expression, all_objects)
+
+    # Tag index methods
+    def EnableTagIndex(self):
+        """
+        Load TagTree and object tags from TagStorage into memory and serve
+        tag lookups from there. Call again to reload. Return TagIndex object.
+        """
+        self.tag_index = self.LoadTagIndex()
+        return self.tag_index
+
+    def LoadTagIndex(self, with_objects=True):
+        """Load TagTree (and object tags unless with_objects=False) into new TagIndex object"""
+        tag_rows = self.db_query_all("""SELECT id, parent_id, tag FROM TagTree""", None)
+        storage_rows = ()
+        if with_objects:
+            storage_rows = self.db_query_all("""SELECT entity_id, tag_id FROM TagStorage WHERE entity_realm = 'object'""", None)
+        return TagIndex(tag_rows, storage_rows)
+
+    def DisableTagIndex(self):
+        """Stop using in-memory tag index"""
+        self.tag_index = None
+
+    def GetTagIndex(self):
+        """Return enabled tag index or None"""
+        return self.tag_index
+
+    @instrumented
     def GetObjectId(self, name):
         """Translate Object name to object id"""
+        if self.object_cache is not None:
+            row = self.CachedObjectLookup('name', name)
+            return row[0] if row is not None else None
+
         # Get interface id
         sql = """SELECT id FROM Object WHERE name = %s"""
         result = self.db_query_one(sql, (name,))
@@ -266,11 +2229,13 @@ class RTObject:
 
         return object_id
 
+    @instrumented
     def ListDockerContainersOfHost(self, docker_host):
         """List all Docker containers of specified host"""
         sql = """SELECT name FROM IPv4Address WHERE comment = "Docker host: %s"""""
         return self.db_query_all(sql, (docker_host,))
 
+    @instrumented
     def AddDockerContainer(self, container_ip, container_name, docker_host):
         """Add new Docker container to racktables"""
         self.InsertIPv4Log(container_ip, "Name set to " + container_name + ", comment set to Docker host: " + docker_host + "")
@@ -278,6 +2243,7 @@ class RTObject:
         params = (container_ip, container_name, docker_host)
         self.db_insert(sql, params)
 
+    @instrumented
     def RemoveDockerContainerFromHost(self, container_name, docker_host):
         """Remove Docker container from racktables"""
         sql = """SELECT INET_NTOA(ip) FROM IPv4Address WHERE comment = 'Docker host: %s' AND name = %s"""
@@ -288,18 +2254,21 @@ class RTObject:
                     sql = """DELETE FROM IPv4Address WHERE ip = INET_ATON(%s)"""
                     self.db_insert(sql, (ip[0]))
 
+    @instrumented
     def UpdateDockerContainerName(self, ip, name):
         """Update Docker container name"""
         self.InsertIPv4Log(ip, "Name set to " + name + "")
         sql = """UPDATE IPv4Address SET name = %s WHERE ip = INET_ATON(%s)"""
         self.db_insert(sql, (name, ip))
 
+    @instrumented
     def UpdateDockerContainerHost(self, ip, host):
         """Update Docker container host"""
         self.InsertIPv4Log(ip, "Comment set to Docker host: " + host + "")
         sql = """UPDATE IPv4Address SET comment = 'Docker host: %s' WHERE ip = INET_ATON(%s)"""
         self.db_insert(sql, (host, ip))
 
+    @instrumented
     def GetDockerContainerName(self, ip):
         """Get Docker container name"""
         # Get interface id
@@ -311,6 +2280,7 @@ class RTObject:
             ip_name = None
         return ip_name
 
+    @instrumented
     def GetDockerContainerHost(self, ip):
         """Get Docker container host"""
         # Get interface id
@@ -324,19 +2294,201 @@ class RTObject:
         return host
 
     # Logging
+    @instrumented
     def InsertLog(self, object_id, message):
         """Attach log message to specific object"""
+        if self.log_buffer is not None:
+            return self.BufferLogs('ObjectLog', [(int(object_id), message)])
+
         sql = """INSERT INTO ObjectLog (object_id,user,date,content) VALUES (%s,'script',now(),%s)"""
         self.db_insert(sql, (int(object_id), message))
 
+    @instrumented
+    def InsertLogs(self, entries):
+        """
+        Attach many log messages at once.
+        entries is iterable of (object_id, message)
+        """
+        params_list = [(int(object_id), message) for object_id, message in entries]
+        if self.log_buffer is not None:
+            return self.BufferLogs('ObjectLog', params_list)
+
+        if params_list:
+            sql = """INSERT INTO ObjectLog (object_id,user,date,content) VALUES (%s,'script',now(),%s)"""
+            self.db_insert_many(sql, params_list)
+
+    @instrumented
     def InsertIPv4Log(self, ip, message):
         """Attach log message to IPv4"""
+        if self.log_buffer is not None:
+            return self.BufferLogs('IPv4Log', [(ip, message)])
+
         sql = """INSERT INTO IPv4Log (ip,user,date,message) VALUES (INET_ATON(%s),'script',now(),%s)"""
         self.db_insert(sql, (ip, message))
 
+    # Change feed methods
+    @instrumented
+    def GetChangeCursor(self, since=None):
+        """
+        Return ChangeCursor at current end of change feed,
+        or before first log written at or after datetime since
+        """
+        if since is None:
+            sql = """SELECT (SELECT IFNULL(MAX(id), 0) FROM ObjectLog), (SELECT IFNULL(MAX(id), 0) FROM IPv4Log)"""
+            result = self.db_query_one(sql, ())
+        else:
+            sql = """SELECT IFNULL((SELECT MIN(id) FROM ObjectLog WHERE date >= %s) - 1, (SELECT IFNULL(MAX(id), 0) FROM ObjectLog)),
+                            IFNULL((SELECT MIN(id) FROM IPv4Log WHERE date >= %s) - 1, (SELECT IFNULL(MAX(id), 0) FROM IPv4Log))"""
+            result = self.db_query_one(sql, (since, since))
+        return ChangeCursor(int(result[0]), int(result[1]))
+
+    @instrumented
+    def ChangesSince(self, since=None, chunk_size=None):
+        """
+        Iterate over changes recorded in ObjectLog and IPv4Log.
+        since is datetime, ChangeCursor (or its text form) or None for whole history.
+        Yield Change tuples ordered by date, every change carries cursor to resume after it.
+        Iteration stops at current end of feed.
+        Cursor is last seen log id, logs of transactions committed after later
+        ids were read are not returned when resuming from it, ChangePoller
+        re-reads lookback window to catch them.
+        """
+        if since is None:
+            cursor = ChangeCursor(0, 0)
+        elif isinstance(since, datetime):
+            cursor = self.GetChangeCursor(since)
+        elif isinstance(since, ChangeCursor):
+            cursor = since
+        else:
+            cursor = ChangeCursor.parse(since)
+
+        first_sql = """SELECT id, object_id, user, date, content FROM ObjectLog WHERE id > %d ORDER BY id LIMIT %%s""" % cursor.object_log_id
+        next_sql = """SELECT id, object_id, user, date, content FROM ObjectLog WHERE id > %s ORDER BY id LIMIT %s"""
+        object_log = ((row[3], 0, row) for row in self.db_iter(first_sql, next_sql, (), lambda row: (row[0],), chunk_size))
+
+        first_sql = """SELECT id, INET_NTOA(ip), user, date, message FROM IPv4Log WHERE id > %d ORDER BY id LIMIT %%s""" % cursor.ipv4_log_id
+        next_sql = """SELECT id, INET_NTOA(ip), user, date, message FROM IPv4Log WHERE id > %s ORDER BY id LIMIT %s"""
+        ipv4_log = ((row[3], 1, row) for row in self.db_iter(first_sql, next_sql, (), lambda row: (row[0],), chunk_size))
+
+        position = list(cursor)
+        for date, table, row in heapq.merge(object_log, ipv4_log):
+            position[table] = row[0]
+            if table == 0:
+                yield Change(change_kind(row[4]), 'ObjectLog', row[0], row[1], None, date, row[2], row[4], ChangeCursor(*position))
+            else:
+                yield Change('ipv4', 'IPv4Log', row[0], None, row[1], date, row[2], row[4], ChangeCursor(*position))
+
+    # Log buffer methods
+    def EnableLogBuffer(self, max_rows=500, max_age=5.0):
+        """
+        Buffer ObjectLog and IPv4Log messages and write them in multi-row inserts.
+        Buffer is written when max_rows messages of current unit of work are waiting,
+        when the oldest one is older than max_age seconds, at commit and at close()
+        or interpreter exit. There is no timer, age is checked only when next message
+        is logged, call FlushLogs() to write idle buffer.
+        Log date is taken from client clock at time of the call.
+        Return LogBuffer object
+        """
+        if self.log_buffer is None:
+            atexit.register(flush_logs_at_exit, weakref.ref(self))
+        self.log_buffer = LogBuffer(max_rows, max_age)
+        return self.log_buffer
+
+    def DisableLogBuffer(self):
+        """Write buffered logs and stop buffering"""
+        if self.log_buffer is not None:
+            self.FlushLogs(None)
+            self.log_buffer = None
+
+    def LogTag(self):
+        """Return tag of current unit of work for log buffer, None when writes are committed immediately"""
+        if self.autocommit and self.tx_depth == 0:
+            return None
+        tag = getattr(self.local, 'log_tag', None)
+        if tag is None:
+            tag = self.local.log_tag = object()
+        return tag
+
+    def BufferLogs(self, table, entries):
+        """Add (object_id or ip, message) entries of table to log buffer"""
+        now = datetime.now().replace(microsecond=0)
+        tag = self.LogTag()
+        for key, message in entries:
+            self.log_buffer.add(table, tag, (key, now, message))
+        if self.log_buffer.due(tag):
+            self.FlushLogs()
+
+    def FlushLogs(self, tag=False):
+        """
+        Write buffered logs of current unit of work (or of unit of work tag)
+        in multi-row inserts
+        """
+        if self.log_buffer is None:
+            return
+        entries = self.log_buffer.take(self.LogTag() if tag is False else tag)
+        if not entries:
+            return
+        rows = LogBuffer.by_table(entries)
+        try:
+            with self.write_batch():
+                if rows.get('ObjectLog'):
+                    sql = """INSERT INTO ObjectLog (object_id,user,date,content) VALUES (%s,'script',%s,%s)"""
+                    self.db_insert_many(sql, rows['ObjectLog'])
+                if rows.get('IPv4Log'):
+                    sql = """INSERT INTO IPv4Log (ip,user,date,message) VALUES (INET_ATON(%s),'script',%s,%s)"""
+                    self.db_insert_many(sql, rows['IPv4Log'])
+        except BaseException:
+            # Keep logs for next flush (rollback of unit of work discards them)
+            self.log_buffer.restore(entries)
+            raise
+
+    # Attribute registry methods
+    def EnableAttributeRegistry(self):
+        """
+        Load Attribute and AttributeMap tables into memory and serve
+        attribute definitions from there. Return AttributeRegistry object.
+        """
+        self.attribute_registry = self.LoadAttributeRegistry()
+        return self.attribute_registry
+
+    def LoadAttributeRegistry(self):
+        """Load Attribute and AttributeMap tables into new AttributeRegistry object"""
+        attribute_rows = self.db_query_all("""SELECT id, type, name FROM Attribute""", None)
+        map_rows = self.db_query_all("""SELECT objtype_id, attr_id, chapter_id, sticky FROM AttributeMap""", None)
+        return AttributeRegistry(attribute_rows, map_rows)
+
+    def DisableAttributeRegistry(self):
+        """Stop using in-memory attribute registry"""
+        self.attribute_registry = None
+
+    def GetAttributeRegistry(self):
+        """Return enabled attribute registry (reloaded if stale after rollback) or None"""
+        if self.attribute_registry is not None and self.attribute_registry.stale:
+            self.EnableAttributeRegistry()
+        return self.attribute_registry
+
+    @instrumented
+    def IsAttributeMapped(self, objtype_id, attr_id):
+        """Check if attribute is mapped to object type"""
+        registry = self.GetAttributeRegistry()
+        if registry is not None:
+            return registry.is_mapped(attr_id, objtype_id)
+
+        sql = """SELECT attr_id FROM AttributeMap WHERE objtype_id = %s AND attr_id = %s"""
+        return self.db_query_one(sql, (objtype_id, attr_id)) is not None
+
     # Attrubute methods
+    @instrumented
     def CreateAttribute(self, attr_type, attr_name):
         """ Create new attribute in Racktables. Require attr_type (string, dict, uint) and attr_name """
+        registry = self.GetAttributeRegistry()
+        if registry is not None:
+            if registry.id_by_name(attr_name) is None:
+                sql = """INSERT INTO Attribute (type, name) VALUES (%s, %s)"""
+                self.db_insert(sql, (attr_type, attr_name))
+                registry.add_attribute(self.db_fetch_lastid(), attr_type, attr_name)
+            return
+
         sql = """SELECT id FROM Attribute WHERE name = %s"""
 
         result = self.db_query_one(sql, (attr_name,))
@@ -349,8 +2501,17 @@ class RTObject:
             sql = """INSERT INTO Attribute (type, name) VALUES (%s, %s)"""
             self.db_insert(sql, (attr_type, attr_name))
 
+    @instrumented
     def MapAttribute(self, objtype_id, attr_id, chapter_id='NULL', sticky='no'):
         """ Map attribute to object type """
+        registry = self.GetAttributeRegistry()
+        if registry is not None:
+            if not registry.is_mapped(attr_id, objtype_id):
+                sql = """INSERT INTO AttributeMap (objtype_id, attr_id, chapter_id, sticky) VALUES (%s, %s, %s, %s)"""
+                params = (objtype_id, attr_id, str(chapter_id), sticky)
+                self.db_insert(sql, params)
+                registry.add_map(int(objtype_id), int(attr_id), None if chapter_id == 'NULL' else int(chapter_id), sticky)
+            return
 
         if chapter_id != 'NULL':
             chap_search = "chapter_id = %s AND " % (int(chapter_id))
@@ -370,6 +2531,7 @@ class RTObject:
             params = (objtype_id, attr_id, str(chapter_id), sticky)
             self.db_insert(sql, params)
 
+    @instrumented
     def InsertAttribute(self, object_id, object_tid, attr_id, string_value, uint_value, name=None):
         """Add or Update object attribute.
         Require 6 arguments: object_id, object_tid, attr_id, string_value, uint_value, name"""
@@ -415,8 +2577,13 @@ class RTObject:
                 params = (object_id, object_tid, attr_id, string_value)
             self.db_insert(sql, params)
 
+    @instrumented
     def GetAttributeId(self, searchstring):
         """Search racktables database and get attribud id based on search string as argument"""
+        registry = self.GetAttributeRegistry()
+        if registry is not None:
+            return registry.search(searchstring)
+
         sql = "SELECT id FROM Attribute WHERE name LIKE '%" + searchstring + "%'"
 
         result = self.db_query_one(sql, None)
@@ -428,8 +2595,13 @@ class RTObject:
 
         return getted_id
 
+    @instrumented
     def GetAttributeIdByName(self, attr_name):
         """Get the ID of an attribute by its EXACT name"""
+        registry = self.GetAttributeRegistry()
+        if registry is not None:
+            return registry.id_by_name(attr_name)
+
         sql = """SELECT id FROM Attribute WHERE name = %s"""
 
         result = self.db_query_one(sql, (attr_name,))
@@ -441,6 +2613,7 @@ class RTObject:
 
         return getted_id
 
+    @instrumented
     def GetAttributeValue(self, object_id, attr_id):
         """Search racktables database and get attribute values"""
         sql = """SELECT string_value,uint_value,float_value FROM AttributeValue WHERE object_id = %s AND attr_id = %s"""
@@ -455,6 +2628,7 @@ class RTObject:
         return output
 
     # Interfaces methods
+    @instrumented
     def GetInterfaceList(self, object_id):
         """
         Get list of object interfaces ids and names
@@ -463,6 +2637,7 @@ class RTObject:
         sql = """SELECT id, name, type FROM Port where object_id = %s"""
         return self.db_query_all(sql, (object_id,))
 
+    @instrumented
     def GetInterfaceName(self, object_id, interface_id):
         """Find name of specified interface. Required object_id and interface_id argument"""
         # Get interface name
@@ -475,6 +2650,7 @@ class RTObject:
 
         return port_name
 
+    @instrumented
     def GetInterfaceId(self, object_id, interface):
         """Find id of specified interface"""
         # Get interface id
@@ -487,6 +2663,7 @@ class RTObject:
 
         return port_id
 
+    @instrumented
     def UpdateNetworkInterface(self, object_id, interface):
         """Add network interfece to object if not exist"""
 
@@ -504,6 +2681,7 @@ class RTObject:
 
         return port_id
 
+    @instrumented
     def GetPortDeviceNameById(self, port_id):
         """Get Device name and Port Name by port ID, return dictionary device_name, port_name"""
 
@@ -517,11 +2695,37 @@ class RTObject:
             device_name = result[1]
             return {'device_name': device_name, 'port_name': port_name}
 
+    # Dictionary index methods
+    def EnableDictionaryIndex(self):
+        """
+        Load Dictionary and Chapter tables into memory and serve
+        dictionary lookups from there. Return DictionaryIndex object.
+        """
+        dictionary_rows = self.db_query_all("""SELECT dict_key, chapter_id, dict_value FROM Dictionary""", None)
+        chapter_rows = self.db_query_all("""SELECT id, name FROM Chapter""", None)
+        self.dictionary_index = DictionaryIndex(dictionary_rows, chapter_rows)
+        return self.dictionary_index
+
+    def DisableDictionaryIndex(self):
+        """Stop using in-memory dictionary index"""
+        self.dictionary_index = None
+
+    def GetDictionaryIndex(self):
+        """Return enabled dictionary index (reloaded if stale after rollback) or None"""
+        if self.dictionary_index is not None and self.dictionary_index.stale:
+            self.EnableDictionaryIndex()
+        return self.dictionary_index
+
+    @instrumented
     def GetDictionaryId(self, searchstring, chapter_id=None):
         """
         Search racktables dictionary using searchstring and return id of dictionary element
         It is possible to specify chapter_id for more specific search
         """
+        index = self.GetDictionaryIndex()
+        if index is not None:
+            return index.search(searchstring, chapter_id)
+
         if not chapter_id:
             sql = "SELECT dict_key FROM Dictionary WHERE dict_value LIKE '%%%s%%'" % (searchstring)
         else:
@@ -536,8 +2740,13 @@ class RTObject:
 
         return getted_id
 
+    @instrumented
     def GetDictionaryChapterId(self, value):
         """Search racktables dictionary chapter using exact value and return id of dictionary chapter"""
+        index = self.GetDictionaryIndex()
+        if index is not None:
+            return index.chapter_id(value)
+
         sql = """SELECT id FROM Chapter WHERE name = %s"""
 
         result = self.db_query_one(sql, (value,))
@@ -548,11 +2757,16 @@ class RTObject:
 
         return getted_id
 
+    @instrumented
     def GetDictionaryIdByValue(self, dict_value, chapter_id=None):
         """
         Get the ID of a dictionary entry by its EXACT value
         Is it possible to specify chapter_id for more specific search.
         """
+        index = self.GetDictionaryIndex()
+        if index is not None:
+            return index.key_by_value(dict_value, chapter_id)
+
         if not chapter_id:
             sql = """SELECT dict_key FROM Dictionary WHERE dict_value = %s"""
             params = (dict_value,)
@@ -568,8 +2782,13 @@ class RTObject:
 
         return getted_id
 
+    @instrumented
     def GetDictionaryValueById(self, dict_key):
         """Get value from Dictionary by ID reference"""
+        index = self.GetDictionaryIndex()
+        if index is not None:
+            return index.value_by_key(dict_key)
+
         sql = """SELECT dict_value FROM Dictionary WHERE dict_key = %s """
 
         result = self.db_query_one(sql, (dict_key,))
@@ -580,25 +2799,38 @@ class RTObject:
 
         return getted_id
 
+    @instrumented
     def InsertDictionaryChapter(self, value, sticky='no'):
         """ Insert new dictionary chapter """
         sql = """INSERT INTO Chapter (sticky, name) VALUES (%s, %s)"""
         self.db_insert(sql, (sticky, value))
+        if self.dictionary_index is not None:
+            self.dictionary_index.add_chapter(self.db_fetch_lastid(), value)
 
+    @instrumented
     def DeleteDictionaryChapter(self, value, sticky='no'):
         sql = """DELETE FROM Chapter WHERE name = %s"""
         self.db_insert(sql, (value,))
+        if self.dictionary_index is not None:
+            self.dictionary_index.remove_chapter(value)
 
+    @instrumented
     def InsertDictionaryValue(self, dict_id, value):
         """Insert value into dictionary identified by dict_id"""
         sql = """INSERT INTO Dictionary (chapter_id,dict_value) VALUES (%s, %s)"""
         self.db_insert(sql, (dict_id, value))
+        if self.dictionary_index is not None:
+            self.dictionary_index.add_value(self.db_fetch_lastid(), int(dict_id), value)
 
+    @instrumented
     def DeleteDictionaryValue(self, value):
         sql = """DELETE FROM Dictionary  WHERE dict_value = %s"""
         self.db_insert(sql, (value, ))
+        if self.dictionary_index is not None:
+            self.dictionary_index.remove_value(value)
 
     # Attribute methods
+    @instrumented
     def QueryTypedAttributeValue(self, object_id, attr_id, attr_type):
         sql = """SELECT %s FROM AttributeValue WHERE object_id = %s AND attr_id = %s"""
         res = self.db_query_one(sql, (attr_type, object_id, attr_id))
@@ -608,6 +2840,7 @@ class RTObject:
         else:
             return res[0]
 
+    @instrumented
     def InsertOrUpdateStringAttribute(self, object_id, objtype_id, attr_id, new_value):
         old_value = self.QueryTypedAttributeValue(object_id, attr_id, 'string_value')
         if old_value is None:
@@ -617,6 +2850,7 @@ class RTObject:
             # UPDATE
             return """UPDATE AttributeValue SET string_value = %s WHERE object_id = %s AND attr_id = %s AND object_tid = %s"""
 
+    @instrumented
     def InsertOrUpdateUintAttribute(self, object_id, objtype_id, attr_id, new_value):
         old_value = self.QueryTypedAttributeValue(object_id, attr_id, 'uint_value')
         if old_value is None:
@@ -626,6 +2860,7 @@ class RTObject:
             # UPDATE
             return """UPDATE AttributeValue SET uint_value = %s WHERE object_id = %s AND attr_id = %s AND object_tid = %s"""
 
+    @instrumented
     def InsertOrUpdateFloatAttribute(self, object_id, objtype_id, attr_id, new_value):
         old_value = self.QueryTypedAttributeValue(object_id, attr_id, 'float_value')
         if old_value is None:
@@ -635,6 +2870,7 @@ class RTObject:
             # UPDATE
             return """UPDATE AttributeValue SET float_value = %f WHERE object_id = %s AND attr_id = %s AND object_tid = %s"""
 
+    @instrumented
     def InsertOrUpdateDateAttribute(self, object_id, objtype_id, attr_id, new_value):
         dt = datetime.strptime(new_value, "%Y-%m-%s")
         return self.InsertOrUpdateUintAttribute(object_id, objtype_id, attr_id, (dt - datetime(1970, 1, 1)) / timedelta(seconds=1))
@@ -649,7 +2885,12 @@ class RTObject:
         }
         return InsertOrUpdateAttribute_TypeFunctions.get(attr_type)
 
+    @instrumented
     def InsertOrUpdateAttribute(self, object_id, attr_id, new_value):
+        registry = self.GetAttributeRegistry()
+        if registry is not None:
+            return self.InsertOrUpdateRegistryAttribute(registry, object_id, attr_id, new_value)
+
         # Get the object type
         sql = """SELECT objtype_id FROM Object WHERE id = %s"""
         result = self.db_query_one(sql, (object_id,))
@@ -681,6 +2922,106 @@ class RTObject:
         if sql is not None:
             self.db_insert(sql, (object_id, objtype_id, attr_id, new_value))
 
+    def InsertOrUpdateRegistryAttribute(self, registry, object_id, attr_id, new_value):
+        """
+        InsertOrUpdateAttribute using attribute registry.
+        Needs only one query for object type and old value before write.
+        """
+        attr_type = registry.attr_type(attr_id)
+        if attr_type is None:
+            return None
+
+        column = registry.value_columns[attr_type]
+        new_value = registry.convert_value(attr_type, new_value)
+
+        sql = """SELECT o.objtype_id, av.attr_id, av.%s FROM Object AS o
+               LEFT JOIN AttributeValue AS av ON (av.object_id = o.id AND av.attr_id = %%s)
+               WHERE o.id = %%s""" % column
+        result = self.db_query_one(sql, (attr_id, object_id))
+        if result is None:
+            return None
+
+        objtype_id, old_attr_id, old_value = result
+        if not registry.is_mapped(attr_id, objtype_id):
+            return None
+
+        if old_attr_id is None:
+            sql = """INSERT INTO AttributeValue (object_id,object_tid,attr_id,%s) VALUES (%%s,%%s,%%s,%%s)""" % column
+            self.db_insert(sql, (object_id, objtype_id, attr_id, new_value))
+        elif old_value != new_value:
+            sql = """UPDATE AttributeValue SET %s = %%s WHERE object_id = %%s AND attr_id = %%s AND object_tid = %%s""" % column
+            self.db_insert(sql, (new_value, object_id, attr_id, objtype_id))
+
+    @instrumented
+    def UpsertAttributes(self, object_id, values):
+        """
+        Insert or update many attributes of one object at once.
+        values is dictionary attr_id or attr_name: value.
+        Return dictionary with inserted, updated, unchanged and skipped counts
+        """
+        return self.UpsertObjectsAttributes({object_id: values})
+
+    @instrumented
+    def UpsertObjectsAttributes(self, objects_values):
+        """
+        Insert or update attributes of many objects at once.
+        objects_values is dictionary object_id: {attr_id or attr_name: value}.
+        Current values are read in one query, only changed values are written.
+        Attribute registry is enabled on first call (see EnableAttributeRegistry).
+        Return dictionary with inserted, updated, unchanged and skipped counts
+        """
+        registry = self.GetAttributeRegistry() or self.EnableAttributeRegistry()
+        summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+        sql = """SELECT o.id, o.objtype_id, av.attr_id, av.string_value, av.uint_value, av.float_value
+               FROM Object AS o LEFT JOIN AttributeValue AS av ON (av.object_id = o.id)
+               WHERE o.id IN ({in})"""
+        objtypes = {}
+        current = {}
+        for object_id, objtype_id, attr_id, string_value, uint_value, float_value in self.db_query_all_in(sql, objects_values.keys()):
+            objtypes[object_id] = objtype_id
+            if attr_id is not None:
+                current[(object_id, attr_id)] = {'string_value': string_value, 'uint_value': uint_value, 'float_value': float_value}
+
+        inserts = {}
+        updates = {}
+        for object_id, values in objects_values.items():
+            objtype_id = objtypes.get(int(object_id))
+            for attr, value in values.items():
+                attr_id = registry.resolve(attr)
+                if objtype_id is None or attr_id is None or value is None or not registry.is_mapped(attr_id, objtype_id):
+                    summary['skipped'] += 1
+                    continue
+
+                attr_type = registry.attr_type(attr_id)
+                column = registry.value_columns[attr_type]
+                value = registry.convert_value(attr_type, value)
+                old = current.get((int(object_id), attr_id))
+                if old is None:
+                    inserts.setdefault(column, []).append((object_id, objtype_id, attr_id, value))
+                    summary['inserted'] += 1
+                elif old[column] != value:
+                    updates.setdefault(column, []).append((object_id, objtype_id, attr_id, value))
+                    summary['updated'] += 1
+                else:
+                    summary['unchanged'] += 1
+
+        if not inserts and not updates:
+            return summary
+
+        with self.write_batch():
+            for column, params_list in inserts.items():
+                sql = """INSERT INTO AttributeValue (object_id,object_tid,attr_id,%s) VALUES (%%s,%%s,%%s,%%s)""" % column
+                self.db_insert_many(sql, params_list)
+            for column, params_list in updates.items():
+                # Multi-row update, all rows exist so every row hits duplicate key
+                sql = """INSERT INTO AttributeValue (object_id,object_tid,attr_id,%s) VALUES (%%s,%%s,%%s,%%s)
+                       ON DUPLICATE KEY UPDATE %s = VALUES(%s)""" % (column, column, column)
+                self.db_insert_many(sql, params_list)
+
+        return summary
+
+    @instrumented
     def GetObjectAttributes(self, object_id):
         """Get list of Object attributes"""
 
@@ -698,36 +3039,46 @@ class RTObject:
 
         return self.db_query_all(sql, (object_id,))
 
+    @instrumented
     def CleanUnusedInterfaces(self, object_id, interface_list):
         """Remove unused old interfaces"""
         sql = """SELECT id, name FROM Port WHERE object_id = %s"""
         result = self.db_query_all(sql, (object_id,))
 
         # Copy interface list becouse we need to change it
-        interfaces = interface_list[:]
+        interfaces = set(interface_list)
         # Add drac to interface list
-        interfaces.append("drac")
+        interfaces.add("drac")
 
         if result is not None:
-            for row in result:
-                if row[1] not in interfaces:
-                    # Remove IPv4 allocation
-                    sql = "DELETE FROM IPv4Allocation WHERE object_id = %s AND name = %s"
-                    self.db_insert(sql, (object_id, row[1]))
-                    self.InsertLog(object_id, "Removed IPv4 ips for %s" % row[1])
-                    # Remove IPv6 allocation
-                    sql = "DELETE FROM IPv6Allocation WHERE object_id = %s AND name = %s"
-                    self.db_insert(sql, (object_id, row[1]))
-                    self.InsertLog(object_id, "Removed IPv6 ips for %s" % row[1])
-                    # Remove port links
-                    sql = "DELETE FROM Link WHERE porta = %s OR portb = %s"
-                    self.db_insert(sql, (row[0], row[0]))
-                    self.InsertLog(object_id, "Remove port links %s" % row[1])
-                    # Remove port
-                    sql = "DELETE FROM Port WHERE object_id = %s AND name = %s"
-                    self.db_insert(sql, (object_id, row[1]))
-                    self.InsertLog(object_id, "Removed interface %s" % row[1])
+            unused = [row for row in result if row[1] not in interfaces]
+            if unused:
+                with self.write_batch():
+                    self.InsertLogs(self.DeleteInterfaces(object_id, unused))
 
+    @instrumented
+    def DeleteInterfaces(self, object_id, ports):
+        """
+        Remove ports (list of id, name) from object together with their IPv4/IPv6
+        allocations and links. Uses one DELETE per table for all ports.
+        Return list of (object_id, message) log entries, caller inserts them
+        """
+        names = [row[1] for row in ports]
+        port_ids = [row[0] for row in ports]
+        self.db_insert_in("""DELETE FROM IPv4Allocation WHERE object_id = %s AND name IN ({in})""", names, (object_id,))
+        self.db_insert_in("""DELETE FROM IPv6Allocation WHERE object_id = %s AND name IN ({in})""", names, (object_id,))
+        self.db_insert_in("""DELETE FROM Link WHERE porta IN ({in}) OR portb IN ({in})""", port_ids)
+        self.db_insert_in("""DELETE FROM Port WHERE object_id = %s AND id IN ({in})""", port_ids, (object_id,))
+
+        logs = []
+        for name in names:
+            logs.append((object_id, "Removed IPv4 ips for %s" % name))
+            logs.append((object_id, "Removed IPv6 ips for %s" % name))
+            logs.append((object_id, "Remove port links %s" % name))
+            logs.append((object_id, "Removed interface %s" % name))
+        return logs
+
+    @instrumented
     def CleanVirtuals(self, object_id, virtual_servers):
         """Clean dead virtuals from hypervisor. virtual_servers is list of active virtual servers on hypervisor (object_id)"""
 
@@ -737,29 +3088,18 @@ class RTObject:
         delete_virtual_id = []
 
         if result is not None:
-            old_virtuals_ids = result
-            new_virtuals_ids = []
             # Translate names into ids
-            for new_virt in virtual_servers:
-                new_id = self.GetObjectId(new_virt)
-                if new_id is not None:
-                    new_virtuals_ids.append(new_id)
+            new_virtuals_ids = set(self.ResolveObjectIds(virtual_servers).values())
+            delete_virtual_id = [old_id[0] for old_id in result if old_id[0] not in new_virtuals_ids]
 
-            for old_id in old_virtuals_ids:
-                try:
-                    new_virtuals_ids.index(old_id[0])
-                except ValueError:
-                    delete_virtual_id.append(old_id[0])
         if len(delete_virtual_id) != 0:
-            for virt_id in delete_virtual_id:
-
-                sql = "DELETE FROM EntityLink WHERE parent_entity_id = %s AND child_entity_id = %s"
-                self.db_insert(sql, (object_id, virt_id))
-                virt_name = self.GetObjectName(virt_id)
-                logstring = "Removed virtual %s" % virt_name
-                self.InsertLog(object_id, logstring)
-
+            virt_names = self.ResolveObjectNames(delete_virtual_id)
+            with self.write_batch():
+                sql = "DELETE FROM EntityLink WHERE parent_entity_id = %s AND child_entity_id IN ({in})"
+                self.db_insert_in(sql, delete_virtual_id, (object_id,))
+                self.InsertLogs((object_id, "Removed virtual %s" % virt_names.get(virt_id)) for virt_id in delete_virtual_id)
 
+    @instrumented
     def LinkVirtualHypervisor(self, object_id, virtual_id):
         """Assign virtual server to correct hypervisor"""
         sql = """SELECT child_entity_id FROM EntityLink WHERE parent_entity_id = %s AND child_entity_id = %s"""
@@ -771,10 +3111,12 @@ class RTObject:
             text = "Linked virtual %s with hypervisor" % self.GetObjectName(virtual_id)
             self.InsertLog(object_id, text)
 
+    @instrumented
     def AssignChassisSlot(self, chassis_name, slot_number, server_name):
         """Assign server objects to server chassis"""
-        chassis_id = self.GetObjectId(chassis_name)
-        server_id = self.GetObjectId(server_name)
+        object_ids = self.ResolveObjectIds([chassis_name, server_name])
+        chassis_id = object_ids.get(chassis_name)
+        server_id = object_ids.get(server_name)
         slot_attribute_id = self.GetAttributeId("Slot number")
 
         sql = """SELECT string_value FROM AttributeValue WHERE object_id = %s AND object_tid = 4 AND attr_id = %s"""
@@ -818,6 +3160,7 @@ class RTObject:
             self.InsertLog(chassis_id, "Linked with server %s" % (server_name))
             self.InsertLog(server_id, "Linked with Blade Chassis %s" % (chassis_name))
 
+    @instrumented
     def GetAllServerChassisId(self):
         """Get list of all server chassis IDs"""
         sql = """SELECT id FROM Object WHERE objtype_id = 1502"""
@@ -826,58 +3169,168 @@ class RTObject:
     #
     # Networks methots
     #
-    def GetIpv4Networks(self):
-        """Get All IPV4 Networks"""
-        sql = """SELECT id, INET_NTOA(ip), mask, name FROM IPv4Network"""
+    @instrumented
+    def GetIpv4Networks(self, raw=False):
+        """
+        Get All IPV4 Networks
+        With raw=True ip is returned as int stored in database
+        """
+        sql = """SELECT id, {ip}, mask, name FROM IPv4Network""".format(ip=ipv4_column(raw))
 
         return self.db_query_all(sql, None)
 
-    def GetIpv6Networks(self):
-        """Get All IPV6 Networks"""
-        sql = """SELECT id, HEX(ip), mask, name FROM IPv6Network"""
+    @instrumented
+    def IterIpv4Networks(self, chunk_size=None, raw=False):
+        """Iterate over all IPv4 Networks, yield same rows as GetIpv4Networks"""
+        first_sql = """SELECT id, {ip}, mask, name FROM IPv4Network ORDER BY id LIMIT %s""".format(ip=ipv4_column(raw))
+        next_sql = """SELECT id, {ip}, mask, name FROM IPv4Network WHERE id > %s ORDER BY id LIMIT %s""".format(ip=ipv4_column(raw))
+        return self.db_iter(first_sql, next_sql, (), lambda row: (row[0],), chunk_size)
+
+    @instrumented
+    def IterIpv6Networks(self, chunk_size=None, raw=False):
+        """Iterate over all IPv6 Networks, yield same rows as GetIpv6Networks"""
+        first_sql = """SELECT id, {ip}, mask, name FROM IPv6Network ORDER BY id LIMIT %s""".format(ip=ipv6_column(raw))
+        next_sql = """SELECT id, {ip}, mask, name FROM IPv6Network WHERE id > %s ORDER BY id LIMIT %s""".format(ip=ipv6_column(raw))
+        return self.db_iter(first_sql, next_sql, (), lambda row: (row[0],), chunk_size)
+
+    @instrumented
+    def IterIpv4Allocations(self, chunk_size=None, raw=False):
+        """Iterate over IPv4 allocations and addresses, yield same rows as GetIpv4Allocations"""
+        ip = ipv4_column(raw)
+        first_sql = """SELECT {ip}, object_id, name AS int_name, Null AS name, Null AS comment FROM IPv4Allocation ORDER BY object_id, ip LIMIT %s""".format(ip=ip)
+        next_sql = """SELECT {ip}, object_id, name AS int_name, Null AS name, Null AS comment FROM IPv4Allocation
+                   WHERE object_id > %s OR (object_id = %s AND ip > %s) ORDER BY object_id, ip LIMIT %s""".format(ip=ip)
+        for row in self.db_iter(first_sql, next_sql, (), lambda row: (row[1], row[1], ipv4_encode(row[0])), chunk_size):
+            yield row
+
+        first_sql = """SELECT {ip}, Null AS object_id, Null AS int_name, name, comment FROM IPv4Address ORDER BY ip LIMIT %s""".format(ip=ip)
+        next_sql = """SELECT {ip}, Null AS object_id, Null AS int_name, name, comment FROM IPv4Address WHERE ip > %s ORDER BY ip LIMIT %s""".format(ip=ip)
+        for row in self.db_iter(first_sql, next_sql, (), lambda row: (ipv4_encode(row[0]),), chunk_size):
+            yield row
+
+    @instrumented
+    def IterIpv6Allocations(self, chunk_size=None, raw=False):
+        """Iterate over IPv6 allocations and addresses, yield same rows as GetIpv6Allocations"""
+        ip = ipv6_column(raw)
+        first_sql = """SELECT {ip}, object_id, name AS int_name, Null AS name, Null AS comment FROM IPv6Allocation ORDER BY object_id, ip LIMIT %s""".format(ip=ip)
+        next_sql = """SELECT {ip}, object_id, name AS int_name, Null AS name, Null AS comment FROM IPv6Allocation
+                   WHERE object_id > %s OR (object_id = %s AND ip > %s) ORDER BY object_id, ip LIMIT %s""".format(ip=ip)
+        for row in self.db_iter(first_sql, next_sql, (), lambda row: (row[1], row[1], ipv6_encode(row[0])), chunk_size):
+            yield row
+
+        first_sql = """SELECT {ip}, Null AS object_id, Null AS int_name, name, comment FROM IPv6Address ORDER BY ip LIMIT %s""".format(ip=ip)
+        next_sql = """SELECT {ip}, Null AS object_id, Null AS int_name, name, comment FROM IPv6Address WHERE ip > %s ORDER BY ip LIMIT %s""".format(ip=ip)
+        for row in self.db_iter(first_sql, next_sql, (), lambda row: (ipv6_encode(row[0]),), chunk_size):
+            yield row
+
+    @instrumented
+    def GetIpv4NetworkIndex(self, with_allocations=False):
+        """
+        Build IPv4NetworkIndex from all IPv4 networks.
+        With with_allocations=True it also contains all allocated addresses for addresses_in()
+        """
+        index = IPv4NetworkIndex(self.GetIpv4Networks(raw=True))
+        if with_allocations:
+            index.add_addresses(row[0] for row in self.GetIpv4Allocations(raw=True))
+        return index
+
+    @instrumented
+    def GetIpv4AllocationsWithNetwork(self):
+        """
+        Get IPv4 Allocations annotated with most specific network.
+        Return array of GetIpv4Allocations rows extended with network id and network name
+        """
+        index = IPv4NetworkIndex(self.GetIpv4Networks(raw=True))
+        allocations = self.GetIpv4Allocations()
+        networks = index.lookup_many(row[0] for row in allocations)
+        return [tuple(row) + ((net.id, net.name) if net is not None else (None, None)) for row, net in zip(allocations, networks)]
+
+    @instrumented
+    def GetIpv6Networks(self, raw=False):
+        """
+        Get All IPV6 Networks
+        With raw=True ip is returned as 16 bytes stored in database
+        """
+        sql = """SELECT id, {ip}, mask, name FROM IPv6Network""".format(ip=ipv6_column(raw))
 
         return self.db_query_all(sql, None)
 
-    def GetIpv4Allocations(self):
-        """Get IPv4 Allocations for specific network"""
-        sql = """SELECT INET_NTOA(ip), object_id, name AS int_name, Null AS name, Null AS comment from IPv4Allocation UNION SELECT INET_NTOA(ip), Null AS object_id, Null AS int_name, name, comment FROM IPv4Address"""
+    @instrumented
+    def GetIpv6NetworkIndex(self, with_allocations=False):
+        """
+        Build IPv6NetworkIndex from all IPv6 networks.
+        With with_allocations=True it also contains all allocated addresses for addresses_in()
+        """
+        sql = """SELECT id, ip, mask, name, last_ip FROM IPv6Network"""
+        index = IPv6NetworkIndex(self.db_query_all(sql, None))
+        if with_allocations:
+            index.add_addresses(row[0] for row in self.GetIpv6Allocations(raw=True))
+        return index
+
+    @instrumented
+    def GetIpv6AllocationsWithNetwork(self):
+        """
+        Get IPv6 Allocations annotated with most specific network.
+        Return array of GetIpv6Allocations rows extended with network id and network name
+        """
+        index = self.GetIpv6NetworkIndex()
+        allocations = self.GetIpv6Allocations()
+        networks = index.lookup_many(row[0] for row in allocations)
+        return [tuple(row) + ((net.id, net.name) if net is not None else (None, None)) for row, net in zip(allocations, networks)]
+
+    @instrumented
+    def GetIpv4Allocations(self, raw=False):
+        """
+        Get IPv4 Allocations for specific network
+        With raw=True ip is returned as int stored in database
+        """
+        sql = """SELECT {ip}, object_id, name AS int_name, Null AS name, Null AS comment from IPv4Allocation UNION SELECT {ip}, Null AS object_id, Null AS int_name, name, comment FROM IPv4Address""".format(ip=ipv4_column(raw))
 
         return self.db_query_all(sql, None)
 
-    def GetIpv6Allocations(self):
-        """Get IPv6 Allocations for specific network"""
-        sql = """SELECT HEX(ip), object_id, name AS int_name, Null AS name, Null AS comment from IPv6Allocation UNION SELECT HEX(ip), Null AS object_id, Null AS int_name, name, comment FROM IPv6Address"""
+    @instrumented
+    def GetIpv6Allocations(self, raw=False):
+        """
+        Get IPv6 Allocations for specific network
+        With raw=True ip is returned as 16 bytes stored in database
+        """
+        sql = """SELECT {ip}, object_id, name AS int_name, Null AS name, Null AS comment from IPv6Allocation UNION SELECT {ip}, Null AS object_id, Null AS int_name, name, comment FROM IPv6Address""".format(ip=ipv6_column(raw))
 
         return self.db_query_all(sql, None)
 
+    @instrumented
     def SetIPComment(self, comment, ip):
         """ Set comment for IP address """
-        sql = """SELECT comment FROM IPv4Address WHERE INET_NTOA(ip) = %s"""
+        ip = ipv4_encode(ip)
+        sql = """SELECT comment FROM IPv4Address WHERE ip = %s"""
         result = self.db_query_one(sql, (ip,))
 
         if result is not None:
-            sql = "UPDATE IPv4Address SET comment = %s WHERE INET_NTOA(ip) = %s"
+            sql = "UPDATE IPv4Address SET comment = %s WHERE ip = %s"
             params = (comment, ip)
         else:
-            sql = "INSERT INTO IPv4Address (ip, comment) VALUES (INET_ATON(%s), %s)"
+            sql = "INSERT INTO IPv4Address (ip, comment) VALUES (%s, %s)"
             params = (ip, comment)
 
         self.db_insert(sql, params)
 
+    @instrumented
     def SetIPName(self, name, ip):
         """ Set name for IP address """
-        sql = """SELECT name FROM IPv4Address WHERE INET_NTOA(ip) = %s"""
+        ip = ipv4_encode(ip)
+        sql = """SELECT name FROM IPv4Address WHERE ip = %s"""
         result = self.db_query_one(sql, (ip,))
 
         if result is not None:
-            sql = """UPDATE IPv4Address SET name = %s WHERE INET_NTOA(ip) = %s"""
+            sql = """UPDATE IPv4Address SET name = %s WHERE ip = %s"""
             params = (name, ip)
         else:
-            sql = """INSERT INTO IPv4Address (ip, name) VALUES (INET_ATON(%s), %s)"""
+            sql = """INSERT INTO IPv4Address (ip, name) VALUES (%s, %s)"""
             params = (ip, name)
 
         self.db_insert(sql, params)
 
+    @instrumented
     def FindIPFromComment(self, comment, network_name):
         """Find IP address based on comment"""
         # Get Network information
@@ -900,29 +3353,27 @@ class RTObject:
         else:
             return False
 
+    @instrumented
     def SetIP6Comment(self, comment, ip):
         """ Set comment for IPv6 address """
 
-        # Create address object using ipaddr
-        addr6 = ipaddress.IPv6Address(ip)
-        # Create IPv6 format for Mysql
-        db_ip6_format = "".join(str(x) for x in addr6.exploded.split(':')).upper()
-
-        sql = """SELECT comment FROM IPv6Address WHERE HEX(ip) = %s"""
-        result = self.db_query_one(sql,(db_ip6_format))
+        ip = ipv6_encode(ip)
+        sql = """SELECT comment FROM IPv6Address WHERE ip = %s"""
+        result = self.db_query_one(sql, (ip,))
 
         if result is not None:
-            sql = """UPDATE IPv6Address SET comment = %s WHERE HEX(ip) = %s"""
-            params = (comment, db_ip6_format)
+            sql = """UPDATE IPv6Address SET comment = %s WHERE ip = %s"""
+            params = (comment, ip)
         else:
-            sql = """INSERT INTO IPv6Address (ip, comment) VALUES (UNHEX(%s), %s)"""
-            params = (db_ip6_format, comment)
+            sql = """INSERT INTO IPv6Address (ip, comment) VALUES (%s, %s)"""
+            params = (ip, comment)
 
         self.db_insert(sql, params)
 
+    @instrumented
     def FindIPv6FromComment(self, comment, network_name):
         """Find IP address based on comment"""
-        sql = """SELECT HEX(ip),mask,hex(last_ip) from IPv6Network WHERE name = %s"""
+        sql = """SELECT ip,mask,last_ip from IPv6Network WHERE name = %s"""
         result = self.db_query_one(sql, (network_name,))
 
         if result is not None:
@@ -930,77 +3381,55 @@ class RTObject:
             ip_mask = result[1]
             ip_max = result[2]
 
-            sql = """select HEX(ip) from IPv6Address where ip between UNHEX(%s) AND UNHEX(%s) AND comment = %s;"""
+            sql = """select ip from IPv6Address where ip between %s AND %s AND comment = %s"""
 
             result = self.db_query_all(sql, (ip, ip_max, comment))
             if result is not None:
-                return "\n".join(str(re.sub(r'(.{4})(?=.)', r'\1:', x[0]).lower()) + "/" + str(ip_mask) for x in result)
+                return "\n".join(ip + "/" + str(ip_mask) for ip in ipv6_decode_many((x[0] for x in result), exploded=True))
             else:
                 return False
 
         else:
             return False
 
+    @instrumented
     def CleanIPAddresses(self, object_id, ip_addresses, device):
         """Clean unused ip from object. ip addresses is list of IP addresses configured on device (device) on host (object_id)"""
 
-        sql = """SELECT INET_NTOA(ip) FROM IPv4Allocation WHERE object_id = %s AND name = %s"""
+        sql = """SELECT ip FROM IPv4Allocation WHERE object_id = %s AND name = %s"""
 
         result = self.db_query_all(sql, (object_id, device))
         delete_ips = []
 
         if result is not None:
-            old_ips = result
+            active_ips = set(encode_valid(ipv4_encode, ip_addresses))
+            delete_ips = [old_ip[0] for old_ip in result if old_ip[0] not in active_ips]
 
-            for old_ip in old_ips:
-                try:
-                    ip_addresses.index(old_ip[0])
-                except ValueError:
-                    delete_ips.append(old_ip[0])
         if len(delete_ips) != 0:
-            for ip in delete_ips:
-                sql = """DELETE FROM IPv4Allocation WHERE ip = INET_ATON(%s) AND object_id = %s AND name = %s"""
-                self.db_insert(sql, (ip, object_id, device))
-                logstring = "Removed IP %s from %s" % (ip, device)
-                self.InsertLog(object_id, logstring)
+            with self.write_batch():
+                sql = """DELETE FROM IPv4Allocation WHERE object_id = %s AND name = %s AND ip IN ({in})"""
+                self.db_insert_in(sql, delete_ips, (object_id, device))
+                self.InsertLogs((object_id, "Removed IP %s from %s" % (ip, device)) for ip in ipv4_decode_many(delete_ips))
 
+    @instrumented
     def CleanIPv6Addresses(self, object_id, ip_addresses, device):
         """Clean unused ipv6 from object. ip_addresses mus be list of active IP addresses on device (device) on host (object_id)"""
 
-        sql = """SELECT HEX(ip) FROM IPv6Allocation WHERE object_id = %s AND name = %s"""
+        sql = """SELECT ip FROM IPv6Allocation WHERE object_id = %s AND name = %s"""
         result = self.db_query_all(sql, (object_id, device))
         delete_ips = []
 
         if result is not None:
-            old_ips = result
-            new_ip6_ips = []
-
-            # We must prepare ipv6 addresses into same format for compare
-            for new_ip in ip_addresses:
-                converted = ipaddress.IPv6Address(new_ip).exploded.lower()
-                new_ip6_ips.append(converted)
-
-            for old_ip_hex in old_ips:
-                try:
-                    # First we must construct IP from HEX
-                    tmp = re.sub("(.{4})", "\\1:", old_ip_hex[0], re.DOTALL)
-                    # Remove last : and lower string
-                    old_ip = tmp[:len(tmp) - 1].lower()
-
-                    new_ip6_ips.index(old_ip)
-
-                except ValueError:
-                    delete_ips.append(old_ip)
+            active_ips = set(encode_valid(ipv6_encode, ip_addresses))
+            delete_ips = [old_ip for old_ip in ipv6_encode_many(row[0] for row in result) if old_ip not in active_ips]
 
         if len(delete_ips) != 0:
-            for ip in delete_ips:
-                db_ip6_format = "".join(str(x) for x in ip.split(':'))
-                sql = """DELETE FROM IPv6Allocation WHERE ip = UNHEX(%s) AND object_id = %s AND name = %s"""
-                params = (db_ip6_format, object_id, device)
-                self.db_insert(sql, params)
-                logstring = "Removed IP %s from %s" % (ip, device)
-                self.InsertLog(object_id, logstring)
-    
+            with self.write_batch():
+                sql = """DELETE FROM IPv6Allocation WHERE object_id = %s AND name = %s AND ip IN ({in})"""
+                self.db_insert_in(sql, delete_ips, (object_id, device))
+                self.InsertLogs((object_id, "Removed IP %s from %s" % (ip, device)) for ip in ipv6_decode_many(delete_ips, exploded=True))
+
+    @instrumented
     def CheckIfIp4IPExists(self, ip):
         """Check if ipv4 record exist in database"""
         sql = """select ip from IPv4Address where ip = INET_ATON(%s)"""
@@ -1013,6 +3442,7 @@ class RTObject:
         else:
             return True
 
+    @instrumented
     def LinkNetworkInterface(self, object_id, interface, switch_name, interface_switch):
         """Link two devices togetger"""
         # Get interface id
@@ -1114,26 +3544,129 @@ class RTObject:
 
         return resolution
 
-    def ObjectGetIpv4IPList(self,object_id):
-        ''' Get list of IPv4 IP from object '''
-        sql = """SELECT INET_NTOA(ip) AS ip from IPv4Allocation where object_id = %s"""
+    @instrumented
+    def SyncLinks(self, links):
+        """
+        Link many devices at once, e.g. from LLDP neighbor tables.
+        links is list of (object_id, interface, switch_name, interface_switch)
+        handled like LinkNetworkInterface calls in given order, with the same
+        log messages. Ports and links are read in a handful of queries,
+        changes are written in one transaction.
+        Return dictionary with created, updated, unchanged and skipped counts
+        """
+        links = list(links)
+        summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        switch_ids = self.ResolveObjectIds(set(link[2] for link in links))
+
+        object_ids = set(int(link[0]) for link in links) | set(switch_ids.values())
+        sql = """SELECT id, object_id, name FROM Port WHERE object_id IN ({in})"""
+        ports = {}
+        for port_id, object_id, name in self.db_query_all_in(sql, object_ids):
+            ports.setdefault((object_id, name.lower()), port_id)
+
+        # Current links of all involved ports, peer[port] = other port
+        port_ids = set(ports.values())
+        sql = """SELECT porta, portb FROM Link WHERE porta IN ({in}) OR portb IN ({in})"""
+        initial = set(self.db_query_all_in(sql, port_ids))
+        peer = {}
+        for porta, portb in initial:
+            peer[porta] = portb
+            peer[portb] = porta
+
+        # Device and port names for log messages
+        sql = """SELECT Port.id, Port.name, Object.id, Object.name FROM Port INNER JOIN Object ON Port.object_id = Object.id WHERE Port.id IN ({in})"""
+        names = {}
+        for port_id, port_name, device_id, device_name in self.db_query_all_in(sql, port_ids | set(peer)):
+            names[port_id] = (device_id, device_name, port_name)
+
+        current = dict((min(pair), pair) for pair in initial)
+        logs = []
+
+        def disconnect(port_id):
+            # Remove link of port_id and log it to both devices
+            other = peer.pop(port_id)
+            del peer[other]
+            porta, portb = current.pop(min(port_id, other))
+            text = "Disconnected %s,%s from %s,%s" % (names[porta][1], names[porta][2], names[portb][1], names[portb][2])
+            logs.append((names[porta][0], text))
+            logs.append((names[portb][0], text))
+
+        for object_id, interface, switch_name, interface_switch in links:
+            switch_object_id = switch_ids.get(switch_name)
+            port_id = ports.get((int(object_id), interface.lower()))
+            switch_port_id = ports.get((switch_object_id, interface_switch.lower()))
+            if port_id is None or switch_port_id is None:
+                summary['skipped'] += 1
+                continue
+
+            device = names[port_id]
+            switch = names[switch_port_id]
+            old_switch_port_id = peer.get(port_id)
+            if old_switch_port_id == switch_port_id:
+                summary['unchanged'] += 1
+                continue
+
+            if old_switch_port_id is None:
+                if switch_port_id in peer:
+                    disconnect(switch_port_id)
+                text = "New connection %s,%s with %s,%s" % (device[1], device[2], switch[1], switch[2])
+                logs.append((device[0], text))
+                logs.append((switch[0], text))
+                summary['created'] += 1
+            else:
+                old_switch = names[old_switch_port_id]
+                disconnect(port_id)
+                if switch_port_id in peer:
+                    disconnect(switch_port_id)
+                text = "Update connection from %s,%s to %s,%s" % (old_switch[1], old_switch[2], switch[1], switch[2])
+                logs.append((device[0], text))
+                text = "%s,%s changed connection from %s,%s and connected to %s,%s" % (device[1], device[2], old_switch[1], old_switch[2], switch[1], switch[2])
+                logs.append((old_switch[0], text))
+                logs.append((switch[0], text))
+                summary['updated'] += 1
+
+            peer[port_id] = switch_port_id
+            peer[switch_port_id] = port_id
+            current[min(port_id, switch_port_id)] = (min(port_id, switch_port_id), max(port_id, switch_port_id))
+
+        final = set(current.values())
+        delete = initial - final
+        insert = final - initial
+        if delete or insert or logs:
+            with self.write_batch():
+                if delete:
+                    self.db_insert_in("""DELETE FROM Link WHERE porta IN ({in})""", [pair[0] for pair in delete])
+                if insert:
+                    self.db_insert_many("""INSERT INTO Link (porta,portb) VALUES (%s,%s)""", sorted(insert))
+                self.InsertLogs(logs)
+
+        return summary
+
+    @instrumented
+    def ObjectGetIpv4IPList(self,object_id, raw=False):
+        ''' Get list of IPv4 IP from object (raw=True returns ints stored in database) '''
+        sql = """SELECT {ip} AS ip from IPv4Allocation where object_id = %s""".format(ip=ipv4_column(raw))
         return self.db_query_all(sql, (object_id,))
 
-    def ObjectGetIpv6IPList(self,object_id):
-        ''' Get list of IPv6 IP from object '''
-        sql = """SELECT HEX(ip) AS ip from IPv6Allocation where object_id = %s"""
+    @instrumented
+    def ObjectGetIpv6IPList(self,object_id, raw=False):
+        ''' Get list of IPv6 IP from object (raw=True returns 16 bytes stored in database) '''
+        sql = """SELECT {ip} AS ip from IPv6Allocation where object_id = %s""".format(ip=ipv6_column(raw))
         return self.db_query_all(sql, (object_id,))
 
-    def InterfaceGetIpv4IP(self, object_id, interface):
-        """ Get list of IPv4 IP from interface """
-        sql = """SELECT INET_NTOA(ip) AS ip from IPv4Allocation where object_id = %s AND name = %s"""
+    @instrumented
+    def InterfaceGetIpv4IP(self, object_id, interface, raw=False):
+        """ Get list of IPv4 IP from interface (raw=True returns ints stored in database) """
+        sql = """SELECT {ip} AS ip from IPv4Allocation where object_id = %s AND name = %s""".format(ip=ipv4_column(raw))
         return self.db_query_all(sql, (object_id, interface))
 
-    def InterfaceGetIpv6IP(self, object_id, interface):
-        """ Get list of IPv6 IP from interface """
-        sql = """SELECT HEX(ip) AS ip from IPv6Allocation where object_id = %s AND name = %s"""
+    @instrumented
+    def InterfaceGetIpv6IP(self, object_id, interface, raw=False):
+        """ Get list of IPv6 IP from interface (raw=True returns 16 bytes stored in database) """
+        sql = """SELECT {ip} AS ip from IPv6Allocation where object_id = %s AND name = %s""".format(ip=ipv6_column(raw))
         return self.db_query_all(sql, (object_id, interface))
 
+    @instrumented
     def InterfaceAddIpv4IP(self, object_id, device, ip):
         """Add/Update IPv4 IP on interface"""
 
@@ -1164,6 +3697,7 @@ class RTObject:
             text = "Added IP %s on %s" % (ip, device)
             self.InsertLog(object_id, text)
 
+    @instrumented
     def InterfaceAddIpv6IP(self, object_id, device, ip):
         """Add/Update IPv6 IP on interface"""
         # Create address object using ipaddress
@@ -1197,3 +3731,111 @@ class RTObject:
             self.db_insert(sql, (object_id, ip6, device))
             text = "Added IPv6 IP %s on %s" % (ip, device)
             self.InsertLog(object_id, text)
+
+
+    @instrumented
+    def SyncObjectNetworking(self, object_id, interfaces, keep=("drac",)):
+        """
+        Make object interfaces and IP allocations match interfaces.
+        interfaces is dictionary interface name: list of IPv4/IPv6 addresses.
+        Missing ports and allocations are added, others are removed
+        (except interfaces listed in keep, their IPs are never moved to other
+        interface, it's logged as warning) with the same object log
+        messages as UpdateNetworkInterface, InterfaceAddIpv4IP,
+        InterfaceAddIpv6IP, CleanIPAddresses, CleanIPv6Addresses and
+        CleanUnusedInterfaces. Current state is read in three queries,
+        changes are written in batches in one transaction.
+        Return dictionary with counts of added/removed ports and ips
+        """
+        # MySQL compares port and allocation names case-insensitive
+        sql = """SELECT id, name FROM Port WHERE object_id = %s"""
+        ports = dict((name.lower(), (port_id, name)) for port_id, name in self.db_query_all(sql, (object_id,)))
+        sql = """SELECT ip, name FROM IPv4Allocation WHERE object_id = %s"""
+        current4 = dict(self.db_query_all(sql, (object_id,)))
+        sql = """SELECT ip, name FROM IPv6Allocation WHERE object_id = %s"""
+        current6 = dict((ipv6_encode(ip), name) for ip, name in self.db_query_all(sql, (object_id,)))
+
+        # Desired state in database encoding, IPv6 text kept for log messages
+        wanted4 = {}
+        wanted6 = {}
+        ip6_text = {}
+        for interface, ips in interfaces.items():
+            for ip in ips:
+                try:
+                    addr = ipaddress.ip_address(u"%s" % ip)
+                except ValueError:
+                    logging.getLogger("rtapi_bk").warning("Ignoring invalid IP address %r of interface %s", ip, interface)
+                    continue
+                if addr.version == 4:
+                    wanted4[int(addr)] = interface
+                else:
+                    wanted6[addr.packed] = interface
+                    ip6_text[addr.packed] = ip
+
+        wanted_ports = set(name.lower() for name in interfaces)
+        kept = set(name.lower() for name in keep)
+        add_ports = [name for name in interfaces if name.lower() not in ports]
+        remove_ports = [name for key, (port_id, name) in ports.items() if key not in wanted_ports and key not in kept]
+        removed = set(name.lower() for name in remove_ports)
+
+        logs = []
+
+        def same(name, other):
+            return name is not None and other is not None and name.lower() == other.lower()
+
+        def diff(current, wanted, removed_text, added_text):
+            delete = []
+            insert = []
+            for ip, name in current.items():
+                if (name or "").lower() in kept or (name or "").lower() in removed or same(wanted.get(ip), name):
+                    continue
+                delete.append(ip)
+                if ip in wanted:
+                    logs.append((object_id, "Removed IP (%s) from interface %s" % (added_text(ip), name)))
+                else:
+                    logs.append((object_id, "Removed IP %s from %s" % (removed_text(ip), name)))
+            for ip, interface in wanted.items():
+                if ip in current and (current[ip] or "").lower() in kept and not same(current[ip], interface):
+                    # Allocation of kept interface stays, (object_id, ip) can't be inserted twice
+                    logging.getLogger("rtapi_bk").warning("IP %s of object %s stays on kept interface %s, not moved to %s",
+                                                          added_text(ip), object_id, current[ip], interface)
+                elif not same(current.get(ip), interface):
+                    insert.append((object_id, ip, interface))
+            return delete, insert
+
+        delete4, insert4 = diff(current4, wanted4, ipv4_decode, ipv4_decode)
+        delete6, insert6 = diff(current6, wanted6, lambda ip: ipv6_decode(ip, exploded=True), lambda ip: ip6_text[ip])
+        for row_object_id, ip, interface in insert4:
+            logs.append((object_id, "Added IP %s on %s" % (ipv4_decode(ip), interface)))
+        for row_object_id, ip, interface in insert6:
+            logs.append((object_id, "Added IPv6 IP %s on %s" % (ip6_text[ip], interface)))
+
+        summary = {
+            'ports_added': len(add_ports),
+            'ports_removed': len(remove_ports),
+            'ips_added': len(insert4) + len(insert6),
+            'ips_removed': len(delete4) + len(delete6),
+        }
+        if not (add_ports or remove_ports or delete4 or delete6 or insert4 or insert6):
+            return summary
+
+        with self.write_batch():
+            if remove_ports:
+                # Ports removed together with all their allocations
+                logs[:0] = self.DeleteInterfaces(object_id, [(ports[name.lower()][0], name) for name in remove_ports])
+            if delete4:
+                self.db_insert_in("""DELETE FROM IPv4Allocation WHERE object_id = %s AND ip IN ({in})""", delete4, (object_id,))
+            if delete6:
+                self.db_insert_in("""DELETE FROM IPv6Allocation WHERE object_id = %s AND ip IN ({in})""", delete6, (object_id,))
+            if add_ports:
+                sql = """INSERT INTO Port (object_id,name,iif_id,type) VALUES (%s,%s,1,24)"""
+                self.db_insert_many(sql, [(object_id, name) for name in add_ports])
+            if insert4:
+                sql = """INSERT INTO IPv4Allocation (object_id,ip,name) VALUES (%s,%s,%s)"""
+                self.db_insert_many(sql, insert4)
+            if insert6:
+                sql = """INSERT INTO IPv6Allocation (object_id,ip,name) VALUES (%s,%s,%s)"""
+                self.db_insert_many(sql, insert6)
+            self.InsertLogs(logs)
+
+        return summary
@@ -0,0 +1,311 @@
+#!/usr/bin/python
+#
+#   RTAPI
+#   Query plan auditor of SQL statements issued by RTObject.
+#
+#   This utility is released under GPL v2
+
+"""
+Query plan auditor.
+
+Collects SQL templates used by RTObject methods (statically from their
+source code, optionally also statements captured at run time with
+StatementRecorder), runs EXPLAIN for every template on MySQL/MariaDB
+with racktables schema and reports full table scans, full index scans,
+filesorts and temporary tables. Optional report recommends indexes for
+scanned tables.
+
+Templates are explained with placeholder values ('1', LIMIT 1), so the
+database should contain some representative rows, on empty tables
+MySQL resolves lookups from constant tables and doesn't show a plan.
+Statements whose column names are filled in at run time are explained
+with placeholder too, capture them with StatementRecorder instead.
+
+Run as gate:
+
+    python -m rtapi_bk.explain --host localhost --user root --db racktables \\
+        --baseline tests/explain_baseline.json --recommend
+
+Exit status is 1 when some statement has a problem not listed in
+baseline, --update-baseline writes current problems into baseline.
+"""
+
+import re
+import ast
+import sys
+import json
+import inspect
+import argparse
+import textwrap
+from collections import OrderedDict, namedtuple
+
+SQL_START = re.compile(r"^\s*(SELECT|UPDATE|DELETE|INSERT|REPLACE)\b", re.I)
+VALUES_ONLY = re.compile(r"^\s*(INSERT|REPLACE)\b(?!.*\bSELECT\b)", re.I | re.S)
+FORMAT_FIELDS = {'in': "%s", 'ip': "ip"}
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?", re.I)
+SQL_WORDS = set(["WHERE", "ON", "INNER", "LEFT", "RIGHT", "JOIN", "ORDER", "GROUP", "LIMIT", "SET", "UNION", "USING", "VALUES", "HAVING"])
+
+# One statement found in source or captured at run time
+Statement = namedtuple("Statement", ["sql", "methods"])
+# One problem found in EXPLAIN output
+Problem = namedtuple("Problem", ["sql", "methods", "table", "kind", "detail"])
+
+
+def python_format(template):
+    """Apply python % formatting with placeholder values"""
+    return re.sub(r"%[-#0 +]*\d*(?:\.\d+)?([sdrifx%])", lambda match: "%" if match.group(1) == "%" else "1", template)
+
+
+def string_value(node):
+    """
+    Return text of string expression node with placeholder values
+    substituted for variables, None if node isn't string expression
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if sys.version_info < (3, 8) and isinstance(node, ast.Str):
+        # Python 3.6 and 3.7 parse string literals as ast.Str
+        return node.s
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = string_value(node.left), string_value(node.right)
+        if left is None and right is None:
+            return None
+        return (left if left is not None else "1") + (right if right is not None else "1")
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mod):
+        template = string_value(node.left)
+        return python_format(template) if template is not None else None
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "format":
+        template = string_value(node.func.value)
+        if template is None:
+            return None
+        return re.sub(r"\{(\w+)\}", lambda match: FORMAT_FIELDS.get(match.group(1), "1"), template)
+    return None
+
+
+def normalize(sql):
+    """Collapse whitespace and replace DB-API placeholders with values usable by EXPLAIN"""
+    sql = " ".join(sql.split()).rstrip(";").replace("{in}", "%s")
+    sql = re.sub(r"\bLIMIT\s+%s", "LIMIT 1", sql, flags=re.I)
+    return re.sub(r"%[s%]", lambda match: "'1'" if match.group(0) == "%s" else "%", sql)
+
+
+def function_templates(func):
+    """Return list of SQL templates in source of function"""
+    func = inspect.unwrap(func)
+    try:
+        tree = ast.parse(textwrap.dedent(inspect.getsource(func)))
+    except (OSError, TypeError, SyntaxError):
+        return []
+    found = []
+
+    def visit(node):
+        value = string_value(node)
+        if value is not None and SQL_START.match(value):
+            found.append(value)
+            return
+        for child in ast.iter_child_nodes(node):
+            visit(child)
+    visit(tree)
+    return found
+
+
+def collect_statements(cls=None):
+    """
+    Collect SQL templates from methods of class (RTObject by default).
+    Return list of Statement, INSERT ... VALUES statements are skipped
+    """
+    if cls is None:
+        from . import RTObject as cls
+    statements = OrderedDict()
+    for name, func in sorted(vars(cls).items()):
+        if not inspect.isfunction(func):
+            continue
+        for template in function_templates(func):
+            if VALUES_ONLY.match(template):
+                continue
+            statements.setdefault(normalize(template), []).append(name)
+    return [Statement(sql, tuple(methods)) for sql, methods in statements.items()]
+
+
+class StatementRecorder:
+    """
+    Record statements issued by RTObject at run time.
+    rt.EnableInstrumentation().before_hooks.append(recorder.hook)
+    """
+
+    def __init__(self):
+        self.statements = OrderedDict()
+
+    def hook(self, sql, params):
+        """Instrumentation before hook"""
+        if not VALUES_ONLY.match(sql):
+            self.statements.setdefault(normalize(sql) if params is not None else " ".join(sql.split()), ("(captured)",))
+
+    def attach(self, rtobject):
+        """Start recording statements of rtobject (enables instrumentation if needed)"""
+        instrumentation = rtobject.instrumentation or rtobject.EnableInstrumentation(slow_threshold=None)
+        instrumentation.before_hooks.append(self.hook)
+        return self
+
+    def statement_list(self):
+        return [Statement(sql, methods) for sql, methods in self.statements.items()]
+
+
+def explain(connection, sql):
+    """Run EXPLAIN on connection, return list of row dictionaries"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("EXPLAIN " + sql)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def table_aliases(sql):
+    """Return dictionary alias: table of tables referenced by statement"""
+    aliases = {}
+    for table, alias in TABLE_REFERENCE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in SQL_WORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def analyse(statement, plan):
+    """Return list of Problem found in EXPLAIN rows of statement"""
+    problems = []
+    for row in plan:
+        table = row.get('table') or ""
+        access = (row.get('type') or "").upper()
+        extra = row.get('Extra') or ""
+        if access == "ALL":
+            problems.append(Problem(statement.sql, statement.methods, table, "full scan", "rows=%s" % row.get('rows')))
+        elif access == "INDEX":
+            problems.append(Problem(statement.sql, statement.methods, table, "index scan", "key=%s" % row.get('key')))
+        if "filesort" in extra:
+            problems.append(Problem(statement.sql, statement.methods, table, "filesort", extra))
+        if "temporary" in extra:
+            problems.append(Problem(statement.sql, statement.methods, table, "temporary", extra))
+    return problems
+
+
+def recommend(problem, columns):
+    """
+    Return index recommendation for full or index scan problem.
+    columns is dictionary table: list of columns, used to find predicates on scanned table.
+    """
+    aliases = table_aliases(problem.sql)
+    table = aliases.get(problem.table, problem.table)
+    if table not in columns or problem.kind not in ("full scan", "index scan"):
+        return None
+    qualified = problem.table if len(set(aliases.values())) > 1 else None
+    prefix = r"\b%s\." % re.escape(qualified) if qualified else r"(?<![.\w])"
+    wrapped = []
+    compared = []
+    for column in columns[table]:
+        name = re.escape(column)
+        if re.search(r"\w\(\s*%s`?%s`?\s*\)\s*(=|<|>|IN\b|LIKE\b)" % (prefix, name), problem.sql, re.I):
+            wrapped.append(column)
+        elif re.search(r"%s`?%s`?\s+LIKE\s+'%%" % (prefix, name), problem.sql, re.I):
+            wrapped.append(column)
+        elif re.search(r"%s`?%s`?\s*(=|<=>|>=|<=|<|>|\bIN\b|\bLIKE\b|\bBETWEEN\b)" % (prefix, name), problem.sql, re.I):
+            compared.append(column)
+    if wrapped:
+        return "%s: predicate on %s can't use index (function or leading wildcard), rewrite it" % (table, ", ".join(wrapped))
+    if compared:
+        return "CREATE INDEX %s_%s ON %s (%s)" % (table, "_".join(compared), table, ", ".join(compared))
+    return "%s: no usable predicate, statement reads whole table" % table
+
+
+def table_columns(connection):
+    """Return dictionary table: list of columns of current database"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+                          WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, ORDINAL_POSITION""")
+        columns = {}
+        for table, column in cursor.fetchall():
+            columns.setdefault(table, []).append(column)
+        return columns
+    finally:
+        cursor.close()
+
+
+def audit(connection, statements):
+    """
+    Explain all statements.
+    Return (problems, errors), errors is list of (Statement, error message)
+    """
+    problems = []
+    errors = []
+    for statement in statements:
+        try:
+            plan = explain(connection, statement.sql)
+        except Exception as e:
+            errors.append((statement, str(e)))
+            continue
+        problems.extend(analyse(statement, plan))
+    return problems, errors
+
+
+def fingerprint(problem):
+    """Key of problem used in baseline"""
+    return "%s | %s | %s" % (problem.kind, problem.table, problem.sql)
+
+
+def report(problems, errors, recommendations=None, output=sys.stdout):
+    """Write human readable report"""
+    for problem in problems:
+        output.write("%s on %s (%s) in %s\n    %s\n" % (problem.kind, problem.table, problem.detail, ", ".join(problem.methods), problem.sql))
+        if recommendations and recommendations.get(problem):
+            output.write("    recommendation: %s\n" % recommendations[problem])
+    for statement, message in errors:
+        output.write("EXPLAIN failed in %s: %s\n    %s\n" % (", ".join(statement.methods), message, statement.sql))
+    output.write("%d problems, %d statements not explained\n" % (len(problems), len(errors)))
+
+
+def main(argv=None):
+    """Command line entry point, return exit status"""
+    parser = argparse.ArgumentParser(description="EXPLAIN every SQL statement of RTObject")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--db", default="racktables")
+    parser.add_argument("--recommend", action="store_true", help="print index recommendations")
+    parser.add_argument("--baseline", help="JSON file with accepted problems")
+    parser.add_argument("--update-baseline", action="store_true", help="write current problems into baseline")
+    args = parser.parse_args(argv)
+
+    try:
+        import MySQLdb
+    except ImportError:
+        sys.stderr.write("MySQLdb (mysqlclient) is required\n")
+        return 2
+    connection = MySQLdb.connect(host=args.host, port=args.port, user=args.user, passwd=args.password, db=args.db)
+    try:
+        problems, errors = audit(connection, collect_statements())
+        recommendations = None
+        if args.recommend:
+            columns = table_columns(connection)
+            recommendations = dict((problem, recommend(problem, columns)) for problem in problems)
+    finally:
+        connection.close()
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as output:
+            json.dump(sorted(set(fingerprint(problem) for problem in problems)), output, indent=1)
+        return 0
+
+    accepted = set()
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            accepted = set(json.load(baseline))
+    new = [problem for problem in problems if fingerprint(problem) not in accepted]
+    report(new, errors, recommendations)
+    return 1 if new or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+#!/usr/bin/python
+#
+#   RTAPI
+#   Local SQLite read mirror of racktables database.
+#
+#   This utility is released under GPL v2
+
+"""
+Local SQLite read mirror.
+
+Mirror copies tables read by RTObject into local SQLite file.
+RTObject created on mirror connection (Mirror.rtobject()) serves read
+methods from the copy. MySQL flavoured SQL of RTObject is translated
+(%s placeholders) and MySQL functions INET_NTOA, INET_ATON, HEX,
+UNHEX, NOW and DATEDIFF are provided, text columns compare
+case-insensitive like in MySQL.
+
+Refresh is incremental. Rows of every table are split into buckets by
+integer column of primary key (bucket_width key values each), MySQL
+computes row count and BIT_XOR of CRC32 of every bucket and only
+buckets whose checksum differs from the stored one are copied again.
+Tables without integer primary key column are compared and copied as
+a whole.
+"""
+
+import re
+import json
+import socket
+import struct
+import sqlite3
+import pathlib
+from decimal import Decimal
+from collections import OrderedDict
+from datetime import date, datetime
+
+INTEGER_TYPES = ("tinyint", "smallint", "mediumint", "int", "integer", "bigint", "year", "bit")
+REAL_TYPES = ("float", "double", "real", "decimal")
+BINARY_TYPES = ("binary", "varbinary", "tinyblob", "blob", "mediumblob", "longblob")
+
+
+def sqlite_type(data_type):
+    """Return SQLite column type for MySQL data type"""
+    if data_type in INTEGER_TYPES:
+        return "INTEGER"
+    if data_type in REAL_TYPES:
+        return "REAL"
+    if data_type in BINARY_TYPES:
+        return "BLOB"
+    if data_type in ("datetime", "timestamp"):
+        return "RTAPI_DATETIME TEXT"
+    if data_type == "date":
+        return "RTAPI_DATE TEXT"
+    return "TEXT COLLATE NOCASE"
+
+
+def adapt(value):
+    """Convert value returned by MySQLdb to value storable in SQLite"""
+    if isinstance(value, (datetime, date)):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytearray):
+        return bytes(value)
+    if isinstance(value, (set, frozenset)):
+        return ",".join(sorted(value))
+    return value
+
+
+def text(value):
+    return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else value
+
+
+def convert_datetime(value):
+    value = value.decode("ascii")
+    for form in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f"):
+        try:
+            return datetime.strptime(value, form)
+        except ValueError:
+            pass
+    return None
+
+
+def convert_date(value):
+    try:
+        return datetime.strptime(value.decode("ascii"), "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+sqlite3.register_converter("RTAPI_DATETIME", convert_datetime)
+sqlite3.register_converter("RTAPI_DATE", convert_date)
+
+
+# MySQL functions used by RTObject queries
+def inet_ntoa(value):
+    try:
+        return socket.inet_ntoa(struct.pack("!I", int(value)))
+    except (TypeError, ValueError, struct.error):
+        return None
+
+
+def inet_aton(value):
+    try:
+        return struct.unpack("!I", socket.inet_aton(text(value)))[0]
+    except (TypeError, OSError):
+        return None
+
+
+def mysql_hex(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return value.hex().upper()
+    if isinstance(value, int):
+        return "%X" % value
+    if isinstance(value, float):
+        return "%X" % int(round(value))
+    return value.encode("utf-8").hex().upper()
+
+
+def unhex(value):
+    try:
+        return bytes.fromhex(text(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def datediff(first, second):
+    try:
+        first, second = [datetime.strptime(str(text(value))[:10], "%Y-%m-%d") for value in (first, second)]
+    except (TypeError, ValueError):
+        return None
+    return (first - second).days
+
+
+FUNCTIONS = [("INET_NTOA", 1, inet_ntoa), ("INET_ATON", 1, inet_aton), ("HEX", 1, mysql_hex),
+             ("UNHEX", 1, unhex), ("NOW", 0, now), ("DATEDIFF", 2, datediff)]
+PLACEHOLDER = re.compile(r"%[s%]")
+
+
+def translate(sql, params):
+    """Translate MySQLdb statement and parameters to sqlite3 ones"""
+    if params is None:
+        return sql, ()
+    sql = PLACEHOLDER.sub(lambda match: "?" if match.group(0) == "%s" else "%", sql)
+    return sql, tuple(adapt(value) for value in params)
+
+
+class MirrorCursor:
+    """DB-API cursor accepting MySQLdb style statements"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=None):
+        self.cursor.execute(*translate(sql, params))
+
+    def executemany(self, sql, params_list):
+        params_list = list(params_list)
+        sql = translate(sql, params_list[0] if params_list else ())[0]
+        self.cursor.executemany(sql, [translate("", params)[1] for params in params_list])
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return tuple(self.cursor.fetchall())
+
+    def fetchmany(self, size=1):
+        return tuple(self.cursor.fetchmany(size))
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def close(self):
+        self.cursor.close()
+
+
+class MirrorConnection:
+    """Read only DB-API connection to mirror file, usable as RTObject database object"""
+
+    def __init__(self, path):
+        uri = "%s?mode=ro" % pathlib.Path(path).resolve().as_uri()
+        self.connection = sqlite3.connect(uri, uri=True, detect_types=sqlite3.PARSE_DECLTYPES)
+        for name, args, function in FUNCTIONS:
+            self.connection.create_function(name, args, function)
+
+    def cursor(self, *args):
+        return MirrorCursor(self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def ping(self, *args):
+        pass
+
+    def close(self):
+        self.connection.close()
+
+
+class Mirror:
+    """
+    Local SQLite mirror of racktables tables.
+    refresh(rt) pulls changed rows from RTObject rt connected to MySQL,
+    rtobject() returns RTObject reading from mirror.
+    """
+
+    tables = ("Object", "AttributeValue", "Attribute", "AttributeMap", "Chapter", "Dictionary",
+              "Port", "Link", "EntityLink", "TagTree", "TagStorage", "ObjectLog",
+              "IPv4Network", "IPv4Address", "IPv4Allocation", "IPv4Log",
+              "IPv6Network", "IPv6Address", "IPv6Allocation")
+
+    def __init__(self, path, bucket_width=1000, page_rows=10000):
+        self.path = path
+        self.bucket_width = bucket_width
+        self.page_rows = page_rows
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS _mirror_table (tbl TEXT PRIMARY KEY, signature TEXT)""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS _mirror_checksum
+                           (tbl TEXT, bucket INTEGER, rows INTEGER, checksum INTEGER, PRIMARY KEY (tbl, bucket))""")
+
+    def connect(self):
+        """Return read only connection to mirror"""
+        return MirrorConnection(self.path)
+
+    def rtobject(self):
+        """Return RTObject serving read methods from mirror"""
+        from . import RTObject
+        return RTObject(self.connect())
+
+    def close(self):
+        self.db.close()
+
+    def refresh(self, source):
+        """
+        Copy changed rows from RTObject source into mirror.
+        Whole refresh is one SQLite transaction, readers see old or new state.
+        Return dictionary table name: number of copied rows
+        """
+        schema = self.load_schema(source)
+        copied = OrderedDict()
+        self.db.execute("BEGIN")
+        try:
+            for table in self.tables:
+                if table in schema:
+                    copied[table] = self.refresh_table(source, table, *schema[table])
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        return copied
+
+    def load_schema(self, source):
+        """Return {table: (columns, indexes)} of mirrored tables in MySQL"""
+        columns = OrderedDict()
+        sql = """SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS
+                 WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({in}) ORDER BY TABLE_NAME, ORDINAL_POSITION"""
+        for table, column, data_type in source.db_query_all_in(sql, self.tables):
+            columns.setdefault(text(table), []).append((text(column), text(data_type).lower()))
+
+        indexes = {}
+        sql = """SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+                 WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({in}) ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"""
+        for table, index, column in source.db_query_all_in(sql, self.tables):
+            indexes.setdefault(text(table), OrderedDict()).setdefault(text(index), []).append(text(column))
+        return dict((table, (table_columns, indexes.get(table, OrderedDict()))) for table, table_columns in columns.items())
+
+    def create_table(self, table, columns, indexes):
+        self.db.execute('DROP TABLE IF EXISTS "%s"' % table)
+        self.db.execute('CREATE TABLE "%s" (%s)' % (table, ", ".join('"%s" %s' % (column, sqlite_type(data_type)) for column, data_type in columns)))
+        # Indexes are not unique, rows of one bucket are replaced together
+        for index, index_columns in indexes.items():
+            self.db.execute('CREATE INDEX "%s_%s" ON "%s" (%s)' % (table, index, table, ", ".join('"%s"' % column for column in index_columns)))
+        self.db.execute("""DELETE FROM _mirror_checksum WHERE tbl = ?""", (table,))
+
+    def refresh_table(self, source, table, columns, indexes):
+        """Copy changed buckets of table, return number of copied rows"""
+        signature = json.dumps([columns, indexes])
+        row = self.db.execute("""SELECT signature FROM _mirror_table WHERE tbl = ?""", (table,)).fetchone()
+        if row is None or row[0] != signature:
+            self.create_table(table, columns, indexes)
+            self.db.execute("""INSERT OR REPLACE INTO _mirror_table (tbl, signature) VALUES (?, ?)""", (table, signature))
+
+        types = dict(columns)
+        names = [column for column, data_type in columns]
+        bucket = next((column for column in indexes.get("PRIMARY", []) if types[column] in INTEGER_TYPES), None)
+        checksum = "BIT_XOR(CRC32(CONCAT_WS('|', %s)))" % ", ".join("ISNULL(`%s`), `%s`" % (column, column) for column in names)
+        if bucket is not None:
+            sql = "SELECT `%s` DIV %d, COUNT(*), %s FROM `%s` GROUP BY 1" % (bucket, self.bucket_width, checksum, table)
+        else:
+            sql = "SELECT 0, COUNT(*), %s FROM `%s`" % (checksum, table)
+        remote = dict((int(number), (int(rows), int(crc))) for number, rows, crc in source.db_query_all(sql, ()) if rows)
+        local = dict((number, (rows, crc)) for number, rows, crc in
+                     self.db.execute("""SELECT bucket, rows, checksum FROM _mirror_checksum WHERE tbl = ?""", (table,)))
+
+        for number in set(local) - set(remote):
+            self.delete_buckets(table, bucket, [number])
+
+        copied = 0
+        run = []
+        for number in sorted(number for number in remote if local.get(number) != remote[number]):
+            if run and (number != run[-1] + 1 or sum(remote[item][0] for item in run) >= self.page_rows):
+                copied += self.copy_buckets(source, table, names, bucket, run, remote)
+                run = []
+            run.append(number)
+        if run:
+            copied += self.copy_buckets(source, table, names, bucket, run, remote)
+        return copied
+
+    def delete_buckets(self, table, bucket, run):
+        """Delete local rows of consecutive buckets"""
+        if bucket is None:
+            self.db.execute('DELETE FROM "%s"' % table)
+        else:
+            self.db.execute('DELETE FROM "%s" WHERE "%s" >= ? AND "%s" < ?' % (table, bucket, bucket),
+                            (run[0] * self.bucket_width, (run[-1] + 1) * self.bucket_width))
+        self.db.executemany("""DELETE FROM _mirror_checksum WHERE tbl = ? AND bucket = ?""", [(table, number) for number in run])
+
+    def copy_buckets(self, source, table, names, bucket, run, remote):
+        """Replace local rows of consecutive buckets by rows from source"""
+        self.delete_buckets(table, bucket, run)
+        sql = "SELECT %s FROM `%s`" % (", ".join("`%s`" % column for column in names), table)
+        if bucket is None:
+            rows = source.db_query_all(sql, ())
+        else:
+            sql += " WHERE `%s` >= %%s AND `%s` < %%s" % (bucket, bucket)
+            rows = source.db_query_all(sql, (run[0] * self.bucket_width, (run[-1] + 1) * self.bucket_width))
+        self.db.executemany('INSERT INTO "%s" VALUES (%s)' % (table, ", ".join(["?"] * len(names))),
+                            [tuple(adapt(value) for value in row) for row in rows])
+        self.db.executemany("""INSERT INTO _mirror_checksum (tbl, bucket, rows, checksum) VALUES (?, ?, ?, ?)""",
+                            [(table, number) + remote[number] for number in run])
+        return len(rows)
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+#
+#   RTAPI
+#   Record classes of racktables rows with lazily loaded relations.
+#
+#   This utility is released under GPL v2
+
+"""
+Compact record classes.
+
+Records are __slots__ objects with named fields built from database
+rows (Object.from_rows(rows, rtobject)). Records created together form
+a group. Relations (object.ports, object.attributes, ...) are loaded
+on first access for all records of the group which don't have them yet,
+using batch loaders of RTObject (one query per relation), so iterating
+over a rack and reading object.ports costs one query, not one per
+object. Related records loaded by one relation form their own group.
+
+Fields not present in rows are None. Records created without rtobject
+have no group and their relations can't be loaded.
+"""
+
+from collections import OrderedDict
+
+
+class RecordGroup:
+    """Records created together, relations are loaded for the whole group at once"""
+
+    __slots__ = ("rtobject", "records")
+
+    def __init__(self, rtobject):
+        self.rtobject = rtobject
+        self.records = []
+
+    def add(self, records):
+        """Add records into group, return them"""
+        for record in records:
+            record._group = self
+            self.records.append(record)
+        return records
+
+
+class Relation:
+    """
+    Lazily loaded relation of record class.
+    loader is name of RTObject method taking list of keys and returning
+    dictionary key: list of rows, build converts (key, rows) to relation value
+    (list of rows when build is None).
+    Value is stored in slot named by relation with leading underscore.
+    """
+
+    def __init__(self, loader, build=None, key="id"):
+        self.loader = loader
+        self.build = build
+        self.key = key
+        self.name = None
+        self.slot = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = "_" + name
+
+    def __get__(self, record, owner):
+        if record is None:
+            return self
+        try:
+            return getattr(record, self.slot)
+        except AttributeError:
+            pass
+        group = record._group
+        if group is None:
+            raise ValueError("%s record is not bound to RTObject, can't load %s" % (type(record).__name__, self.name))
+        self.load(group)
+        return getattr(record, self.slot)
+
+    def __set__(self, record, value):
+        setattr(record, self.slot, value)
+
+    def load(self, group):
+        """Load relation for records of group which don't have it"""
+        pending = [record for record in group.records if not hasattr(record, self.slot)]
+        keys = list(OrderedDict.fromkeys(getattr(record, self.key) for record in pending))
+        loaded = getattr(group.rtobject, self.loader)(keys)
+        related = RecordGroup(group.rtobject)
+        for record in pending:
+            key = getattr(record, self.key)
+            rows = loaded.get(key, [])
+            value = self.build(key, rows) if self.build is not None else list(rows)
+            related.add([item for item in value if isinstance(item, Record)])
+            setattr(record, self.slot, value)
+
+
+class Record:
+    """
+    Base of record classes.
+    fields are names of columns in order of rows, records compare
+    equal when they are of same class and have same fields.
+    """
+
+    __slots__ = ("_group",)
+    fields = ()
+
+    def __init__(self, *values):
+        self._group = None
+        fields = self.fields
+        if len(values) > len(fields):
+            raise TypeError("%s takes at most %d values" % (type(self).__name__, len(fields)))
+        for name, value in zip(fields, values):
+            setattr(self, name, value)
+        for name in fields[len(values):]:
+            setattr(self, name, None)
+
+    @classmethod
+    def from_rows(cls, rows, rtobject=None, columns=None):
+        """
+        Build list of records from rows, columns are names of row values
+        when rows are not in order of fields. Records get one group bound
+        to rtobject, so their relations are loaded together.
+        """
+        if columns is None:
+            records = [cls(*row) for row in rows]
+        else:
+            positions = [columns.index(name) if name in columns else None for name in cls.fields]
+            records = [cls(*[row[position] if position is not None else None for position in positions]) for row in rows]
+        if rtobject is not None:
+            RecordGroup(rtobject).add(records)
+        return records
+
+    def as_tuple(self):
+        """Return values of fields as tuple"""
+        return tuple(getattr(self, name) for name in self.fields)
+
+    def as_dict(self):
+        """Return OrderedDict field: value"""
+        return OrderedDict((name, getattr(self, name)) for name in self.fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.as_tuple() == other.as_tuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self).__name__,) + self.as_tuple())
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join("%s=%r" % (name, getattr(self, name)) for name in self.fields))
+
+
+class AttributeValue(Record):
+    """Value of object attribute with attribute name, type and dictionary value"""
+
+    fields = ("object_id", "attr_id", "name", "type", "string_value", "uint_value", "float_value", "dict_value")
+    __slots__ = fields
+
+    @property
+    def value(self):
+        """Value by attribute type (dictionary value for dict, uint_value for date)"""
+        if self.type == 'string':
+            return self.string_value
+        if self.type == 'float':
+            return self.float_value
+        if self.type == 'dict':
+            return self.dict_value
+        return self.uint_value
+
+
+class Port(Record):
+    """Port (network interface) of object"""
+
+    fields = ("object_id", "id", "name", "type", "l2address", "label")
+    __slots__ = fields
+
+
+class IPAllocation(Record):
+    """IPv4 or IPv6 address allocated to object"""
+
+    fields = ("object_id", "ip", "name", "type")
+    __slots__ = fields
+
+
+def prepend_key(cls):
+    """Build function for Relation creating records of cls from loader rows without key column"""
+    return lambda key, rows: [cls(key, *row) for row in rows]
+
+
+class Object(Record):
+    """
+    Racktables object.
+    Relations attributes, ports, ipv4, ipv6 are lists of records, links
+    are (port_id, port_name, remote_port_id, remote_port_name,
+    remote_object_id, remote_object_name) tuples, tags are tag names,
+    parents and children are Object records with id and name.
+    """
+
+    fields = ("id", "name", "label", "objtype_id", "asset_no", "has_problems", "comment")
+    __slots__ = fields + ("_attributes", "_ports", "_links", "_ipv4", "_ipv6", "_tags", "_parents", "_children")
+
+    attributes = Relation("GetObjectsAttributes", prepend_key(AttributeValue))
+    ports = Relation("GetObjectsPorts", prepend_key(Port))
+    links = Relation("GetObjectsLinks")
+    ipv4 = Relation("GetObjectsIpv4IPs", prepend_key(IPAllocation))
+    ipv6 = Relation("GetObjectsIpv6IPs", prepend_key(IPAllocation))
+    tags = Relation("GetObjectsTags")
+    parents = Relation("GetObjectsParents", lambda key, rows: [Object(*row) for row in rows])
+    children = Relation("GetObjectsChildren", lambda key, rows: [Object(*row) for row in rows])
@@ -0,0 +1,351 @@
+#!/usr/bin/python
+#
+#   RTAPI
+#   Columnar snapshot files of racktables inventory.
+#
+#   This utility is released under GPL v2
+
+"""
+Compact columnar snapshot files.
+
+File layout:
+    magic b"RTSNAP01"
+    column blocks, every block starts on 8 byte boundary
+    table of contents (JSON)
+    footer: offset and length of table of contents (two unsigned
+    64bit little endian integers) and magic again
+
+Column kinds:
+    int   - signed 64bit integers
+    ip    - unsigned 32bit integers (IPv4 addresses)
+    float - doubles
+    str   - row offsets (rows + 1 signed 64bit integers) into UTF-8 blob
+
+Columns containing NULL have also null bitmap, bit set for NULL row.
+Numbers are stored in byte order of machine which wrote the file,
+it is recorded in table of contents.
+
+Snapshot opens file with mmap, numeric columns are memoryviews over
+mapped file, so opening does not read or parse any rows.
+"""
+
+import os
+import sys
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from array import array
+from collections import OrderedDict
+
+MAGIC = b"RTSNAP01"
+FOOTER = struct.Struct("<QQ8s")
+VERSION = 1
+TYPECODES = {"int": "q", "ip": "I", "float": "d", "str": "q"}
+
+
+class ColumnWriter:
+    """Column of snapshot being written, values are spilled into temporary files"""
+
+    def __init__(self, name, kind):
+        if kind not in TYPECODES:
+            raise ValueError("Unknown column kind %s" % kind)
+        self.name = name
+        self.kind = kind
+        self.rows = 0
+        self.nulls = bytearray()
+        self.has_nulls = False
+        self.data = tempfile.TemporaryFile()
+        self.blob = None
+        if kind == "str":
+            self.blob = tempfile.TemporaryFile()
+            self.blob_size = 0
+            self.data.write(array("q", [0]).tobytes())
+
+    def set_null(self, row):
+        byte = row >> 3
+        if len(self.nulls) <= byte:
+            self.nulls.extend(bytes(byte + 1 - len(self.nulls)))
+        self.nulls[byte] |= 1 << (row & 7)
+        self.has_nulls = True
+
+    def extend(self, values):
+        """Append values of one page"""
+        items = array(TYPECODES[self.kind])
+        chunks = []
+        for value in values:
+            if value is None:
+                self.set_null(self.rows)
+                if self.kind != "str":
+                    value = 0
+            if self.kind == "str":
+                if value is not None:
+                    if not isinstance(value, bytes):
+                        value = str(value).encode("utf-8")
+                    chunks.append(value)
+                    self.blob_size += len(value)
+                value = self.blob_size
+            items.append(value)
+            self.rows += 1
+        self.data.write(items.tobytes())
+        if chunks:
+            self.blob.write(b"".join(chunks))
+
+    def blocks(self):
+        """Return list of (block name, file object) to copy into snapshot"""
+        blocks = [("data", self.data)]
+        if self.blob is not None:
+            blocks.append(("blob", self.blob))
+        if self.has_nulls:
+            self.nulls.extend(bytes((self.rows + 7) // 8 - len(self.nulls)))
+            blocks.append(("nulls", None))
+        return blocks
+
+    def close(self):
+        self.data.close()
+        if self.blob is not None:
+            self.blob.close()
+
+
+class SnapshotWriter:
+    """
+    Write snapshot file.
+    Tables are added with add_table(), file is assembled by close().
+    File is written under temporary name and renamed, readers never see partial snapshot.
+    """
+
+    def __init__(self, path, page_size=10000):
+        self.path = path
+        self.page_size = page_size
+        self.tables = OrderedDict()
+
+    def add_table(self, name, columns, rows):
+        """
+        Stream rows into table.
+        columns is list of (column name, kind), rows is iterable of tuples in same order.
+        Return number of rows.
+        """
+        writers = [ColumnWriter(column, kind) for column, kind in columns]
+        self.tables[name] = writers
+        page = []
+        for row in rows:
+            page.append(row)
+            if len(page) >= self.page_size:
+                self.write_page(writers, page)
+                page = []
+        if page:
+            self.write_page(writers, page)
+        return writers[0].rows if writers else 0
+
+    def write_page(self, writers, page):
+        for writer, values in zip(writers, zip(*page)):
+            writer.extend(values)
+
+    def abort(self):
+        """Drop snapshot being written, close spill files and remove partial file, existing snapshot stays"""
+        tmp_path = "%s.tmp" % self.path
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        for writers in self.tables.values():
+            for writer in writers:
+                writer.close()
+        self.tables = OrderedDict()
+
+    def close(self):
+        """Assemble snapshot file"""
+        tmp_path = "%s.tmp" % self.path
+        toc = {"version": VERSION, "byteorder": sys.byteorder, "tables": []}
+        try:
+            with open(tmp_path, "wb") as output:
+                output.write(MAGIC)
+                for name, writers in self.tables.items():
+                    table = {"name": name, "rows": writers[0].rows if writers else 0, "columns": []}
+                    for writer in writers:
+                        column = {"name": writer.name, "kind": writer.kind}
+                        for block, spill in writer.blocks():
+                            output.write(bytes(-output.tell() % 8))
+                            start = output.tell()
+                            if spill is None:
+                                output.write(writer.nulls)
+                            else:
+                                spill.seek(0)
+                                shutil.copyfileobj(spill, output)
+                            column[block] = [start, output.tell() - start]
+                        table["columns"].append(column)
+                    toc["tables"].append(table)
+                encoded = json.dumps(toc).encode("utf-8")
+                output.write(bytes(-output.tell() % 8))
+                start = output.tell()
+                output.write(encoded)
+                output.write(FOOTER.pack(start, len(encoded), MAGIC))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        finally:
+            for writers in self.tables.values():
+                for writer in writers:
+                    writer.close()
+
+
+class NullMask:
+    """Null bitmap of column, mask[row] is True for NULL"""
+
+    def __init__(self, view):
+        self.view = view
+
+    def __getitem__(self, row):
+        return bool(self.view[row >> 3] >> (row & 7) & 1)
+
+
+class StringColumn:
+    """String column of snapshot, values are decoded on access"""
+
+    def __init__(self, offsets, blob, nulls=None):
+        self.offsets = offsets
+        self.blob = blob
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if self.nulls is not None and self.nulls[row]:
+            return None
+        return str(self.blob[self.offsets[row]:self.offsets[row + 1]], "utf-8")
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+
+class SnapshotTable:
+    """
+    Table of snapshot.
+    table[column] returns memoryview for numeric columns (NULL stored as 0)
+    and StringColumn for string columns (NULL returned as None).
+    """
+
+    def __init__(self, name, rows, columns, nulls):
+        self.name = name
+        self.rows = rows
+        self.columns = columns
+        self.nulls = nulls
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def keys(self):
+        return list(self.columns.keys())
+
+    def isnull(self, column, row):
+        """Return True if value of column in row is NULL"""
+        nulls = self.nulls.get(column)
+        return nulls is not None and nulls[row]
+
+    def iterrows(self):
+        """Yield rows as tuples, NULL values as None"""
+        columns = []
+        for name, values in self.columns.items():
+            if isinstance(values, StringColumn) or name not in self.nulls:
+                columns.append(values)
+            else:
+                nulls = self.nulls[name]
+                columns.append([None if nulls[row] else value for row, value in enumerate(values)])
+        return zip(*columns)
+
+
+class Snapshot:
+    """
+    Read only view of snapshot file written by RTObject.ExportSnapshot().
+    snapshot['Object']['name'][0] returns name of first object.
+    Columns must not be used after close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.file.close()
+            raise
+        self.view = memoryview(self.map)
+        self.views = []
+        self.tables = OrderedDict()
+        try:
+            self.load()
+        except Exception:
+            self.close()
+            raise
+
+    def load(self):
+        size = len(self.map)
+        if size < len(MAGIC) + FOOTER.size or self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not snapshot file" % self.path)
+        start, length, magic = FOOTER.unpack(self.map[size - FOOTER.size:])
+        if magic != MAGIC:
+            raise ValueError("%s is truncated snapshot file" % self.path)
+        toc = json.loads(self.map[start:start + length].decode("utf-8"))
+        if toc["version"] != VERSION:
+            raise ValueError("Unsupported snapshot version %s" % toc["version"])
+        if toc["byteorder"] != sys.byteorder:
+            raise ValueError("Snapshot was written on %s endian machine" % toc["byteorder"])
+
+        for table in toc["tables"]:
+            columns = OrderedDict()
+            nulls = {}
+            for column in table["columns"]:
+                mask = None
+                if "nulls" in column:
+                    mask = nulls[column["name"]] = NullMask(self.block(column["nulls"]))
+                values = self.block(column["data"]).cast(TYPECODES[column["kind"]])
+                self.views.append(values)
+                if column["kind"] == "str":
+                    values = StringColumn(values, self.block(column["blob"]), mask)
+                columns[column["name"]] = values
+            self.tables[table["name"]] = SnapshotTable(table["name"], table["rows"], columns, nulls)
+
+    def block(self, location):
+        start, length = location
+        view = self.view[start:start + length]
+        self.views.append(view)
+        return view
+
+    def __getitem__(self, table):
+        return self.tables[table]
+
+    def __contains__(self, table):
+        return table in self.tables
+
+    def keys(self):
+        return list(self.tables.keys())
+
+    def close(self):
+        """Release mapped file"""
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        if self.map is not None:
+            self.view.release()
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Recording DB-API stand-in for tests which don't need MySQL.
+
+FakeConnection records every statement sent by RTObject and serves
+scripted results. Results are registered with respond(pattern, rows),
+pattern is regular expression searched in the SQL statement (whitespace
+collapsed), rows is list of tuples or callable(sql, params) returning it,
+optional columns are names returned in cursor.description.
+First matching response wins, statements without response return no rows.
+"""
+
+import re
+
+
+class FakeCursor:
+    """Cursor recording statements into its connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+        self.description = None
+
+    def execute(self, sql, params=None):
+        self.connection.record(sql, params, 1)
+        rows, columns = self.connection.serve(sql, params)
+        self.rows = list(rows)
+        self.description = [(name,) for name in columns] if columns else None
+        self.rowcount = len(self.rows)
+        self.lastrowid = self.connection.next_id()
+
+    def executemany(self, sql, params_list):
+        params_list = list(params_list)
+        # MySQLdb sends executemany INSERT as one multi-row statement, other statements one by one
+        round_trips = 1 if re.match(r"\s*INSERT", sql, re.I) else len(params_list)
+        self.connection.record(sql, params_list, round_trips)
+        self.rows = []
+        self.rowcount = len(params_list)
+        self.lastrowid = self.connection.next_id()
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows = tuple(self.rows)
+        self.rows = []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows = self.rows[:size]
+        self.rows = self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Connection recording statements, commits and rollbacks"""
+
+    def __init__(self):
+        self.responses = []
+        self.reset()
+        self.last_id = 1000
+        self.closed = False
+
+    def reset(self):
+        """Forget recorded statements"""
+        self.statements = []
+        self.round_trips = 0
+        self.commits = 0
+        self.rollbacks = 0
+
+    def respond(self, pattern, rows, columns=None):
+        """Serve rows for statements matching pattern"""
+        self.responses.append((re.compile(pattern, re.I), rows, columns))
+
+    def record(self, sql, params, round_trips):
+        self.statements.append((" ".join(sql.split()), params))
+        self.round_trips += round_trips
+
+    def serve(self, sql, params):
+        sql = " ".join(sql.split())
+        for pattern, rows, columns in self.responses:
+            if pattern.search(sql):
+                return (rows(sql, params) if callable(rows) else rows), columns
+        return [], None
+
+    def next_id(self):
+        self.last_id += 1
+        return self.last_id
+
+    def sql(self, pattern):
+        """Return recorded statements matching pattern"""
+        return [stmt for stmt in self.statements if re.search(pattern, stmt[0], re.I)]
+
+    def cursor(self, *args):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def resolve_names(sql, params):
+    """Response for name lookups, object id is 100 + last digit of name"""
+    return [(int(name[-1]) + 100, name) for name in params]
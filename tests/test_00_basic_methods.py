@@ -70,3 +70,42 @@ def test_GetObjectId():
 
 def test_DeleteObj():
     assert rt.rtapi.DeleteObject(test_object_id) is None
+
+
+def test_TransactionRollback():
+    try:
+        with rt.rtapi.transaction():
+            rt.rtapi.AddObject(test_object["name"], test_object["typeid"], test_object["asset"], test_object["label"])
+            raise RuntimeError("rollback")
+    except RuntimeError:
+        pass
+    assert rt.rtapi.ObjectExistName(test_object["name"]) is False
+
+
+def test_AddObjects():
+    records = [("bulk1", 4, "BULK0001", "bulk"), ("bulk2", 4, "BULK0002", "bulk"), ("bulk1", 4, "BULK0003", "bulk")]
+    ids = rt.rtapi.AddObjects(records)
+    assert sorted(ids.keys()) == ["bulk1", "bulk2"]
+    assert rt.rtapi.GetObjectId("bulk2") == ids["bulk2"]
+    assert rt.rtapi.AddObjects(records) == {}
+    for object_id in ids.values():
+        rt.rtapi.DeleteObject(object_id)
+
+
+def test_ObjectCache():
+    cache = rt.rtapi.EnableObjectCache(size=100, ttl=60)
+    object_id = rt.rtapi.AddObject("cached1", 4, "CACHE0001", "cache")
+    assert rt.rtapi.GetObjectId("cached1") == object_id
+    assert rt.rtapi.GetObjectId("cached1") == object_id
+    assert cache.hits >= 1
+    rt.rtapi.UpdateObjectName(object_id, "cached2")
+    assert rt.rtapi.GetObjectName(object_id) == "cached2"
+    assert rt.rtapi.ObjectExistName("cached1") is False
+    rt.rtapi.DeleteObject(object_id)
+    assert rt.rtapi.GetObjectName(object_id) is None
+    rt.rtapi.DisableObjectCache()
+
+
+def test_IterObjects():
+    listed = sorted(row[0] for row in rt.rtapi.ListObjects('list'))
+    assert sorted(row[0] for row in rt.rtapi.IterObjects(chunk_size=2)) == listed
@@ -56,3 +56,38 @@ def test_InsertAttribute():
                                         test_object["asset"], test_object["label"])
     assert rt.rtapi.InsertAttribute(test_object_id, 4, att_id, "NULL", hw_id, 'TESTNAME') is None
     assert rt.rtapi.DeleteObject(test_object_id) is None
+
+
+def test_DictionaryIndex():
+    chapter_id = rt.rtapi.GetDictionaryChapterId('server models')
+    rt.rtapi.EnableDictionaryIndex()
+    assert rt.rtapi.GetDictionaryChapterId('server models') == chapter_id
+    rt.rtapi.InsertDictionaryValue(chapter_id, 'indexmodel')
+    dict_key = rt.rtapi.GetDictionaryIdByValue('indexmodel')
+    assert isinstance(dict_key, int) is True
+    assert rt.rtapi.GetDictionaryId('dexmod') == dict_key
+    assert rt.rtapi.GetDictionaryValueById(dict_key) == 'indexmodel'
+    rt.rtapi.DeleteDictionaryValue('indexmodel')
+    assert rt.rtapi.GetDictionaryIdByValue('indexmodel') is None
+    rt.rtapi.DisableDictionaryIndex()
+
+
+def test_AttributeRegistry():
+    att_id = rt.rtapi.GetAttributeIdByName('HW type')
+    rt.rtapi.EnableAttributeRegistry()
+    assert rt.rtapi.GetAttributeIdByName('HW type') == att_id
+    assert rt.rtapi.GetAttributeId('HW type') == att_id
+    assert rt.rtapi.IsAttributeMapped(4, att_id) is True
+    rt.rtapi.DisableAttributeRegistry()
+
+
+def test_UpsertAttributes():
+    object_id = rt.rtapi.AddObject(test_object["name"], test_object["typeid"], test_object["asset"], test_object["label"])
+    summary = rt.rtapi.UpsertAttributes(object_id, {'OEM S/N 1': 'SN0001'})
+    assert summary['inserted'] == 1
+    summary = rt.rtapi.UpsertAttributes(object_id, {'OEM S/N 1': 'SN0001'})
+    assert summary['unchanged'] == 1
+    summary = rt.rtapi.UpsertAttributes(object_id, {'OEM S/N 1': 'SN0002'})
+    assert summary['updated'] == 1
+    assert rt.rtapi.GetAttributeValue(object_id, rt.rtapi.GetAttributeIdByName('OEM S/N 1'))[0] == 'SN0002'
+    assert rt.rtapi.DeleteObject(object_id) is None
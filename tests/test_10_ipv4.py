@@ -34,3 +34,17 @@ def test_InterfaceAddIpv6IP():
 
 def test_DeleteObj():
     assert rt.rtapi.DeleteObject(obj_id) is None
+
+
+def test_GetIpv4NetworkIndex():
+    index = rt.rtapi.GetIpv4NetworkIndex()
+    for network in index.networks:
+        assert index.lookup(network.first) is not None
+        assert network in index.containing(network.last)
+
+
+def test_GetIpv6NetworkIndex():
+    index = rt.rtapi.GetIpv6NetworkIndex()
+    for network in index.networks:
+        assert network in index.containing(network.first)
+        assert network in index.containing(network.last)
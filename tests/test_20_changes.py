@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+# Change feed from ObjectLog and IPv4Log.
+# Runs against recording fake connection, no database needed.
+
+import re
+from datetime import datetime
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def change_log(db):
+    object_log = [(1, 5, "script", datetime(2024, 1, 1, 10, 0), "New connection server1,eth0 with switch1,gi1"),
+                  (2, 6, "script", datetime(2024, 1, 1, 10, 2), "Added IP 10.0.0.1 on eth0"),
+                  (3, 5, "admin", datetime(2024, 1, 1, 10, 4), "label changed")]
+    ipv4_log = [(7, "10.0.0.1", "script", datetime(2024, 1, 1, 10, 3), "Name set to web1")]
+
+    def after(rows):
+        def serve(sql, params):
+            last = int(re.search(r"id > (\d+)", sql).group(1)) if len(params) == 1 else params[0]
+            return [row for row in rows if row[0] > last][:params[-1]]
+        return serve
+    db.respond(r"FROM ObjectLog WHERE id >", after(object_log))
+    db.respond(r"FROM IPv4Log WHERE id >", after(ipv4_log))
+    return object_log, ipv4_log
+
+
+def test_ChangesSince(db, rt):
+    change_log(db)
+    changes = list(rt.ChangesSince(chunk_size=2))
+    assert [(change.kind, change.log_id) for change in changes] == [("link", 1), ("ip", 2), ("ipv4", 7), ("object", 3)]
+    assert changes[2].ip == "10.0.0.1" and changes[2].object_id is None
+    assert str(changes[1].cursor) == "2:0"
+    assert str(changes[2].cursor) == "2:7"
+
+    resumed = list(rt.ChangesSince(str(changes[1].cursor)))
+    assert [change.log_id for change in resumed] == [7, 3]
+    assert list(rt.ChangesSince(changes[-1].cursor)) == []
+
+
+def test_ChangePoller(db, rt):
+    change_log(db)
+    rt.EnableObjectCache()
+    rt.object_cache.put(('id', 5), (5, "server1"))
+    rt.object_cache.put(('id', 8), (8, "server8"))
+    cache = rtapi_bk.LookupCache()
+    cache.put("key", "value")
+    seen = []
+    poller = rtapi_bk.ChangePoller(rt, rtapi_bk.ChangeCursor(0, 0))
+    poller.register(seen.append, kinds=["ipv4"])
+    poller.register_cache(cache, kinds=["link"])
+    assert poller.poll() == 4
+    assert [change.log_id for change in seen] == [7]
+    assert cache.stats()['size'] == 0
+    assert rt.object_cache.get(('id', 5)) == (False, None)
+    assert rt.object_cache.get(('id', 8)) == (True, (8, "server8"))
+    assert str(poller.cursor) == "3:7"
+    assert poller.poll() == 0
+
+
+def test_ChangePoller_late_commit(db, rt):
+    object_log, ipv4_log = change_log(db)
+    late = object_log.pop(1)
+    poller = rtapi_bk.ChangePoller(rt, rtapi_bk.ChangeCursor(1, 0), lookback=10)
+    seen = []
+    poller.register(seen.append)
+    assert poller.poll() == 2
+    assert str(poller.cursor) == "3:7"
+    # Log id 2 is committed after id 3 was processed
+    object_log.insert(1, late)
+    assert poller.poll() == 1
+    assert [change.log_id for change in seen] == [7, 3, 2]
+    assert str(poller.cursor) == "3:7"
+    assert poller.poll() == 0
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+#
+# Query plan auditor.
+# EXPLAIN output is served by recording fake connection, no MySQL needed.
+
+from rtapi_bk import explain
+from fakedb import FakeConnection
+
+COLUMNS = ["id", "select_type", "table", "type", "possible_keys", "key", "rows", "Extra"]
+
+
+def test_collect_statements():
+    statements = dict((statement.sql, statement.methods) for statement in explain.collect_statements())
+    # Empty collection would make the gate pass without auditing anything
+    assert len(statements) >= 150
+    assert statements["SELECT id FROM Attribute WHERE name LIKE '%1%'"] == ("GetAttributeId",)
+    assert "SELECT comment FROM IPv4Address WHERE ip = '1'" in statements
+    assert "DELETE FROM Link WHERE porta IN ('1')" in statements
+    assert not [sql for sql in statements if "{" in sql or "%s" in sql or sql.startswith("INSERT INTO ObjectLog")]
+
+
+def test_audit():
+    db = FakeConnection()
+    db.respond(r"EXPLAIN SELECT id FROM Attribute", [(1, "SIMPLE", "Attribute", "ALL", None, None, 300, "Using where")], COLUMNS)
+    db.respond(r"EXPLAIN SELECT name FROM IPv4Address", [(1, "SIMPLE", "IPv4Address", "ALL", None, None, 9000, "Using where; Using filesort")], COLUMNS)
+    db.respond(r"EXPLAIN", [(1, "SIMPLE", "Object", "const", "PRIMARY", "PRIMARY", 1, "")], COLUMNS)
+    statements = [
+        explain.Statement("SELECT id FROM Attribute WHERE name LIKE '%1%'", ("GetAttributeId",)),
+        explain.Statement("SELECT name FROM IPv4Address WHERE comment = '1' ORDER BY name", ("FindName",)),
+        explain.Statement("SELECT name FROM Object WHERE id = '1'", ("GetObjectName",)),
+    ]
+    problems, errors = explain.audit(db, statements)
+    assert errors == []
+    assert [(problem.methods, problem.kind) for problem in problems] == [(("GetAttributeId",), "full scan"), (("FindName",), "full scan"), (("FindName",), "filesort")]
+
+    columns = {"Attribute": ["id", "type", "name"], "IPv4Address": ["ip", "name", "comment", "reserved"]}
+    assert "leading wildcard" in explain.recommend(problems[0], columns)
+    assert explain.recommend(problems[1], columns) == "CREATE INDEX IPv4Address_comment ON IPv4Address (comment)"
+    assert explain.recommend(problems[2], columns) is None
+
+
+def test_recorder():
+    recorder = explain.StatementRecorder()
+    recorder.hook("SELECT id FROM Object WHERE name = %s LIMIT %s", ("a", 5))
+    recorder.hook("INSERT INTO ObjectLog (object_id) VALUES (%s)", (1,))
+    assert [statement.sql for statement in recorder.statement_list()] == ["SELECT id FROM Object WHERE name = '1' LIMIT 1"]
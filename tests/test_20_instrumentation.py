@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+#
+# Instrumentation of RTObject methods.
+# Runs against recording fake connection, no database needed.
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection, resolve_names
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def test_instrumentation_counts_statements(db, rt):
+    db.respond(r"SELECT id, name FROM Object WHERE name IN", resolve_names)
+    db.respond(r"SELECT id FROM Attribute WHERE name LIKE", [(5,)])
+    stats = rt.EnableInstrumentation(slow_threshold=None)
+    rt.AssignChassisSlot("chassis1", "A1", "server1")
+    method = stats.snapshot()['methods']['AssignChassisSlot']
+    assert method['calls'] == 1
+    assert method['statements'] == db.round_trips
+
+
+def test_instrumentation_measures_iterators(db, rt):
+    db.respond(r"FROM Object ORDER BY id LIMIT", [(1, "server1", None, 4), (2, "server2", None, 4)])
+    stats = rt.EnableInstrumentation(slow_threshold=None)
+    iterator = rt.IterObjects(chunk_size=10)
+    assert 'IterObjects' not in stats.snapshot()['methods']
+    for row in iterator:
+        rt.GetObjectName(row[0])
+    methods = stats.snapshot()['methods']
+    assert methods['IterObjects']['calls'] == 1
+    assert methods['IterObjects']['statements'] == 1
+    assert methods['GetObjectName']['statements'] == 2
+
+
+def test_instrumentation_skips_helpers(db, rt):
+    db.respond(r"FROM Object WHERE id", [(7, "switch1")])
+    rt.EnableObjectCache()
+    rt.EnableLogBuffer(max_rows=100, max_age=None)
+    stats = rt.EnableInstrumentation(slow_threshold=None)
+    rt.GetObjectName(7)
+    rt.InsertLog(7, "message")
+    rt.FlushLogs()
+    assert sorted(stats.snapshot()['methods']) == ["GetObjectName", "InsertLog"]
+    assert stats.snapshot()['methods']['GetObjectName']['statements'] == 1
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+#
+# IP address codec and sargable address predicates.
+# Runs against recording fake connection, no database needed.
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def test_ip_codec():
+    assert rtapi_bk.ipv4_encode("10.0.0.1") == 167772161
+    assert rtapi_bk.ipv4_encode(b"\x0a\x00\x00\x01") == 167772161
+    assert rtapi_bk.ipv4_decode_many([167772161, 0]) == ["10.0.0.1", "0.0.0.0"]
+    packed = rtapi_bk.ipv6_encode("2001:db8::1")
+    assert packed == rtapi_bk.ipv6_encode("20010DB8000000000000000000000001") == rtapi_bk.ipv6_encode(int.from_bytes(packed, "big"))
+    assert rtapi_bk.ipv6_decode(packed) == "2001:db8::1"
+    assert rtapi_bk.ipv6_decode(packed, exploded=True) == "2001:0db8:0000:0000:0000:0000:0000:0001"
+    with pytest.raises(ValueError):
+        rtapi_bk.ipv4_encode("10.0.0.300")
+    with pytest.raises(ValueError):
+        rtapi_bk.ipv6_encode(b"\x00" * 4)
+
+
+def test_ip_predicates_are_sargable(db, rt):
+    db.respond(r"SELECT comment FROM IPv4Address", [("old",)])
+    rt.SetIPComment("new", "10.0.0.1")
+    rt.SetIP6Comment("new", "2001:db8::1")
+    assert db.sql(r"UPDATE IPv4Address")[0] == ("UPDATE IPv4Address SET comment = %s WHERE ip = %s", ("new", 167772161))
+    assert db.sql(r"INSERT INTO IPv6Address")[0][1] == (rtapi_bk.ipv6_encode("2001:db8::1"), "new")
+    assert not db.sql(r"INET_NTOA\(ip\) =|HEX\(ip\) =")
+    assert db.round_trips == 4
+    assert db.commits == 2
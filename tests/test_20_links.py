@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+#
+# Declarative sync of links.
+# Runs against recording fake connection, no database needed.
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def topology(db):
+    ports = [(10, 1, "eth0"), (11, 1, "eth1"), (20, 2, "gi1"), (21, 2, "gi2"), (22, 2, "gi3"), (30, 3, "eth0")]
+    devices = {1: "server1", 2: "switch1", 3: "server3"}
+    db.respond(r"SELECT id, name FROM Object WHERE name IN", [(2, "switch1")])
+    db.respond(r"SELECT id, object_id, name FROM Port", lambda sql, params: [port for port in ports if port[1] in params])
+    db.respond(r"FROM Link", [(10, 21), (22, 30)])
+    db.respond(r"FROM Port INNER JOIN Object", lambda sql, params: [(port[0], port[2], port[1], devices[port[1]]) for port in ports if port[0] in params])
+
+
+def test_SyncLinks(db, rt):
+    topology(db)
+    summary = rt.SyncLinks([(1, "eth0", "switch1", "gi1"), (1, "eth1", "switch1", "gi3"), (1, "eth0", "switch1", "gi1"), (1, "ethX", "switch1", "gi1")])
+    assert summary == {'created': 1, 'updated': 1, 'unchanged': 1, 'skipped': 1}
+    assert sorted(db.sql(r"DELETE FROM Link")[0][1]) == [10, 22]
+    assert db.sql(r"INSERT INTO Link")[0][1] == [(10, 20), (11, 22)]
+    logs = db.sql(r"INSERT INTO ObjectLog")[0][1]
+    assert (1, "Disconnected server1,eth0 from switch1,gi2") in logs
+    assert (1, "Update connection from switch1,gi2 to switch1,gi1") in logs
+    assert (2, "server1,eth0 changed connection from switch1,gi2 and connected to switch1,gi1") in logs
+    assert (3, "Disconnected switch1,gi3 from server3,eth0") in logs
+    assert (2, "New connection server1,eth1 with switch1,gi3") in logs
+    assert db.round_trips == 4 + 3
+    assert db.commits == 1
+
+
+def test_SyncLinks_noop(db, rt):
+    topology(db)
+    summary = rt.SyncLinks([(1, "eth0", "switch1", "gi2"), (3, "eth0", "switch1", "gi3")])
+    assert summary['unchanged'] == 2
+    assert db.round_trips == 4
+    assert db.commits == 0
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+#
+# Batch loading of objects with relations.
+# Runs against recording fake connection, no database needed.
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+@pytest.mark.parametrize("count", [3, 300])
+def test_LoadObjects(db, rt, count):
+    ids = list(range(1, count + 1))
+    db.respond(r"FROM Object WHERE id IN", lambda sql, params: [(i, "server%d" % i, "", 4, None, "no", None) for i in params if i < 9999])
+    db.respond(r"FROM AttributeValue", lambda sql, params: [(i, 3, "FQDN", "string", "server%d.example.com" % i, None, None, None) for i in params])
+    db.respond(r"FROM Port WHERE object_id IN", lambda sql, params: [(i, 100 + i, "eth0", 24, None, "") for i in params])
+    db.respond(r"FROM Port AS p JOIN Link", [(1, 101, "eth0", 502, "Gi0/1", 50, "switch1")])
+    db.respond(r"FROM IPv4Allocation", lambda sql, params: [(i, "10.0.0.%d" % (i % 250), "eth0", "regular") for i in params])
+    db.respond(r"FROM TagStorage", [(1, "prod"), (2, "prod"), (1, "web")])
+    db.respond(r"JOIN Object AS o ON o.id = el.parent_entity_id", [(2, 60, "chassis1")])
+    objects = rt.LoadObjects(ids + [9999], include=["attributes", "ports", "links", "ipv4", "ipv6", "tags", "parents", "children"])
+    assert list(objects) == ids
+    assert objects[1]["name"] == "server1"
+    assert objects[1]["attributes"] == [(3, "FQDN", "string", "server1.example.com", None, None, None)]
+    assert objects[1]["ports"] == [(101, "eth0", 24, None, "")]
+    assert objects[1]["links"] == [(101, "eth0", 502, "Gi0/1", 50, "switch1")]
+    assert objects[2]["links"] == [] and objects[2]["ipv6"] == []
+    assert objects[1]["tags"] == ["prod", "web"]
+    assert objects[2]["parents"] == [(60, "chassis1")] and objects[2]["children"] == []
+    assert db.round_trips == 1 + 8
+    with pytest.raises(ValueError):
+        rt.LoadObjects(ids, include=["racks"])
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+# Buffered ObjectLog and IPv4Log inserts.
+# Runs against recording fake connection, no database needed.
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection, resolve_names
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def test_LogBuffer(db, rt):
+    db.respond(r"SELECT id, name FROM Object WHERE name IN", resolve_names)
+    db.respond(r"SELECT id FROM Attribute WHERE name LIKE", [(5,)])
+    rt.EnableLogBuffer(max_rows=100, max_age=None)
+    for i in range(10):
+        rt.AssignChassisSlot("chassis1", "A%d" % i, "server2")
+        rt.InsertIPv4Log("10.0.0.1", "message")
+    assert db.sql(r"INSERT INTO ObjectLog") == []
+    before = db.round_trips
+    rt.close()
+    assert db.round_trips == before + 2
+    assert len(db.sql(r"INSERT INTO ObjectLog")[0][1]) == 20
+    assert len(db.sql(r"INSERT INTO IPv4Log")[0][1]) == 10
+
+
+def test_LogBuffer_size_threshold(db, rt):
+    rt.EnableLogBuffer(max_rows=50, max_age=None)
+    for i in range(120):
+        rt.InsertLog(1, "message %d" % i)
+    assert db.round_trips == 2
+    assert db.commits == 2
+    assert rt.log_buffer.pending() == 20
+    object_id, date, message = db.sql(r"INSERT INTO ObjectLog")[0][1][0]
+    assert message == "message 0"
+
+
+def test_LogBuffer_transaction(db, rt):
+    rt.EnableLogBuffer(max_rows=50, max_age=None)
+    with rt.transaction():
+        rt.InsertLog(1, "committed")
+    assert db.sql(r"INSERT INTO ObjectLog")[0][1][0][2] == "committed"
+    assert db.commits == 1
+    with pytest.raises(RuntimeError):
+        with rt.transaction():
+            rt.InsertLog(1, "rolled back")
+            raise RuntimeError("fail")
+    assert rt.log_buffer.pending() == 0
+    assert len(db.sql(r"INSERT INTO ObjectLog")) == 1
+
+
+def test_LogBuffer_failed_flush_keeps_logs(db, rt, monkeypatch):
+    rt.EnableLogBuffer(max_rows=50, max_age=None)
+    rt.InsertLog(1, "message")
+
+    def fail(sql, params_list):
+        raise RuntimeError("insert failed")
+    monkeypatch.setattr(rt, "db_insert_many", fail)
+    with pytest.raises(RuntimeError):
+        rt.FlushLogs()
+    assert rt.log_buffer.pending() == 1
+    monkeypatch.undo()
+    rt.FlushLogs()
+    assert rt.log_buffer.pending() == 0
+    assert db.sql(r"INSERT INTO ObjectLog")[-1][1][0][2] == "message"
+
+
+def test_LogBuffer_due_counts_own_unit_of_work(db):
+    buffer = rtapi_bk.LogBuffer(max_rows=2, max_age=None)
+    other = object()
+    buffer.add("ObjectLog", other, (1, None, "other"))
+    buffer.add("ObjectLog", other, (1, None, "other"))
+    buffer.add("ObjectLog", None, (1, None, "mine"))
+    assert buffer.due(other)
+    assert not buffer.due(None)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# SQLite read mirror.
+# Source database is recording fake connection, no MySQL needed.
+
+import zlib
+import sqlite3
+from datetime import datetime
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+COLUMNS = {
+    "Object": [("id", "int"), ("name", "char"), ("label", "char"), ("objtype_id", "int"), ("asset_no", "char"), ("has_problems", "enum"), ("comment", "text")],
+    "Port": [("id", "int"), ("object_id", "int"), ("name", "char"), ("type", "int")],
+    "IPv4Allocation": [("object_id", "int"), ("ip", "int"), ("name", "char"), ("type", "enum")],
+    "IPv6Address": [("ip", "binary"), ("name", "char"), ("comment", "char"), ("reserved", "enum")],
+    "ObjectLog": [("id", "int"), ("object_id", "int"), ("user", "char"), ("date", "datetime"), ("content", "text")],
+}
+INDEXES = [("Object", "PRIMARY", "id"), ("Object", "name", "name"), ("Port", "PRIMARY", "id"), ("Port", "object_iif_oif", "object_id"),
+           ("IPv4Allocation", "PRIMARY", "object_id"), ("IPv4Allocation", "PRIMARY", "ip"), ("IPv6Address", "PRIMARY", "ip"), ("ObjectLog", "PRIMARY", "id")]
+
+
+class Source:
+    """Fake MySQL with tables and checksum queries"""
+
+    def __init__(self):
+        self.tables = {
+            "Object": [(1, "Server1", None, 4, "ASSET1", "no", None), (2, "switch1", "sw", 8, None, "no", None), (2500, "server3", None, 4, None, "yes", "far")],
+            "Port": [(10, 1, "eth0", 24), (11, 1, "eth1", 24)],
+            "IPv4Allocation": [(1, 3232235521, "eth0", "regular")],
+            "IPv6Address": [(bytes.fromhex("20010db8000000000000000000000001"), "gw", "gateway", "no")],
+            "ObjectLog": [(1, 1, "script", datetime(2024, 5, 1, 12, 30), "created")],
+        }
+        self.db = FakeConnection()
+        self.db.respond(r"information_schema.COLUMNS", lambda sql, params: [(table, column, data_type) for table, columns in COLUMNS.items() for column, data_type in columns if table in params])
+        self.db.respond(r"information_schema.STATISTICS", INDEXES)
+        self.db.respond(r"COUNT\(\*\)", self.checksums)
+        self.db.respond(r"^SELECT `", self.rows)
+        self.rt = rtapi_bk.RTObject(self.db)
+
+    def table(self, sql):
+        return sql.split("FROM `")[1].split("`")[0]
+
+    def checksums(self, sql, params):
+        table = self.table(sql)
+        buckets = {}
+        for row in self.tables[table]:
+            number = row[0] // 1000 if "DIV" in sql else 0
+            count, crc = buckets.get(number, (0, 0))
+            buckets[number] = (count + 1, crc ^ zlib.crc32(repr(row).encode()))
+        return [(number,) + value for number, value in buckets.items()]
+
+    def rows(self, sql, params):
+        rows = self.tables[self.table(sql)]
+        if params:
+            rows = [row for row in rows if params[0] <= row[0] < params[1]]
+        return rows
+
+
+@pytest.fixture
+def source():
+    return Source()
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    mirror = rtapi_bk.Mirror(str(tmp_path / "mirror.db"))
+    yield mirror
+    mirror.close()
+
+
+def test_mirror_reads(source, mirror):
+    assert mirror.refresh(source.rt) == {"Object": 3, "ObjectLog": 1, "IPv6Address": 1, "IPv4Allocation": 1, "Port": 2}
+    rt = mirror.rtobject()
+    assert rt.GetObjectId("server1") == 1
+    assert rt.GetObjectName(2500) == "server3"
+    assert rt.GetInterfaceList(1) == ((10, "eth0", 24), (11, "eth1", 24))
+    assert rt.GetInterfaceId(1, "ETH1") == 11
+    assert rt.InterfaceGetIpv4IP(1, "eth0") == (("192.168.0.1",),)
+    assert rt.db_query_all("SELECT HEX(ip), name FROM IPv6Address WHERE ip = UNHEX(%s)", ("20010DB8000000000000000000000001",)) == (("20010DB8000000000000000000000001", "gw"),)
+    assert rt.db_query_one("SELECT date FROM ObjectLog WHERE content LIKE '%%creat%%' AND id = %s", (1,)) == (datetime(2024, 5, 1, 12, 30),)
+    with pytest.raises(sqlite3.OperationalError):
+        rt.UpdateObjectLabel(1, "label")
+
+
+def test_mirror_incremental_refresh(source, mirror):
+    mirror.refresh(source.rt)
+    assert mirror.refresh(source.rt) == {"Object": 0, "ObjectLog": 0, "IPv6Address": 0, "IPv4Allocation": 0, "Port": 0}
+
+    source.tables["Object"][2] = (2500, "server4", None, 4, None, "yes", "far")
+    del source.tables["Port"][1]
+    source.db.reset()
+    assert mirror.refresh(source.rt) == {"Object": 1, "ObjectLog": 0, "IPv6Address": 0, "IPv4Allocation": 0, "Port": 1}
+    assert source.db.sql(r"FROM `Object` WHERE `id` >=")[0][1] == (2000, 3000)
+    rt = mirror.rtobject()
+    assert rt.GetObjectName(2500) == "server4"
+    assert rt.GetObjectName(1) == "Server1"
+    assert rt.GetInterfaceList(1) == ((10, "eth0", 24),)
+
+    source.tables["Object"].pop()
+    mirror.refresh(source.rt)
+    assert mirror.rtobject().GetObjectName(2500) is None
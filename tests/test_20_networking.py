@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#
+# Declarative sync of object interfaces and addresses.
+# Runs against recording fake connection, no database needed.
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def networking_state(db):
+    db.respond(r"SELECT id, name FROM Port", [(1, "eth0"), (2, "eth1"), (3, "drac"), (4, "eth9")])
+    db.respond(r"FROM IPv4Allocation", [(167772161, "eth0"), (167772162, "eth0"), (167772163, "eth1"), (167772169, "eth9")])
+    db.respond(r"FROM IPv6Allocation", [(bytes.fromhex("20010DB8000000000000000000000001"), "eth0")])
+
+
+def test_SyncObjectNetworking_noop(db, rt):
+    networking_state(db)
+    summary = rt.SyncObjectNetworking(5, {"eth0": ["10.0.0.1", "10.0.0.2", "2001:db8::1"], "eth1": ["10.0.0.3"], "eth9": ["10.0.0.9"]})
+    assert summary == {'ports_added': 0, 'ports_removed': 0, 'ips_added': 0, 'ips_removed': 0}
+    assert db.round_trips == 3
+    assert db.commits == 0
+
+
+def test_SyncObjectNetworking(db, rt):
+    networking_state(db)
+    summary = rt.SyncObjectNetworking(5, {"eth0": ["10.0.0.1", "10.0.0.3"], "eth1": ["2001:db8::1"], "eth2": ["10.0.0.4"]})
+    assert summary == {'ports_added': 1, 'ports_removed': 1, 'ips_added': 3, 'ips_removed': 3}
+    messages = [message for params in db.sql(r"INSERT INTO ObjectLog")[0][1] for message in params[1:]]
+    assert "Removed interface eth9" in messages
+    assert "Removed IP 10.0.0.2 from eth0" in messages
+    assert "Removed IP (10.0.0.3) from interface eth1" in messages
+    assert "Added IP 10.0.0.3 on eth0" in messages
+    assert "Added IPv6 IP 2001:db8::1 on eth1" in messages
+    assert "Added IP 10.0.0.4 on eth2" in messages
+    assert db.round_trips == 3 + 10
+    assert db.commits == 1
+
+
+def test_SyncObjectNetworking_keeps_ip_of_kept_interface(db, rt, caplog):
+    db.respond(r"SELECT id, name FROM Port", [(1, "eth0"), (3, "drac")])
+    db.respond(r"FROM IPv4Allocation", [(167772161, "drac")])
+    summary = rt.SyncObjectNetworking(5, {"eth0": ["10.0.0.1"]})
+    assert summary == {'ports_added': 0, 'ports_removed': 0, 'ips_added': 0, 'ips_removed': 0}
+    assert not db.sql(r"INSERT INTO IPv4Allocation|INSERT INTO ObjectLog")
+    assert "10.0.0.1" in caplog.text
+    assert db.round_trips == 3
+    assert db.commits == 0
+
+
+def test_SyncObjectNetworking_names_case_insensitive(db, rt):
+    db.respond(r"SELECT id, name FROM Port", [(1, "Eth0"), (3, "DRAC")])
+    db.respond(r"FROM IPv4Allocation", [(167772161, "Eth0"), (167772162, "DRAC")])
+    summary = rt.SyncObjectNetworking(5, {"eth0": ["10.0.0.1"]})
+    assert summary == {'ports_added': 0, 'ports_removed': 0, 'ips_added': 0, 'ips_removed': 0}
+    assert db.round_trips == 3
+    assert db.commits == 0
+
+
+def test_SyncObjectNetworking_invalid_address(db, rt, caplog):
+    networking_state(db)
+    summary = rt.SyncObjectNetworking(5, {"eth0": ["10.0.0.1", "10.0.0.2", "10.0.0.300", "2001:db8::1"], "eth1": ["10.0.0.3"], "eth9": ["10.0.0.9"]})
+    assert summary == {'ports_added': 0, 'ports_removed': 0, 'ips_added': 0, 'ips_removed': 0}
+    assert "10.0.0.300" in caplog.text
+    assert db.round_trips == 3
+    assert db.commits == 0
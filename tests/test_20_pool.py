@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# Connection pool mode.
+# Threads share pool of recording fake connections, no database needed.
+
+import threading
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+
+class BrokenConnection(FakeConnection):
+    """Connection which fails health check"""
+
+    def ping(self):
+        raise RuntimeError("MySQL server has gone away")
+
+
+@pytest.fixture
+def connections():
+    return []
+
+
+@pytest.fixture
+def connect(connections):
+    def factory():
+        connections.append(FakeConnection())
+        return connections[-1]
+    return factory
+
+
+def test_pool_releases_connection_without_snapshot(connections, connect):
+    rt = rtapi_bk.RTObject(pool=rtapi_bk.ConnectionPool(connect, min_size=1, max_size=1))
+    rt.GetObjectName(1)
+    rt.AddObject("server1", 4, "GHHR1234", "test server")
+    assert len(connections) == 1
+    assert connections[0].commits == 1
+    assert connections[0].rollbacks == 2
+
+
+def test_max_size_blocks_until_release(connections, connect):
+    pool = rtapi_bk.ConnectionPool(connect, min_size=0, max_size=1)
+    first = pool.acquire()
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive() and acquired == []
+    pool.release(first)
+    waiter.join(1)
+    assert acquired == [first]
+    assert len(connections) == 1
+
+
+def test_acquire_timeout(connect):
+    pool = rtapi_bk.ConnectionPool(connect, min_size=0, max_size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+
+def test_broken_connection_is_replaced(connections, connect):
+    broken = BrokenConnection()
+    pool = rtapi_bk.ConnectionPool(lambda: broken, min_size=1, max_size=1, check_after=0)
+    pool.factory = connect
+    connection = pool.acquire()
+    assert connection is connections[0]
+    assert broken.closed
+    assert pool.size == 1
+
+
+def test_db_hold_is_thread_local(connections, connect):
+    rt = rtapi_bk.RTObject(pool=rtapi_bk.ConnectionPool(connect, min_size=0, max_size=2))
+    held = {}
+    inside = threading.Barrier(2)
+
+    def work(name):
+        with rt.transaction():
+            rt.InsertLog(1, name)
+            held[name] = rt.db
+            inside.wait(1)
+        held[name + " after"] = rt.db
+
+    threads = [threading.Thread(target=work, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(1)
+    assert held["a"] is not held["b"]
+    assert held["a after"] is None and held["b after"] is None
+    assert sorted(connection.commits for connection in connections) == [1, 1]
+    assert rt.db is None
+
+
+def test_close_closes_checked_out_connections(connections, connect):
+    pool = rtapi_bk.ConnectionPool(connect, min_size=2, max_size=2)
+    busy = pool.acquire()
+    pool.close()
+    assert [connection.closed for connection in connections].count(True) == 1
+    pool.release(busy)
+    assert busy.closed
+    assert pool.size == 0
+    with pytest.raises(RuntimeError):
+        pool.acquire()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# Record classes with lazily loaded relations.
+# Runs against recording fake connection, no database needed.
+
+import pytest
+import rtapi_bk
+from rtapi_bk.records import Object, Port, AttributeValue
+from fakedb import FakeConnection
+
+
+@pytest.fixture
+def db():
+    db = FakeConnection()
+    db.respond(r"FROM Object WHERE id IN", lambda sql, params: [(i, "server%d" % i, "", 4, None, "no", None) for i in params if i < 100])
+    db.respond(r"FROM Port WHERE object_id IN", lambda sql, params: [(i, 100 + i, "eth0", 24, None, "") for i in params])
+    db.respond(r"FROM AttributeValue", [(1, 2, "HW type", "dict", None, 50012, None, "Dell R640"), (2, 3, "FQDN", "string", "s2.example.com", None, None, None)])
+    db.respond(r"JOIN Object AS o ON o.id = el.child_entity_id", [(1, 7, "vm7"), (1, 8, "vm8")])
+    db.respond(r"SELECT id,name,asset_no,objtype_id FROM Object", lambda sql, params: [(i, "server%d" % i, None, 4) for i in range(params[0] + 1 if len(params) > 1 else 1, 6)][:params[-1]])
+    return db
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def test_fields():
+    port = Port(1, 101, "eth0")
+    assert (port.name, port.type, port.label) == ("eth0", None, None)
+    assert port == Port.from_rows([(101, "eth0", 1)], columns=("id", "name", "object_id"))[0]
+    assert port.as_dict()["id"] == 101
+    assert not hasattr(port, "__dict__")
+    with pytest.raises(AttributeError):
+        port.speed = 10
+    with pytest.raises(ValueError):
+        Object(1, "server1").ports
+
+
+def test_lazy_relations_load_once_per_group(db, rt):
+    objects = rt.LoadObjectRecords([3, 1, 2, 999])
+    assert [obj.id for obj in objects] == [3, 1, 2]
+    assert db.round_trips == 1
+    assert objects[1].ports == [Port(1, 101, "eth0", 24, None, "")]
+    assert [obj.ports[0].id for obj in objects] == [103, 101, 102]
+    assert db.round_trips == 2
+    attributes = objects[1].attributes
+    assert [attr.value for attr in attributes] == ["Dell R640"]
+    assert isinstance(attributes[0], AttributeValue)
+    assert objects[2].attributes[0].value == "s2.example.com"
+    assert objects[0].attributes == []
+    assert db.round_trips == 3
+    children = objects[1].children
+    assert [child.name for child in children] == ["vm7", "vm8"]
+    children[0].ports
+    assert db.sql(r"FROM Port WHERE object_id IN")[-1][1] == (7, 8)
+    assert db.round_trips == 5
+
+
+def test_LoadObjectRecords_include(db, rt):
+    objects = rt.LoadObjectRecords(range(1, 51), include=["ports", "tags"])
+    assert db.round_trips == 3
+    assert sum(len(obj.ports) + len(obj.tags) for obj in objects) == 50
+    assert db.round_trips == 3
+    with pytest.raises(ValueError):
+        rt.LoadObjectRecords([1], include=["racks"])
+
+
+def test_IterObjectRecords(db, rt):
+    objects = list(rt.IterObjectRecords(chunk_size=2))
+    assert [(obj.id, obj.name, obj.objtype_id, obj.label) for obj in objects[:2]] == [(1, "server1", 4, None), (2, "server2", 4, None)]
+    assert len(objects) == 5
+    db.reset()
+    objects[0].ports
+    assert db.sql(r"FROM Port WHERE object_id IN")[0][1] == (1, 2)
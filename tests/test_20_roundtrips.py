@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+#
+# Round-trip budgets of high-level methods.
+# Runs against recording fake connection, no database needed.
+# Budgets are exact statement and commit counts, raising one needs a good reason.
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection, resolve_names
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def test_AddObject(db, rt):
+    rt.AddObject("server1", 4, "GHHR1234", "test server")
+    assert db.round_trips == 1
+    assert db.commits == 1
+
+
+def test_AddObjects(db, rt):
+    db.respond(r"SELECT name, id FROM Object", lambda sql, params: [(name, i) for i, name in enumerate(params)])
+    records = [("server%d" % i, 4, "ASSET%d" % i, "") for i in range(500)]
+    assert len(rt.AddObjects(records)) == 500
+    assert db.round_trips == 3
+    assert db.commits == 1
+
+
+def test_AddObjects_names_case_insensitive(db, rt):
+    db.respond(r"SELECT name, asset_no FROM Object", [("Server1", "ASSET1")])
+    db.respond(r"SELECT name, id FROM Object", [("SERVER2", 12)])
+    assert rt.AddObjects([("server1", 4, None, ""), ("server3", 4, "asset1", ""), ("server2", 4, None, ""), ("Server2", 4, None, "")]) == {"server2": 12}
+    assert db.sql(r"INSERT INTO Object")[0][1] == [("server2", 4, None, "")]
+
+
+def test_transaction_single_commit(db, rt):
+    with rt.transaction():
+        object_id = rt.AddObject("server1", 4, "GHHR1234", "test server")
+        rt.UpdateObjectLabel(object_id, "label")
+        rt.InsertLog(object_id, "message")
+    assert db.round_trips == 3
+    assert db.commits == 1
+
+
+def test_transaction_rollback(db, rt):
+    with pytest.raises(RuntimeError):
+        with rt.transaction():
+            rt.InsertLog(1, "message")
+            raise RuntimeError("fail")
+    assert db.commits == 0
+    assert db.rollbacks == 1
+
+
+def test_autocommit_off(db):
+    rt = rtapi_bk.RTObject(db, autocommit=False)
+    rt.InsertLog(1, "message")
+    rt.InsertLog(1, "message")
+    assert db.commits == 0
+    rt.db_commit()
+    assert db.commits == 1
+
+
+def test_InsertOrUpdateAttribute(db, rt):
+    db.respond(r"SELECT objtype_id FROM Object", [(4,)])
+    db.respond(r"SELECT type FROM Attribute", [("uint",)])
+    db.respond(r"FROM AttributeValue", [(3,)])
+    rt.InsertOrUpdateAttribute(1, 2, 5)
+    assert db.round_trips == 4
+    assert db.commits == 1
+
+
+def test_InsertOrUpdateAttribute_registry(db, rt):
+    db.respond(r"FROM Attribute$", [(2, "uint", "Memory")])
+    db.respond(r"FROM AttributeMap", [(4, 2, None, "no")])
+    db.respond(r"LEFT JOIN AttributeValue", [(4, 2, 3)])
+    rt.EnableAttributeRegistry()
+    rt.EnableObjectCache()
+    rt.DisableObjectCache()
+    rt.DisableDictionaryIndex()
+    db.reset()
+    rt.InsertOrUpdateAttribute(1, 2, 5)
+    assert db.round_trips == 2
+    assert db.commits == 1
+
+
+def test_UpsertAttributes(db, rt):
+    db.respond(r"FROM Attribute$", [(i, "string", "attr%d" % i) for i in range(30)])
+    db.respond(r"FROM AttributeMap", [(4, i, None, "no") for i in range(30)])
+    db.respond(r"LEFT JOIN AttributeValue", [(1, 4, i, "old", None, None) for i in range(10)])
+    rt.EnableAttributeRegistry()
+    db.reset()
+    summary = rt.UpsertAttributes(1, dict(("attr%d" % i, "new" if i < 5 else "old") for i in range(30)))
+    assert summary == {'inserted': 20, 'updated': 5, 'unchanged': 5, 'skipped': 0}
+    assert db.round_trips == 3
+    assert db.commits == 1
+
+
+def test_UpsertAttributes_unchanged(db, rt):
+    db.respond(r"FROM Attribute$", [(1, "string", "attr1")])
+    db.respond(r"FROM AttributeMap", [(4, 1, None, "no")])
+    db.respond(r"LEFT JOIN AttributeValue", [(1, 4, 1, "old", None, None)])
+    for i in range(3):
+        assert rt.UpsertAttributes(1, {"attr1": "old"}) == {'inserted': 0, 'updated': 0, 'unchanged': 1, 'skipped': 0}
+    # Registry is loaded once (2 queries), then one query per call
+    assert db.round_trips == 2 + 3
+    assert db.commits == 0
+
+
+def test_LinkNetworkInterface(db, rt):
+    db.respond(r"SELECT id,name FROM Port WHERE object_id = %s AND name", lambda sql, params: [(10 if params[0] == 1 else 20, params[1])])
+    db.respond(r"SELECT id FROM Object WHERE name", [(2,)])
+    db.respond(r"Port.name as port_name", lambda sql, params: [("eth0", "server1")] if params[0] == 10 else [("gi1", "switch1")])
+    rt.LinkNetworkInterface(1, "eth0", "switch1", "gi1")
+    assert len(db.sql(r"INSERT INTO Link")) == 1
+    assert db.round_trips == 12
+    assert db.commits == 3
+
+
+def test_CleanUnusedInterfaces(db, rt):
+    db.respond(r"SELECT id, name FROM Port WHERE object_id", [(1, "eth0"), (2, "eth1"), (3, "eth2")])
+    rt.CleanUnusedInterfaces(1, ["eth0"])
+    assert db.sql(r"DELETE FROM Port")[0][1] == (1, 2, 3)
+    assert len(db.sql(r"INSERT INTO ObjectLog")[0][1]) == 8
+    assert db.round_trips == 6
+    assert db.commits == 1
+
+
+def test_CleanIPAddresses(db, rt):
+    db.respond(r"FROM IPv4Allocation", [(167772160 + i,) for i in range(400)])
+    rt.CleanIPAddresses(1, ["10.0.0.%d" % i for i in range(200)], "eth0")
+    assert len(db.sql(r"DELETE FROM IPv4Allocation")[0][1]) == 202
+    assert db.sql(r"INSERT INTO ObjectLog")[0][1][0] == (1, "Removed IP 10.0.0.200 from eth0")
+    assert db.round_trips == 3
+    assert db.commits == 1
+
+
+def test_CleanIPAddresses_invalid_address(db, rt, caplog):
+    db.respond(r"FROM IPv4Allocation", [(167772161,), (167772162,)])
+    rt.CleanIPAddresses(1, ["10.0.0.1", "10.0.0.999", "fe80::1%eth0"], "eth0")
+    assert db.sql(r"DELETE FROM IPv4Allocation")[0][1] == (1, "eth0", 167772162)
+    assert "10.0.0.999" in caplog.text
+    assert db.round_trips == 3
+    assert db.commits == 1
+
+
+def test_CleanIPv6Addresses(db, rt):
+    db.respond(r"FROM IPv6Allocation", [(bytes.fromhex("20010DB8000000000000000000000001"),), (bytes.fromhex("20010DB8000000000000000000000002"),)])
+    rt.CleanIPv6Addresses(1, ["2001:db8::1"], "eth0")
+    assert db.sql(r"DELETE FROM IPv6Allocation")[0][1] == (1, "eth0", bytes.fromhex("20010DB8000000000000000000000002"))
+    assert db.sql(r"INSERT INTO ObjectLog")[0][1] == [(1, "Removed IP 2001:0db8:0000:0000:0000:0000:0000:0002 from eth0")]
+    assert db.round_trips == 3
+    assert db.commits == 1
+
+
+def test_AssignChassisSlot(db, rt):
+    db.respond(r"SELECT id, name FROM Object WHERE name IN", resolve_names)
+    db.respond(r"SELECT id FROM Attribute WHERE name LIKE", [(5,)])
+    rt.AssignChassisSlot("chassis1", "A1", "server2")
+    assert db.sql(r"INSERT INTO EntityLink")[0][1] == (101, 102)
+    assert db.round_trips == 8
+    assert db.commits == 4
+
+
+def test_CleanVirtuals(db, rt):
+    db.respond(r"SELECT child_entity_id", [(i,) for i in range(400)])
+    db.respond(r"SELECT id, name FROM Object WHERE name IN", lambda sql, params: [(int(name[2:]), name) for name in params])
+    db.respond(r"SELECT id, name FROM Object WHERE id IN", lambda sql, params: [(i, "vm%d" % i) for i in params])
+    rt.CleanVirtuals(9, ["vm%d" % i for i in range(300)])
+    assert len(db.sql(r"DELETE FROM EntityLink")[0][1]) == 101
+    assert db.sql(r"INSERT INTO ObjectLog")[0][1][0] == (9, "Removed virtual vm300")
+    assert db.round_trips == 5
+    assert db.commits == 1
+
+
+def test_ResolveObjectIds(db, rt):
+    db.respond(r"SELECT id, name FROM Object WHERE name IN", lambda sql, params: [(i, name.upper()) for i, name in enumerate(params) if name != "missing"])
+    rt.in_chunk_size = 100
+    ids = rt.ResolveObjectIds(["vm%d" % i for i in range(250)] + ["missing"])
+    assert len(ids) == 250
+    assert "vm7" in ids
+    assert db.round_trips == 3
+
+
+def test_ResolveObjectIds_case_insensitive(db, rt):
+    db.respond(r"SELECT id, name FROM Object WHERE name IN", [(7, "Server1"), (8, "server2")])
+    assert rt.ResolveObjectIds(["server1", "SERVER1", "Server2", "missing"]) == {"server1": 7, "SERVER1": 7, "Server2": 8}
+    assert db.sql(r"FROM Object")[0][1] == ("server1", "Server2", "missing")
+    assert db.round_trips == 1
+
+
+def test_ObjectCache(db, rt):
+    db.respond(r"FROM Object WHERE name", [(7, "switch1")])
+    rt.EnableObjectCache(size=10, ttl=60)
+    for i in range(100):
+        assert rt.GetObjectId("switch1") == 7
+        assert rt.GetObjectName(7) == "switch1"
+    assert db.round_trips == 1
+
+
+def test_DictionaryIndex(db, rt):
+    db.respond(r"FROM Dictionary", [(1, 11, "Dell PowerEdge R640"), (2, 11, "HP DL360")])
+    db.respond(r"FROM Chapter", [(11, "server models")])
+    rt.EnableDictionaryIndex()
+    db.reset()
+    for i in range(100):
+        assert rt.GetDictionaryId("R640") == 1
+        assert rt.GetDictionaryIdByValue("HP DL360") == 2
+        assert rt.GetDictionaryChapterId("server models") == 11
+    assert db.round_trips == 0
+    rt.EnableObjectCache()
+    rt.DisableObjectCache()
+    assert rt.GetDictionaryId("R640") == 1
+    assert db.round_trips == 0
+
+
+def test_DictionaryIndex_duplicate_values():
+    index = rtapi_bk.DictionaryIndex([(7, 11, "Dell"), (3, 11, "dell"), (5, 11, "DELL"), (2, 12, "Dell")], [(11, "vendors")])
+    assert index.key_by_value("Dell", 11) == 3
+    assert index.key_by_value("Dell") == 2
+    index.remove_key(3)
+    assert index.key_by_value("Dell", 11) == 5
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+#
+# Columnar snapshot export.
+# Runs against recording fake connection, no database needed.
+
+import tempfile
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def test_ExportSnapshot(db, rt, tmp_path):
+    objects = [(i, "server%d" % i, None if i % 2 else "label", 4, "ASSET%d" % i, "no", "") for i in range(1, 6)]
+    values = [(1, 4, 2, None, 7, None), (1, 4, 3, "text", None, 1.5)]
+    db.respond(r"FROM Object WHERE id >", lambda sql, params: [row for row in objects if row[0] > params[0]][:params[-1]])
+    db.respond(r"FROM Object ORDER BY", lambda sql, params: objects[:params[-1]])
+    db.respond(r"FROM AttributeValue ORDER BY", values)
+    db.respond(r"FROM IPv4Allocation ORDER BY", [(1, 3232235521, "eth0", "regular")])
+    counts = rt.ExportSnapshot(str(tmp_path / "inventory.snap"), chunk_size=2)
+    assert counts == {"Object": 5, "AttributeValue": 2, "Port": 0, "IPv4Allocation": 1, "Link": 0}
+    assert len(db.sql(r"FROM Object")) == 3
+
+    with rtapi_bk.Snapshot(str(tmp_path / "inventory.snap")) as snapshot:
+        assert snapshot.keys() == list(counts.keys())
+        assert list(snapshot["Object"]["id"]) == [1, 2, 3, 4, 5]
+        assert list(snapshot["Object"]["label"]) == [None, "label", None, "label", None]
+        assert snapshot["Object"]["name"][-1] == "server5"
+        assert list(snapshot["AttributeValue"].iterrows()) == [(1, 4, 2, None, 7, None), (1, 4, 3, "text", None, 1.5)]
+        assert snapshot["IPv4Allocation"]["ip"][0] == 3232235521
+        assert len(snapshot["Link"]) == 0
+        assert list(snapshot["Link"].iterrows()) == []
+    assert db.round_trips == 8
+    assert db.commits == 0
+
+
+def test_ExportSnapshot_failure(db, rt, tmp_path, monkeypatch):
+    spills = []
+    original = tempfile.TemporaryFile
+
+    def temporary_file(*args, **kwargs):
+        spills.append(original(*args, **kwargs))
+        return spills[-1]
+
+    def fail(sql, params):
+        raise RuntimeError("connection lost")
+    monkeypatch.setattr(rtapi_bk.snapshot.tempfile, "TemporaryFile", temporary_file)
+    db.respond(r"FROM Object ORDER BY", [(1, "server1", None, 4, None, "no", "")])
+    db.respond(r"FROM Port ORDER BY", fail)
+    path = tmp_path / "inventory.snap"
+    path.write_bytes(b"previous")
+    with pytest.raises(RuntimeError, match="connection lost"):
+        rt.ExportSnapshot(str(path))
+    assert spills and all(spill.closed for spill in spills)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["inventory.snap"]
+    assert path.read_bytes() == b"previous"
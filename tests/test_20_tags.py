@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+#
+# Tag index and tag expressions.
+# Runs against recording fake connection, no database needed.
+
+import pytest
+import rtapi_bk
+from fakedb import FakeConnection
+
+
+@pytest.fixture
+def db():
+    return FakeConnection()
+
+
+@pytest.fixture
+def rt(db):
+    return rtapi_bk.RTObject(db)
+
+
+def tag_state(db):
+    db.respond(r"FROM TagTree", [(1, None, "env"), (2, 1, "prod"), (3, 1, "stage"), (4, None, "web"), (5, 4, "nginx"), (6, None, "old")])
+    db.respond(r"FROM TagStorage", [(10, 2), (10, 5), (11, 3), (11, 4), (12, 2), (12, 6), (13, 5)])
+    db.respond(r"SELECT id FROM Object$", [(i,) for i in range(10, 15)])
+    db.respond(r"SELECT id, name FROM Object WHERE id IN", lambda sql, params: [(i, "server%d" % i) for i in params])
+
+
+def test_TagIndex(db, rt):
+    tag_state(db)
+    index = rt.EnableTagIndex()
+    assert db.round_trips == 2
+    assert index.descendants("ENV") == set([1, 2, 3])
+    assert index.ancestors("nginx") == [4]
+    assert rt.GetObjectTags(10) == (("env", "prod"), ("web", "nginx"))
+    assert rt.GetObjectsByTag("env") == ()
+    assert rt.GetObjectsByTag("env", descendants=True) == (("server10", 10), ("server11", 11), ("server12", 12))
+    assert rt.GetObjectsTags([10, 14]) == {10: ["nginx", "prod"], 14: []}
+    assert rt.SelectObjectsByTags("{web} and {env}") == set([10, 11])
+    assert rt.SelectObjectsByTags("prod and not (old or {stage})") == set([10])
+    assert rt.SelectObjectsByTags("not {env}") == set([13, 14])
+    with pytest.raises(ValueError):
+        rt.SelectObjectsByTags("{web} and")
+    with pytest.raises(ValueError):
+        rt.SelectObjectsByTags("{missing}")
+    assert db.round_trips == 2 + 3
+
+
+def test_SelectObjectsByTags_without_index(db, rt):
+    tag_state(db)
+    assert rt.SelectObjectsByTags("{nginx} or {stage}") == set([10, 11, 13])
+    assert db.round_trips == 2